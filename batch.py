@@ -0,0 +1,335 @@
+"""
+Batch module: extract (and optionally form-fill) many passport/G-28 cases from the command line
+
+Usage:
+    python batch.py --input cases/ --output results.jsonl --parallel 4
+    python batch.py --manifest cases.csv --output results.jsonl --fill --browsers 2
+
+A case directory holds one subdirectory per case containing a passport file and
+a G-28 file (matched by name), or flat files named <case>_passport.<ext> and
+<case>_g28.<ext>. A manifest is a CSV or JSONL file with case_id, passport and
+g28 columns. Cases already recorded as "ok" in the output file are skipped, so
+an interrupted run can simply be restarted.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import math
+import os
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+from concurrency import BoundedExecutor
+from document_processor import ESCALATION_MODEL, DocumentProcessor
+from driver_pool import DriverPool
+from extraction_cache import ExtractionCache
+from form_filler import DEFAULT_FORM_URL, WAIT_PROFILES, FormFiller
+from gemini_client import GeminiClient
+from model_usage import usage_stats
+from pdf_render import PageRenderer
+
+SUPPORTED_SUFFIXES = {".pdf", ".jpg", ".jpeg", ".png"}
+
+# File name patterns that identify each document of a case
+DOCUMENT_PATTERNS = {
+    "passport": re.compile(r"passport", re.IGNORECASE),
+    "g28": re.compile(r"g[-_ ]?28", re.IGNORECASE),
+}
+
+
+def _classify(path: Path) -> Optional[str]:
+    for doc_type, pattern in DOCUMENT_PATTERNS.items():
+        if pattern.search(path.stem):
+            return doc_type
+    return None
+
+
+def _flat_case_id(path: Path, doc_type: str) -> str:
+    """Case id of a flat file: the name before the document type, else the name after it.
+
+    smith_passport.jpg, smith_g28.pdf, passport_smith.jpg and g28-smith.pdf all
+    belong to case "smith", the same id a "smith" subdirectory gets.
+    """
+    before, after = DOCUMENT_PATTERNS[doc_type].split(path.stem, maxsplit=1)
+    return before.strip("-_ ") or after.strip("-_ ") or path.stem
+
+
+def discover_cases(input_dir: str) -> list:
+    """Find cases in a directory: one subdirectory per case, or <case>_<doc_type> files"""
+    root = Path(input_dir)
+    cases = {}
+    for path in sorted(root.iterdir()):
+        if path.is_dir():
+            files = {}
+            for child in sorted(path.iterdir()):
+                doc_type = _classify(child) if child.suffix.lower() in SUPPORTED_SUFFIXES else None
+                if doc_type and doc_type not in files:
+                    files[doc_type] = str(child)
+            for doc_type, file_path in files.items():
+                cases.setdefault(path.name, {}).setdefault(doc_type, file_path)
+        elif path.suffix.lower() in SUPPORTED_SUFFIXES:
+            doc_type = _classify(path)
+            if doc_type is None:
+                continue
+            cases.setdefault(_flat_case_id(path, doc_type), {}).setdefault(doc_type, str(path))
+    return [{"case_id": case_id, "files": files} for case_id, files in cases.items()]
+
+
+def load_manifest(manifest_path: str) -> list:
+    """Read cases from a CSV or JSONL manifest with case_id, passport and g28 columns"""
+    path = Path(manifest_path)
+    base = path.parent
+    if path.suffix.lower() == ".jsonl":
+        with open(path, "r", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    else:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            rows = list(csv.DictReader(f))
+
+    cases = []
+    for index, row in enumerate(rows):
+        files = {}
+        for doc_type in DOCUMENT_PATTERNS:
+            value = (row.get(doc_type) or "").strip()
+            if value:
+                # Relative paths are resolved against the manifest's directory
+                files[doc_type] = str(base / value) if not os.path.isabs(value) else value
+        case_id = str(row.get("case_id") or index + 1)
+        if files:
+            cases.append({"case_id": case_id, "files": files})
+    return cases
+
+
+def completed_case_ids(output_path: str) -> set:
+    """Case ids already written to the output with status "ok" """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A half-written last line from an interrupted run
+                continue
+            if record.get("status") == "ok":
+                done.add(record.get("case_id"))
+    return done
+
+
+def _ends_mid_line(path: str) -> bool:
+    try:
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+    except OSError:
+        # Missing or empty
+        return False
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    index = max(0, math.ceil(fraction * len(ordered)) - 1)
+    return ordered[index]
+
+
+class BatchRunner:
+    """Process cases concurrently and append one JSON line per finished case"""
+
+    def __init__(self, processor: DocumentProcessor, output_path: str, parallel: int = 4,
+                 form_filler=None, max_fills: int = 1):
+        self.processor = processor
+        self.output_path = output_path
+        self.parallel = max(1, parallel)
+        self.form_filler = form_filler
+        # Fills wait here rather than inside the pool, whose acquire() would time out
+        self._fill_slots = asyncio.Semaphore(max(1, max_fills))
+        self.timings = {"extract": [], "fill": [], "total": []}
+        self.total = 0
+        self.succeeded = 0
+        self.failed = 0
+        self._output = None
+
+    def _write(self, record: dict):
+        self._output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        # Flush per case so an interrupted run loses at most the cases in flight
+        self._output.flush()
+
+    async def _process(self, case: dict) -> dict:
+        record = {"case_id": case["case_id"], "files": case["files"], "timings": {}}
+        started = time.perf_counter()
+
+        stage_start = time.perf_counter()
+        documents = await self.processor.extract_documents(case["files"])
+        record["timings"]["extract"] = round(time.perf_counter() - stage_start, 3)
+        record.update(documents)
+        errors = [f"{doc_type}: {data['error']}" for doc_type, data in documents.items() if "error" in data]
+
+        if self.form_filler is not None and not errors:
+            async with self._fill_slots:
+                stage_start = time.perf_counter()
+                fill = await self.form_filler.fill_form(documents.get("passport", {}), documents.get("g28", {}))
+            record["timings"]["fill"] = round(time.perf_counter() - stage_start, 3)
+            record["fill"] = fill
+            errors += fill.get("errors", [])
+
+        record["timings"]["total"] = round(time.perf_counter() - started, 3)
+        record["status"] = "error" if errors else "ok"
+        if errors:
+            record["errors"] = errors
+        return record
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            case = await queue.get()
+            try:
+                try:
+                    record = await self._process(case)
+                except Exception as e:
+                    record = {"case_id": case["case_id"], "files": case["files"], "status": "error", "errors": [str(e)]}
+                for stage, seconds in record.get("timings", {}).items():
+                    self.timings[stage].append(seconds)
+                if record["status"] == "ok":
+                    self.succeeded += 1
+                else:
+                    self.failed += 1
+                self._write(record)
+                print(f"[{self.succeeded + self.failed}/{self.total}] {record['case_id']}: {record['status']}")
+            finally:
+                queue.task_done()
+
+    async def run(self, cases: list):
+        """Process every case with at most `parallel` cases in flight"""
+        self.total = len(cases)
+        queue = asyncio.Queue()
+        for case in cases:
+            queue.put_nowait(case)
+
+        with open(self.output_path, "a", encoding="utf-8") as self._output:
+            if _ends_mid_line(self.output_path):
+                # Terminate a half-written line from an interrupted run so the next record stays readable
+                self._output.write("\n")
+            workers = [asyncio.create_task(self._worker(queue)) for _ in range(min(self.parallel, len(cases)) or 1)]
+            try:
+                await queue.join()
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+
+    def summary(self, elapsed: float) -> dict:
+        stages = {}
+        for stage, values in self.timings.items():
+            if values:
+                stages[stage] = {
+                    "count": len(values),
+                    "mean": round(sum(values) / len(values), 3),
+                    "p50": round(percentile(values, 0.5), 3),
+                    "p95": round(percentile(values, 0.95), 3),
+                    "max": round(max(values), 3),
+                }
+        processed = self.succeeded + self.failed
+        return {
+            "processed": processed,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "elapsed_seconds": round(elapsed, 2),
+            "cases_per_minute": round(processed / elapsed * 60, 2) if elapsed > 0 else 0.0,
+            "stages": stages,
+        }
+
+
+def print_summary(summary: dict, skipped: int):
+    print("\nBatch summary")
+    print(f"  processed: {summary['processed']} (ok {summary['succeeded']}, failed {summary['failed']}, "
+          f"skipped {skipped})")
+    print(f"  elapsed:   {summary['elapsed_seconds']} s")
+    print(f"  throughput: {summary['cases_per_minute']} cases/min")
+    for stage, stats in summary["stages"].items():
+        print(f"  {stage:<8} mean {stats['mean']:.3f}s  p50 {stats['p50']:.3f}s  "
+              f"p95 {stats['p95']:.3f}s  max {stats['max']:.3f}s  (n={stats['count']})")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Batch-extract passport/G-28 cases to JSONL")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="Directory of cases (subdirectories or <case>_<doc>.<ext> files)")
+    source.add_argument("--manifest", help="CSV or JSONL manifest with case_id, passport and g28 columns")
+    parser.add_argument("--output", default="batch_results.jsonl", help="JSONL results file (appended to)")
+    parser.add_argument("--parallel", type=int, default=4, help="Cases processed concurrently")
+    parser.add_argument("--api-key", default=os.getenv("GEMINI_API_KEY"), help="Gemini API key (default: $GEMINI_API_KEY)")
+    parser.add_argument("--rpm", type=float, default=float(os.getenv("GEMINI_RPM", "0")),
+                        help="Gemini requests per minute allowed by the quota (0 = unlimited)")
+    parser.add_argument("--escalation-model", default=os.getenv("ESCALATION_MODEL", ESCALATION_MODEL),
+                        help="Model for fields the default model keeps getting wrong (\"none\" disables)")
+    parser.add_argument("--render-workers", type=int, default=int(os.getenv("PDF_RENDER_WORKERS", "2")),
+                        help="Processes rasterizing PDF pages (0 = render in the calling thread)")
+    parser.add_argument("--prompt-mode", choices=("full", "compact"), default=os.getenv("PROMPT_MODE", "full"),
+                        help="Full prompts with example JSON, or compact schema-built prompts")
+    parser.add_argument("--cache-dir", default=os.getenv("EXTRACTION_CACHE_DIR"), help="On-disk extraction cache directory")
+    parser.add_argument("--fill", action="store_true", help="Also fill the web form for each case")
+    parser.add_argument("--browsers", type=int, default=2, help="Browser pool size when --fill is given")
+    parser.add_argument("--profile", choices=sorted(WAIT_PROFILES), default="fast", help="Form-filling wait profile")
+    parser.add_argument("--form-url", default=os.getenv("FORM_URL", DEFAULT_FORM_URL),
+                        help="Web form to fill")
+    parser.add_argument("--screenshot-dir", default="uploads/screenshots", help="Where fill screenshots are saved")
+    parser.add_argument("--rerun", action="store_true", help="Process cases even if already completed in --output")
+    return parser.parse_args(argv)
+
+
+async def run_batch(args) -> int:
+    cases = discover_cases(args.input) if args.input else load_manifest(args.manifest)
+    done = set() if args.rerun else completed_case_ids(args.output)
+    pending = [case for case in cases if case["case_id"] not in done]
+    skipped = len(cases) - len(pending)
+    print(f"Found {len(cases)} cases, {skipped} already completed, {len(pending)} to process")
+    if not pending:
+        return 0
+
+    executor = BoundedExecutor(max_concurrent=args.parallel, max_queue=args.parallel * 4, name="batch-model")
+    cache = ExtractionCache(disk_dir=args.cache_dir)
+    client = GeminiClient(args.api_key, requests_per_minute=args.rpm, burst=args.parallel, executor=executor)
+    escalation_model = None if args.escalation_model.lower() in ("", "none", "off") else args.escalation_model
+    renderer = PageRenderer(max_workers=args.render_workers)
+    processor = DocumentProcessor(args.api_key, cache=cache, executor=executor, client=client,
+                                  escalation_model=escalation_model, renderer=renderer, prompt_mode=args.prompt_mode)
+
+    pool = None
+    form_filler = None
+    if args.fill:
+        pool = DriverPool(size=args.browsers)
+        await asyncio.to_thread(pool.start)
+        Path(args.screenshot_dir).mkdir(parents=True, exist_ok=True)
+        form_filler = FormFiller(driver_pool=pool, profile=args.profile, screenshot_dir=args.screenshot_dir,
+                                 form_url=args.form_url)
+
+    runner = BatchRunner(processor, args.output, parallel=args.parallel, form_filler=form_filler,
+                         max_fills=args.browsers)
+    started = time.perf_counter()
+    try:
+        await runner.run(pending)
+    finally:
+        if pool is not None:
+            await asyncio.to_thread(pool.shutdown)
+        executor.shutdown()
+        renderer.shutdown()
+    print_summary(runner.summary(time.perf_counter() - started), skipped)
+    print(f"  model calls: {client.stats()}")
+    print(f"  model usage: {usage_stats.snapshot()}")
+    return 1 if runner.failed else 0
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if not args.api_key:
+        print("A Gemini API key is required (--api-key or GEMINI_API_KEY)", file=sys.stderr)
+        return 2
+    return asyncio.run(run_batch(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,3 @@
+"""
+Benchmarks package: offline performance measurements with a stub model and a local form replica
+"""
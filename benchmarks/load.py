@@ -0,0 +1,461 @@
+"""
+Load test: drive the FastAPI app with concurrent virtual users and report latency, errors, memory and loop stalls
+
+Usage (from the repository root):
+    python -m benchmarks.load --users 20 --ramp-up 10 --duration 60 --output load.json
+    python -m benchmarks.load --users 50 --transport http --no-browser   # over a localhost socket
+    python -m benchmarks.load --repeat-uploads                           # identical files: cache-hit path
+
+Each virtual user is its own session and loops over the flow of the UI: set an
+API key once, then upload a passport, upload a G-28, read /extracted-data and
+start a fill, polling each job until it finishes, with a think time between
+steps. The app is main.py as deployed except that Gemini is the offline stub
+and FORM_URL is the local form replica. With --transport asgi requests go
+straight into the app on this event loop; with http the app runs under uvicorn
+on a localhost port in a background thread. A probe timer on the server's event
+loop measures how late it fires: a late tick means something blocked the loop
+and held up every request in flight.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+from benchmarks.local_form import LocalFormServer
+from benchmarks.pipeline import G28_SAMPLE, PASSPORT_SAMPLE, git_commit, peak_rss_mb, percentile
+from benchmarks.stub_model import RECORDINGS_DIR, StubClientRegistry, StubModel, load_recordings
+
+# The loop probe samples RSS this often, so memory is tracked without a separate thread
+RSS_SAMPLE_SECONDS = 0.5
+# Stalls listed individually in the report
+WORST_STALLS = 5
+
+
+def current_rss_mb() -> Optional[float]:
+    """Resident set size of this process right now (Linux only)"""
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+
+
+class LoopMonitor:
+    """Probe an event loop with a timer that should fire every interval; a tick late by threshold is a stall"""
+
+    def __init__(self, interval: float = 0.02, threshold: float = 0.1):
+        self.interval = interval
+        self.threshold = threshold
+        self.lags = []
+        self.stalls = []  # (seconds into the run, lag)
+        self.rss_samples = []
+        self._stopping = False
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        last_rss = None
+        while not self._stopping:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.lags.append(lag)
+            if lag >= self.threshold:
+                self.stalls.append((expected - started, lag))
+            if last_rss is None or expected - last_rss >= RSS_SAMPLE_SECONDS:
+                last_rss = expected
+                rss = current_rss_mb()
+                if rss is not None:
+                    self.rss_samples.append(rss)
+
+    def stop(self):
+        self._stopping = True
+
+    def report(self) -> dict:
+        lags = self.lags or [0.0]
+        worst = sorted(self.stalls, key=lambda stall: stall[1], reverse=True)[:WORST_STALLS]
+        return {
+            "probe_interval_ms": round(self.interval * 1000, 1),
+            "stall_threshold_ms": round(self.threshold * 1000, 1),
+            "stalls": len(self.stalls),
+            "stalled_ms": round(sum(lag for _, lag in self.stalls) * 1000, 1),
+            "lag_p50_ms": round(percentile(lags, 0.5) * 1000, 2),
+            "lag_p99_ms": round(percentile(lags, 0.99) * 1000, 2),
+            "max_lag_ms": round(max(lags) * 1000, 2),
+            "worst": [{"at_s": round(offset, 2), "lag_ms": round(lag * 1000, 1)} for offset, lag in worst],
+        }
+
+
+class Recorder:
+    """Latency and outcome of every request, keyed by endpoint template, and of every job"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.errors = defaultdict(int)
+        self.error_samples = {}
+        self.jobs = defaultdict(list)  # kind -> [(total, queued, run)]
+        self.job_failures = defaultdict(int)
+        self.iterations = 0
+
+    def request(self, endpoint: str, seconds: float, status: Optional[int], error: Optional[str] = None):
+        self.latencies[endpoint].append(seconds)
+        self.statuses[endpoint][str(status) if status is not None else "error"] += 1
+        if error is not None:
+            self.errors[endpoint] += 1
+            self.error_samples.setdefault(endpoint, error)
+
+    def job(self, kind: str, seconds: float, status: dict):
+        self.jobs[kind].append((seconds, status.get("queued_seconds") or 0.0, status.get("run_seconds") or 0.0))
+        if status.get("status") != "succeeded":
+            self.job_failures[kind] += 1
+            self.error_samples.setdefault(f"job {kind}", status.get("error") or status.get("status"))
+
+
+class VirtualUser:
+    """One session going through upload, review and fill in a loop until the deadline"""
+
+    def __init__(self, index: int, client: httpx.AsyncClient, test: "LoadTest", deadline: float):
+        self.index = index
+        self.client = client
+        self.test = test
+        self.args = test.args
+        self.recorder = test.recorder
+        self.deadline = deadline
+        self.random = random.Random(self.args.seed + index)
+        self.iteration = 0
+
+    async def request(self, endpoint: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            self.recorder.request(endpoint, time.perf_counter() - started, None, f"{type(e).__name__}: {e}")
+            return None
+        elapsed = time.perf_counter() - started
+        error = response.text[:200] if response.status_code >= 400 else None
+        self.recorder.request(endpoint, elapsed, response.status_code, error)
+        return response
+
+    async def think(self):
+        if self.args.think_time > 0:
+            await asyncio.sleep(self.random.uniform(0.5, 1.5) * self.args.think_time)
+
+    def _upload_bytes(self, data: bytes) -> bytes:
+        if self.args.repeat_uploads:
+            return data
+        # Bytes past the end of a JPEG or PDF are ignored by readers but change the content hash,
+        # so every upload misses the extraction cache like a new customer's document would
+        return data + f"\n%load-test {self.index} {self.iteration}\n".encode("ascii")
+
+    async def run_job(self, kind: str, response: Optional[httpx.Response]):
+        """Poll an accepted job until it finishes, then fetch its result as the UI does"""
+        if response is None or response.status_code != 202:
+            return
+        accepted = response.json()
+        submitted = time.perf_counter()
+        timeout_at = submitted + self.args.job_timeout
+        status = {}
+        while time.perf_counter() < timeout_at:
+            await asyncio.sleep(self.args.poll_interval)
+            polled = await self.request("GET /jobs/{job_id}", "GET", accepted["status_url"])
+            if polled is None or polled.status_code != 200:
+                continue
+            status = polled.json()
+            if status["status"] in ("succeeded", "failed", "cancelled"):
+                break
+        else:
+            status = {"status": "timeout", "error": f"not finished after {self.args.job_timeout}s"}
+        self.recorder.job(kind, time.perf_counter() - submitted, status)
+        if status.get("status") == "succeeded":
+            await self.request("GET /jobs/{job_id}/result", "GET", accepted["result_url"])
+
+    async def run(self):
+        await self.request("POST /set-api-key", "POST", "/set-api-key", data={"api_key": self.args.api_key})
+        while time.monotonic() < self.deadline:
+            steps = [self.upload_passport, self.upload_g28, self.review]
+            if not self.args.no_browser:
+                steps.append(self.fill)
+            for step in steps:
+                if time.monotonic() >= self.deadline:
+                    return
+                await step()
+                await self.think()
+            self.iteration += 1
+            self.recorder.iterations += 1
+
+    async def upload_passport(self):
+        files = {"file": ("passport.jpg", self._upload_bytes(self.test.passport_bytes), "image/jpeg")}
+        await self.run_job("extract_passport", await self.request("POST /upload/passport", "POST",
+                                                                  "/upload/passport", files=files))
+
+    async def upload_g28(self):
+        files = {"file": ("g28.pdf", self._upload_bytes(self.test.g28_bytes), "application/pdf")}
+        await self.run_job("extract_g28", await self.request("POST /upload/g28", "POST", "/upload/g28", files=files))
+
+    async def review(self):
+        await self.request("GET /extracted-data", "GET", "/extracted-data")
+
+    async def fill(self):
+        await self.run_job("fill", await self.request("POST /fill-form", "POST", "/fill-form",
+                                                      params={"profile": self.args.fill_profile}))
+
+
+class UvicornThread:
+    """The app served by uvicorn on a free localhost port from a background thread"""
+
+    def __init__(self, app):
+        import uvicorn
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.bind(("127.0.0.1", 0))
+        self.server = uvicorn.Server(uvicorn.Config(app, log_level="warning"))
+        self.loop = None
+        self._thread = threading.Thread(target=self._serve, name="load-server", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._socket.getsockname()
+        return f"http://{host}:{port}"
+
+    def _serve(self):
+        async def serve():
+            self.loop = asyncio.get_running_loop()
+            await self.server.serve(sockets=[self._socket])
+        asyncio.run(serve())
+
+    def __enter__(self) -> "UvicornThread":
+        self._thread.start()
+        while not self.server.started:
+            if not self._thread.is_alive():
+                raise RuntimeError("uvicorn did not start")
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self._thread.join(timeout=30)
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.recorder = Recorder()
+        self.monitor = LoopMonitor(args.probe_interval_ms / 1000, args.stall_threshold_ms / 1000)
+        self.workdir = Path(tempfile.mkdtemp(prefix="doc-load-"))
+        self.passport_bytes = PASSPORT_SAMPLE.read_bytes()
+        self.g28_bytes = G28_SAMPLE.read_bytes()
+        self.elapsed = 0.0
+        self.server_stats = {}
+        self.rss_start = current_rss_mb()
+
+    def load_app(self, form_url: str):
+        """Import main against the local form and a scratch storage directory, with Gemini replaced by the stub"""
+        os.environ["FORM_URL"] = form_url
+        os.environ["STORAGE_DIR"] = str(self.workdir / "storage")
+        if self.args.no_browser:
+            os.environ.setdefault("WARMUP", "gemini,pdf_render")
+        import main
+        stub = StubModel(load_recordings(RECORDINGS_DIR), latency_ms=self.args.model_latency_ms,
+                         jitter_ms=self.args.model_jitter_ms, seed=self.args.seed)
+        main.gemini_clients = StubClientRegistry(stub, main.gemini_clients.max_clients,
+                                                 **main.gemini_clients.client_options)
+        return main
+
+    async def drive(self, transport: Optional[httpx.AsyncBaseTransport], base_url: str):
+        """Ramp the virtual users up, run them until the deadline, then read the server's own counters"""
+        args = self.args
+        started = time.monotonic()
+        deadline = started + args.duration
+
+        async def user(index: int):
+            await asyncio.sleep(index * args.ramp_up / args.users)
+            async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=args.request_timeout) as client:
+                await VirtualUser(index, client, self, deadline).run()
+
+        await asyncio.gather(*(user(index) for index in range(args.users)))
+        self.elapsed = time.monotonic() - started
+        async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=args.request_timeout) as client:
+            for name, path in (("jobs", "/job-stats"), ("model", "/model-stats")):
+                self.server_stats[name] = (await client.get(path)).json()
+
+    async def run_in_process(self, main):
+        async with main.lifespan(main.app):
+            probe = asyncio.create_task(self.monitor.run())
+            try:
+                await self.drive(httpx.ASGITransport(app=main.app), "http://loadtest.local")
+            finally:
+                self.monitor.stop()
+                await probe
+
+    def run(self) -> dict:
+        with LocalFormServer() as form:
+            main = self.load_app(form.url)
+            if self.args.transport == "http":
+                with UvicornThread(main.app) as server:
+                    asyncio.run_coroutine_threadsafe(self.monitor.run(), server.loop)
+                    try:
+                        asyncio.run(self.drive(None, server.url))
+                    finally:
+                        self.monitor.stop()
+            else:
+                asyncio.run(self.run_in_process(main))
+        return self.report()
+
+    def report(self) -> dict:
+        recorder = self.recorder
+        elapsed = max(self.elapsed, 1e-9)
+        endpoints = {}
+        for name, values in sorted(recorder.latencies.items()):
+            endpoints[name] = {
+                "n": len(values),
+                "errors": recorder.errors[name],
+                "error_rate": round(recorder.errors[name] / len(values), 4),
+                "throughput_rps": round(len(values) / elapsed, 2),
+                "p50_ms": round(percentile(values, 0.5) * 1000, 2),
+                "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+                "max_ms": round(max(values) * 1000, 2),
+                "statuses": dict(recorder.statuses[name]),
+            }
+        jobs = {}
+        for kind, samples in sorted(recorder.jobs.items()):
+            totals = [total for total, _, _ in samples]
+            queued = [queued for _, queued, _ in samples]
+            # As the server timed it, free of the polling granularity in the client-side numbers
+            served = [queued + run for _, queued, run in samples]
+            jobs[kind] = {
+                "n": len(samples),
+                "failed": recorder.job_failures[kind],
+                "p50_s": round(percentile(totals, 0.5), 3),
+                "p95_s": round(percentile(totals, 0.95), 3),
+                "p99_s": round(percentile(totals, 0.99), 3),
+                "server_p50_s": round(percentile(served, 0.5), 3),
+                "server_p95_s": round(percentile(served, 0.95), 3),
+                "queued_p95_s": round(percentile(queued, 0.95), 3),
+            }
+        requests = sum(len(values) for values in recorder.latencies.values())
+        errors = sum(recorder.errors.values())
+        jobs_run = sum(len(samples) for samples in recorder.jobs.values())
+        rss = self.monitor.rss_samples
+        return {
+            "benchmark": "load",
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {
+                "users": self.args.users,
+                "ramp_up": self.args.ramp_up,
+                "duration": self.args.duration,
+                "think_time": self.args.think_time,
+                "transport": self.args.transport,
+                "browser": not self.args.no_browser,
+                "repeat_uploads": self.args.repeat_uploads,
+                "model_latency_ms": self.args.model_latency_ms,
+                "model_jitter_ms": self.args.model_jitter_ms,
+                "seed": self.args.seed,
+            },
+            "elapsed_s": round(self.elapsed, 2),
+            "iterations": recorder.iterations,
+            "iterations_per_min": round(recorder.iterations / elapsed * 60, 2),
+            "requests": requests,
+            "throughput_rps": round(requests / elapsed, 2),
+            "error_rate": round(errors / requests, 4) if requests else None,
+            "job_failure_rate": round(sum(recorder.job_failures.values()) / jobs_run, 4) if jobs_run else None,
+            "endpoints": endpoints,
+            "jobs": jobs,
+            "error_samples": recorder.error_samples,
+            "event_loop": self.monitor.report(),
+            # The server runs in this process; PDF render worker processes are not included
+            "rss_mb": {
+                "start": self.rss_start,
+                "peak": max(rss) if rss else None,
+                "end": rss[-1] if rss else None,
+            },
+            "peak_rss_mb": peak_rss_mb(),
+            "server": {
+                "jobs": self.server_stats.get("jobs"),
+                "model_executor": {key: value for key, value in self.server_stats.get("model", {}).items()
+                                   if not isinstance(value, dict)},
+            },
+        }
+
+    def cleanup(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def print_summary(result: dict):
+    """Per-endpoint latency table plus the headline numbers"""
+    print(f"\n{result['config']['users']} users, {result['elapsed_s']}s: {result['requests']} requests "
+          f"({result['throughput_rps']} req/s), {result['iterations']} iterations, error rate {result['error_rate']}, "
+          f"job failure rate {result['job_failure_rate']}")
+    print(f"{'endpoint':<28}{'n':>7}{'err':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, stats in result["endpoints"].items():
+        print(f"{name:<28}{stats['n']:>7}{stats['errors']:>6}{stats['p50_ms']:>10.1f}"
+              f"{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}")
+    for kind, stats in result["jobs"].items():
+        print(f"{'job ' + kind:<28}{stats['n']:>7}{stats['failed']:>6}{stats['p50_s'] * 1000:>10.1f}"
+              f"{stats['p95_s'] * 1000:>10.1f}{stats['p99_s'] * 1000:>10.1f}")
+    loop = result["event_loop"]
+    print(f"event loop: {loop['stalls']} stalls >= {loop['stall_threshold_ms']} ms, max lag {loop['max_lag_ms']} ms; "
+          f"RSS peak {result['rss_mb']['peak']} MB")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent-user load test against the FastAPI app, offline")
+    parser.add_argument("--users", type=int, default=10, help="Virtual users (one session each)")
+    parser.add_argument("--ramp-up", type=float, default=10, help="Seconds over which users are started")
+    parser.add_argument("--duration", type=float, default=60, help="Total run time in seconds, ramp-up included")
+    parser.add_argument("--think-time", type=float, default=1.0, help="Mean pause between a user's steps (+/-50%%)")
+    parser.add_argument("--transport", choices=("asgi", "http"), default="asgi",
+                        help="Call the app in-process, or over a localhost socket via uvicorn")
+    parser.add_argument("--no-browser", action="store_true", help="Skip /fill-form (no Chrome needed)")
+    parser.add_argument("--fill-profile", default="fast", help="Wait profile for /fill-form")
+    parser.add_argument("--repeat-uploads", action="store_true",
+                        help="Upload identical files, so extractions after the first are cache hits")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="Seconds between job status polls")
+    parser.add_argument("--job-timeout", type=float, default=120, help="Give up waiting for a job after this long")
+    parser.add_argument("--request-timeout", type=float, default=30, help="Per-request timeout")
+    parser.add_argument("--api-key", default="stub-key", help="Key the users set (all share one client)")
+    parser.add_argument("--model-latency-ms", type=float, default=800, help="Stub model latency")
+    parser.add_argument("--model-jitter-ms", type=float, default=200, help="Stub model latency jitter (+/-)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for think times and stub latency jitter")
+    parser.add_argument("--probe-interval-ms", type=float, default=20, help="Event-loop probe period")
+    parser.add_argument("--stall-threshold-ms", type=float, default=100, help="Probe lateness counted as a stall")
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    test = LoadTest(args)
+    try:
+        result = test.run()
+    finally:
+        test.cleanup()
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2) + "\n", encoding="utf-8")
+        print(f"Load test report written to {args.output}")
+    else:
+        print(json.dumps(result, indent=2))
+    print_summary(result)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,37 @@
+"""
+Local form module: serve the bundled form replica on localhost
+"""
+import functools
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+BENCHMARK_DIR = Path(__file__).parent
+REPLICA_PAGE = "form_replica.html"
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalFormServer:
+    """Background HTTP server for the replica page; use as a context manager"""
+
+    def __init__(self, directory: Path = BENCHMARK_DIR, port: int = 0):
+        handler = functools.partial(_QuietHandler, directory=str(directory))
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, name="local-form", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/{REPLICA_PAGE}"
+
+    def __enter__(self) -> "LocalFormServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,315 @@
+"""
+Pipeline benchmark: time every stage over the bundled samples, offline, and emit JSON
+
+Usage (from the repository root):
+    python -m benchmarks.pipeline --iterations 20 --output bench.json
+    python -m benchmarks.pipeline --compare bench.json      # deltas against an earlier run
+    python -m benchmarks.pipeline --no-browser              # extraction stages only
+    python -m benchmarks.pipeline --prompt-mode compact     # schema-built prompts; compare model_usage
+
+Gemini is replaced by a stub replaying benchmarks/recordings with a seeded
+latency, and the form is a local replica served on localhost, so results are
+comparable across commits. Per-stage memory peaks come from one extra
+tracemalloc pass, kept separate so tracing does not distort the timings.
+"""
+import argparse
+import asyncio
+import io
+import json
+import math
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+from starlette.datastructures import UploadFile
+
+from benchmarks.local_form import LocalFormServer
+from benchmarks.stub_model import RECORDINGS_DIR, StubGeminiClient, StubModel, _recorded_values, load_recordings
+from document_processor import DocumentProcessor
+from fill_plan import build_fill_plan
+from image_prep import prepare_image
+from ingestion import ingest_upload
+from model_usage import usage_stats
+from pdf_form_fields import extract_g28_fields
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+PASSPORT_SAMPLE = REPO_ROOT / "Chinese_passport_example.jpg"
+G28_SAMPLE = REPO_ROOT / "Example_G-28.pdf"
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class StageTimer:
+    """Collect wall-clock samples per stage; in trace mode also the tracemalloc peak per stage"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.memory_peaks = {}
+        self.trace = False
+
+    @contextmanager
+    def stage(self, name: str):
+        if self.trace:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            yield
+            peak = tracemalloc.get_traced_memory()[1] - baseline
+            self.memory_peaks[name] = max(self.memory_peaks.get(name, 0), peak)
+            return
+        started = time.perf_counter()
+        yield
+        self.samples[name].append(time.perf_counter() - started)
+
+
+class PipelineBenchmark:
+    def __init__(self, args):
+        self.args = args
+        self.timer = StageTimer()
+        self.skipped = {}
+        self.workdir = Path(tempfile.mkdtemp(prefix="doc-bench-"))
+        self.passport_bytes = PASSPORT_SAMPLE.read_bytes()
+        self.g28_bytes = G28_SAMPLE.read_bytes()
+        self.stub = StubModel(load_recordings(RECORDINGS_DIR), latency_ms=args.model_latency_ms,
+                              jitter_ms=args.model_jitter_ms, seed=args.seed)
+        # No cache: every iteration must pay for every stage
+        self.processor = DocumentProcessor("stub-key", client=StubGeminiClient(self.stub), prompt_mode=args.prompt_mode)
+
+    async def _ingest(self, data: bytes, filename: str):
+        upload = UploadFile(io.BytesIO(data), filename=filename)
+        return await ingest_upload(upload, MAX_UPLOAD_BYTES, persist_dir=self.workdir)
+
+    async def extraction_iteration(self):
+        timer = self.timer
+        with timer.stage("upload_write"):
+            passport = await self._ingest(self.passport_bytes, "passport.jpg")
+            g28 = await self._ingest(self.g28_bytes, "g28.pdf")
+
+        with timer.stage("pdf_form_read"):
+            await asyncio.to_thread(extract_g28_fields, g28.open())
+
+        if "pdf_render" not in self.skipped:
+            try:
+                with timer.stage("pdf_render"):
+                    await asyncio.to_thread(self.processor._load_model_images, g28, "g28")
+            except ValueError as e:
+                # Poppler missing; the stage is reported as skipped
+                self.skipped["pdf_render"] = str(e)
+                self.timer.samples.pop("pdf_render", None)
+
+        with timer.stage("image_prep"):
+            part, _ = await asyncio.to_thread(prepare_image, passport.data, "passport")
+
+        with timer.stage("model_call"):
+            response = await self.processor._generate([self.processor.prompts["passport"], part], doc_type="passport")
+
+        with timer.stage("json_parse"):
+            self.processor._parse_json_response(response.text)
+
+        if not timer.trace:
+            # Streamed extraction: how long until the first field reaches the caller
+            started = time.perf_counter()
+            first_field = []
+
+            def on_field(doc_type, key, value):
+                if not first_field:
+                    first_field.append(time.perf_counter() - started)
+
+            await self.processor.extract_passport_info(passport, on_field)
+            timer.samples["first_field"] += first_field
+
+        with timer.stage("extract_total"):
+            await self.processor.extract_documents({"passport": passport, "g28": g28})
+
+        # Content-addressed files are only written once; remove them so the next write is real
+        for path in (passport.path, g28.path):
+            Path(path).unlink(missing_ok=True)
+
+    def browser_iteration(self, form_filler, driver_path, index: int):
+        from driver_pool import launch_driver
+
+        timer = self.timer
+        passport_data = _recorded_values(self.stub.recordings["passport"])
+        g28_data = _recorded_values(self.stub.recordings["g28"])
+        with timer.stage("driver_start"):
+            driver = launch_driver(driver_path)
+        try:
+            with timer.stage("navigation"):
+                driver.get(form_filler.form_url)
+                form_filler._wait_for_page_ready(driver)
+            with timer.stage("fill"):
+                snapshot = form_filler._analyze_form_structure(driver)
+                plan = build_fill_plan(passport_data, g28_data, form_filler.form_url, snapshot)
+                report = form_filler._apply_plan(driver, plan, snapshot)
+            with timer.stage("screenshot"):
+                form_filler._capture_screenshot(driver, f"bench{index}")
+        finally:
+            driver.quit()
+        return report
+
+    async def run(self) -> dict:
+        args = self.args
+        for index in range(args.warmup + args.iterations):
+            if index == args.warmup:
+                self.timer.samples.clear()
+            await self.extraction_iteration()
+
+        self.timer.trace = True
+        tracemalloc.start()
+        try:
+            await self.extraction_iteration()
+        finally:
+            tracemalloc.stop()
+            self.timer.trace = False
+
+        fill_report = None
+        if args.no_browser:
+            self.skipped["browser"] = "disabled with --no-browser"
+        else:
+            fill_report = await asyncio.to_thread(self._run_browser_stages)
+
+        return self.report(fill_report)
+
+    def _run_browser_stages(self):
+        try:
+            from driver_pool import resolve_driver_path
+            from form_filler import FormFiller
+        except ImportError as e:
+            self.skipped["browser"] = str(e)
+            return None
+
+        driver_path = resolve_driver_path()
+        report = None
+        with LocalFormServer() as server:
+            form_filler = FormFiller(profile="fast", form_url=server.url,
+                                     screenshot_dir=str(self.workdir / "screenshots"))
+            form_filler.waits["review_pause"] = 0
+            try:
+                browser_runs = max(1, self.args.browser_iterations)
+                for index in range(browser_runs + 1):
+                    if index == 1:
+                        # The first run warms the snapshot cache and Chrome's disk cache
+                        for stage in ("driver_start", "navigation", "fill", "screenshot"):
+                            self.timer.samples.pop(stage, None)
+                    report = self.browser_iteration(form_filler, driver_path, index)
+            except Exception as e:
+                self.skipped["browser"] = f"browser stages failed: {e}"
+        return report
+
+    def report(self, fill_report) -> dict:
+        stages = {}
+        for name, values in self.timer.samples.items():
+            stages[name] = {
+                "n": len(values),
+                "p50_ms": round(percentile(values, 0.5) * 1000, 2),
+                "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+                "mean_ms": round(sum(values) / len(values) * 1000, 2),
+                "max_ms": round(max(values) * 1000, 2),
+            }
+            if name in self.timer.memory_peaks:
+                stages[name]["peak_alloc_kb"] = round(self.timer.memory_peaks[name] / 1024, 1)
+        result = {
+            "benchmark": "pipeline",
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {
+                "iterations": self.args.iterations,
+                "warmup": self.args.warmup,
+                "browser_iterations": self.args.browser_iterations,
+                "model_latency_ms": self.args.model_latency_ms,
+                "model_jitter_ms": self.args.model_jitter_ms,
+                "seed": self.args.seed,
+                "prompt_mode": self.args.prompt_mode,
+            },
+            "stages": stages,
+            "skipped": self.skipped,
+            # Tokens are estimated: the stub, like the pinned SDK, reports no usage metadata
+            "model_usage": usage_stats.snapshot(),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        if fill_report is not None:
+            result["fields_filled"] = sum(1 for entry in fill_report.values() if entry["status"] == "filled")
+        return result
+
+    def cleanup(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def compare(current: dict, baseline: dict):
+    """Print p50/p95 changes per stage against an earlier run"""
+    print(f"\nCompared with {baseline.get('commit')} ({baseline.get('timestamp')})")
+    print(f"{'stage':<16}{'p50 ms':>10}{'Δ p50':>9}{'p95 ms':>10}{'Δ p95':>9}")
+    for name, stats in current["stages"].items():
+        before = baseline.get("stages", {}).get(name)
+        deltas = []
+        for key in ("p50_ms", "p95_ms"):
+            if before and before.get(key):
+                deltas.append(f"{(stats[key] - before[key]) / before[key] * 100:+.1f}%")
+            else:
+                deltas.append("n/a")
+        print(f"{name:<16}{stats['p50_ms']:>10.2f}{deltas[0]:>9}{stats['p95_ms']:>10.2f}{deltas[1]:>9}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline per-stage pipeline benchmark")
+    parser.add_argument("--iterations", type=int, default=20, help="Timed extraction iterations")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed iterations first")
+    parser.add_argument("--browser-iterations", type=int, default=5, help="Timed browser runs (each starts Chrome)")
+    parser.add_argument("--no-browser", action="store_true", help="Skip the Selenium stages")
+    parser.add_argument("--model-latency-ms", type=float, default=800, help="Stub model latency")
+    parser.add_argument("--model-jitter-ms", type=float, default=200, help="Stub model latency jitter (+/-)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the stub latency jitter")
+    parser.add_argument("--prompt-mode", choices=("full", "compact"), default="full", help="Extraction prompt set")
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", help="Earlier JSON report to compare against")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    benchmark = PipelineBenchmark(args)
+    try:
+        result = asyncio.run(benchmark.run())
+    finally:
+        benchmark.cleanup()
+
+    text = json.dumps(result, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+        print(f"Benchmark report written to {args.output}")
+    else:
+        print(text)
+    if args.compare:
+        compare(result, json.loads(Path(args.compare).read_text(encoding="utf-8")))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Stub model module: deterministic offline stand-in for Gemini that replays recorded responses
+"""
+import json
+import random
+import re
+import threading
+import time
+from pathlib import Path
+
+from document_processor import DOCUMENT_LABELS, field_descriptions
+from gemini_client import GeminiClient, GeminiClientRegistry
+
+RECORDINGS_DIR = Path(__file__).parent / "recordings"
+
+# Streamed answers: characters per chunk, and the share of the latency spent before the first chunk
+STREAM_CHUNK_CHARS = 32
+FIRST_CHUNK_FRACTION = 0.3
+
+
+class StubResponse:
+    """The part of a generate_content response the processor reads"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+def load_recordings(recordings_dir: Path = RECORDINGS_DIR) -> dict:
+    """doc_type -> recorded raw response text, from <doc_type>.txt files"""
+    return {path.stem: path.read_text(encoding="utf-8") for path in sorted(Path(recordings_dir).glob("*.txt"))}
+
+
+def _recorded_values(text: str) -> dict:
+    body = text.strip().removeprefix("```json").removesuffix("```")
+    return json.loads(body)
+
+
+class StubModel:
+    """Answers generate_content calls from recordings after a configurable, seeded latency.
+
+    Full prompts get the recording verbatim (code fence included, so parsing is
+    exercised); narrowed field prompts and combined prompts get the matching
+    subset or merge of the recorded values.
+    """
+
+    def __init__(self, recordings: dict = None, latency_ms: float = 800, jitter_ms: float = 200, seed: int = 0):
+        self.recordings = recordings if recordings is not None else load_recordings()
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _delay(self) -> float:
+        with self._lock:
+            self.calls += 1
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def _doc_type(self, prompt: str) -> str:
+        for doc_type, label in DOCUMENT_LABELS.items():
+            if f"this {label}" in prompt:
+                return doc_type
+        raise ValueError("Stub model cannot tell which document the prompt is about")
+
+    def _answer(self, contents: list) -> str:
+        prompt = contents[0]
+        if prompt.startswith("Please analyze the following documents"):
+            doc_types = [part.split(": ", 1)[1] for part in contents
+                         if isinstance(part, str) and part.startswith("Document type: ")]
+            return json.dumps({doc_type: _recorded_values(self.recordings[doc_type]) for doc_type in doc_types})
+
+        doc_type = self._doc_type(prompt)
+        if "extract only the following fields" in prompt:
+            requested = prompt.split("Extract these fields:", 1)[1].split("\n\n", 1)[0]
+            keys = re.findall(r"^- (\w+):", requested, re.MULTILINE)
+            values = _recorded_values(self.recordings[doc_type])
+            return json.dumps({key: values.get(key, "N/A") for key in keys if key in field_descriptions(doc_type)})
+        return self.recordings[doc_type]
+
+    def generate_content(self, contents: list, stream: bool = False, generation_config: dict = None):
+        answer = self._answer(contents)
+        if stream:
+            return self._stream(answer, self._delay())
+        time.sleep(self._delay())
+        return StubResponse(answer)
+
+    def _stream(self, answer: str, delay: float):
+        """Yield the answer in chunks: the first after part of the latency, the rest spread over the remainder"""
+        chunks = [answer[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(answer), STREAM_CHUNK_CHARS)] or [""]
+        time.sleep(delay * FIRST_CHUNK_FRACTION)
+        for index, chunk in enumerate(chunks):
+            if index:
+                time.sleep(delay * (1 - FIRST_CHUNK_FRACTION) / max(1, len(chunks) - 1))
+            yield StubResponse(chunk)
+
+
+class StubGeminiClient(GeminiClient):
+    """A GeminiClient whose models are all the stub, keeping the real throttle/retry/hedge path"""
+
+    def __init__(self, stub: StubModel, **client_options):
+        super().__init__("stub-key", **client_options)
+        self.stub = stub
+
+    def model(self, model_name: str) -> StubModel:
+        return self.stub
+
+
+class StubClientRegistry(GeminiClientRegistry):
+    """A GeminiClientRegistry handing out stub clients, one per API key as in the service"""
+
+    def __init__(self, stub: StubModel, max_clients: int = 64, **client_options):
+        super().__init__(max_clients, **client_options)
+        self.stub = stub
+
+    def _create(self, api_key: str) -> StubGeminiClient:
+        return StubGeminiClient(self.stub, **self.client_options)
@@ -0,0 +1,79 @@
+"""
+Concurrency module: bounded thread executors that keep blocking work off the event loop
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+
+class OverloadedError(Exception):
+    """Raised when an executor's queue is full and new work must be rejected"""
+
+    def __init__(self, name: str, retry_after: int = 5):
+        super().__init__(f"Server is busy ({name} queue is full), please retry shortly")
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+    """Run blocking callables on a dedicated thread pool with a queue-depth limit.
+
+    At most max_concurrent calls run at once; up to max_queue more may wait for
+    a free worker. Anything beyond that is rejected with OverloadedError instead
+    of piling up behind a slow upstream.
+    """
+
+    def __init__(self, max_concurrent: int = 4, max_queue: int = 16, name: str = "model"):
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix=name)
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.rejected = 0
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) in the pool and await its result.
+
+        A call stays counted until its worker thread finishes, even if the caller
+        stops waiting (e.g. a losing hedged request), so the limit reflects real work.
+        """
+        with self._lock:
+            if self._pending >= self.max_concurrent + self.max_queue:
+                self.rejected += 1
+                raise OverloadedError(self.name)
+            self._pending += 1
+
+        # Carry context variables (e.g. request-scoped state) into the worker thread
+        ctx = contextvars.copy_context()
+        call = functools.partial(ctx.run, fn, *args, **kwargs)
+        try:
+            future = self._executor.submit(call)
+        except BaseException:
+            self._finished(None)
+            raise
+        future.add_done_callback(self._finished)
+        return await asyncio.wrap_future(future)
+
+    def _finished(self, future):
+        # Called from the worker thread, or right away for a queued call that was cancelled
+        with self._lock:
+            self._pending -= 1
+            self.completed += 1
+
+    def stats(self) -> dict:
+        """Current load and lifetime counters"""
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "running": min(self._pending, self.max_concurrent),
+            "queued": max(0, self._pending - self.max_concurrent),
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
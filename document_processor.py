@@ -1,67 +1,36 @@
 """
 Document processing module: extract document information using the Gemini API
 """
+import asyncio
+import hashlib
 import json
+import time
 from pathlib import Path
-import google.generativeai as genai
-from PIL import Image
+from typing import Callable, Optional, Union
 
+from concurrency import BoundedExecutor, OverloadedError
+from extraction_cache import ExtractionCache, file_sha256, make_batch_key, make_cache_key
+from field_validation import MRZ_FIELDS, check_field, fields_needing_retry, is_missing
+from gemini_client import GeminiClient, structured_output_config
+from image_prep import IMAGE_BUDGETS, crop_bottom_band, prepare_image
+from ingestion import IngestedFile
+from metrics import metrics
+from model_usage import record_call
+from pdf_render import RENDER_VERSION, PageRenderer
+from pdf_form_fields import extract_g28_fields
+from streaming_json import IncrementalJsonParser
 
-class DocumentProcessor:
-    def __init__(self, api_key: str):
-        """Initialize with the API key."""
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.5-flash-lite')
-    
-    def _load_image(self, file_path: str) -> Image.Image:
-        """Load an image or convert the first page of a PDF to an image"""
-        path = Path(file_path)
-        suffix = path.suffix.lower()
-        
-        if suffix == ".pdf":
-            try:
-                from pdf2image import convert_from_path
-                images = convert_from_path(file_path, first_page=1, last_page=1, dpi=200)
-                if images:
-                    return images[0]
-            except Exception as e:
-                raise ValueError(f"PDF conversion failed: {e}")
-        else:
-            return Image.open(file_path)
-        
-        raise ValueError(f"Unsupported file type: {suffix}")
-    
-    def _parse_json_response(self, text: str) -> dict:
-        """Parse JSON from the model response text"""
-        text = text.strip()
-        if text.startswith("```json"):
-            text = text[7:]
-        if text.startswith("```"):
-            text = text[3:]
-        if text.endswith("```"):
-            text = text[:-3]
-        text = text.strip()
-        
-        try:
-            return json.loads(text)
-        except json.JSONDecodeError:
-            start = text.find("{")
-            end = text.rfind("}") + 1
-            if start != -1 and end > start:
-                try:
-                    return json.loads(text[start:end])
-                except json.JSONDecodeError:
-                    pass
-            return {"error": "Failed to parse response", "raw_response": text[:500]}
-    
-    async def extract_passport_info(self, file_path: str) -> dict:
-        """Extract information from a passport"""
-        try:
-            image = self._load_image(file_path)
-        except Exception as e:
-            return {"error": f"File processing failed: {str(e)}"}
-        
-        prompt = """Please analyze this passport image and extract the following information.
+MODEL_NAME = "gemini-2.5-flash-lite"
+# Stronger model used only for fields the cheap model still gets wrong after a targeted retry
+ESCALATION_MODEL = "gemini-2.5-flash"
+
+# Documents arrive either as a path on disk or as an upload held in memory
+DocumentSource = Union[str, IngestedFile]
+
+# Streaming callback: on_field(doc_type, key, value) for each field as soon as the model has produced it
+FieldCallback = Callable[[str, str, object], None]
+
+PASSPORT_PROMPT = """Please analyze this passport image and extract the following information.
 Return the data in a structured JSON format.
 
 Extract these fields:
@@ -93,21 +62,8 @@ IMPORTANT: Respond ONLY with a valid JSON object, no other text. Example:
     "date_of_expiry": "2030-01-01",
     "issuing_country": "United States"
 }"""
-        
-        try:
-            response = self.model.generate_content([prompt, image])
-            return self._parse_json_response(response.text)
-        except Exception as e:
-            return {"error": f"API call failed: {str(e)}"}
-    
-    async def extract_g28_info(self, file_path: str) -> dict:
-        """Extract information from a G-28 form"""
-        try:
-            image = self._load_image(file_path)
-        except Exception as e:
-            return {"error": f"File processing failed: {str(e)}"}
-        
-        prompt = """Please analyze this G-28 form and extract the following information.
+
+G28_PROMPT = """Please analyze this G-28 form and extract the following information.
 
 Extract these fields:
 - attorney_name: Attorney or representative's full name
@@ -148,9 +104,609 @@ IMPORTANT: Respond ONLY with a valid JSON object, no other text. Example:
     "client_alien_number": "A123456789",
     "daytime_phone": "555-987-6543"
 }"""
+
+PROMPTS = {
+    "passport": PASSPORT_PROMPT,
+    "g28": G28_PROMPT,
+}
+
+DOCUMENT_LABELS = {
+    "passport": "passport image",
+    "g28": "G-28 form",
+}
+
+# Declared fields per document type: key -> description. The full prompts above
+# list the same fields; narrowed, combined and compact prompts are built from this.
+FIELD_SCHEMAS = {
+    "passport": {
+        "full_name": "Full name as shown on passport",
+        "first_name": "First/Given name",
+        "last_name": "Last/Family/Surname",
+        "date_of_birth": "Date of birth (format: YYYY-MM-DD)",
+        "passport_number": "Passport number",
+        "nationality": "Country/Nationality",
+        "gender": "Gender (Male/Female)",
+        "place_of_birth": "Place of birth",
+        "date_of_issue": "Issue date (format: YYYY-MM-DD)",
+        "date_of_expiry": "Expiry date (format: YYYY-MM-DD)",
+        "issuing_country": "Country that issued the passport",
+    },
+    "g28": {
+        "attorney_name": "Attorney or representative's full name",
+        "attorney_first_name": "Attorney's first name",
+        "attorney_last_name": "Attorney's last name",
+        "firm_name": "Law firm or organization name",
+        "attorney_address": "Full street address",
+        "attorney_city": "City",
+        "attorney_state": "State",
+        "attorney_zip": "ZIP or postal code",
+        "attorney_phone": "Phone number",
+        "attorney_fax": "Fax number",
+        "attorney_email": "Email address",
+        "bar_number": "Bar number or license number",
+        "uscis_online_account": "USCIS online account number",
+        "client_name": "Name of the client",
+        "client_alien_number": "Alien registration number (A-Number)",
+        "daytime_phone": "Daytime phone number",
+    },
+}
+
+
+COMBINED_PROMPT_INSTRUCTIONS = """IMPORTANT: Respond ONLY with a valid JSON object, no other text.
+The object must have one key per document type listed above, each holding an object with that document's fields.
+If any field cannot be found or is unclear, use "N/A"."""
+
+
+def field_descriptions(doc_type: str) -> dict:
+    """Field key -> description from the declared schema"""
+    return FIELD_SCHEMAS[doc_type]
+
+
+def build_compact_prompt(doc_type: str) -> str:
+    """Short prompt built from the field schema: the key list without the example JSON of the full prompt"""
+    field_lines = "\n".join(f"- {key}: {description}" for key, description in field_descriptions(doc_type).items())
+    return f"""Extract the fields of this {DOCUMENT_LABELS[doc_type]} as one JSON object with exactly these keys:
+{field_lines}
+Use "N/A" for a field that cannot be found or is unclear. Respond with the JSON object only."""
+
+
+COMPACT_PROMPTS = {doc_type: build_compact_prompt(doc_type) for doc_type in FIELD_SCHEMAS}
+
+PROMPT_MODES = {
+    "full": PROMPTS,
+    "compact": COMPACT_PROMPTS,
+}
+
+
+def response_schema(doc_type: str, keys) -> dict:
+    """JSON schema of a response holding the given string fields of one document"""
+    descriptions = field_descriptions(doc_type)
+    return {
+        "type": "OBJECT",
+        "properties": {key: {"type": "STRING", "description": descriptions.get(key, key)} for key in keys},
+        "required": list(keys),
+    }
+
+
+def build_fields_prompt(doc_type: str, keys: list, rejected: Optional[dict] = None) -> str:
+    """Prompt asking only for the given fields of a document.
+
+    rejected maps a key to (previous_value, reason) for answers that failed
+    validation, so the model is told what was wrong with them.
+    """
+    descriptions = field_descriptions(doc_type)
+    field_lines = "\n".join(f"- {key}: {descriptions.get(key, key)}" for key in keys)
+    notes = ""
+    if rejected:
+        note_lines = "\n".join(f'- {key}: "{value}" was rejected ({reason})' for key, (value, reason) in rejected.items())
+        notes = f"\n\nA previous reading of these fields was rejected; read them again carefully:\n{note_lines}"
+    return f"""Please analyze this {DOCUMENT_LABELS[doc_type]} and extract only the following fields.
+
+Extract these fields:
+{field_lines}{notes}
+
+If any field cannot be found, use "N/A".
+
+IMPORTANT: Respond ONLY with a valid JSON object containing exactly these keys, no other text."""
+
+
+def combined_response_schema(doc_types: list) -> dict:
+    """JSON schema of a combined response, {doc_type: {fields}}"""
+    return {
+        "type": "OBJECT",
+        "properties": {doc_type: response_schema(doc_type, list(field_descriptions(doc_type))) for doc_type in doc_types},
+        "required": list(doc_types),
+    }
+
+
+def build_combined_prompt(doc_types: list) -> str:
+    """Prompt extracting several documents at once into {doc_type: {...}}"""
+    sections = []
+    for doc_type in doc_types:
+        field_lines = "\n".join(f"- {key}: {description}" for key, description in field_descriptions(doc_type).items())
+        sections.append(f"For the {DOCUMENT_LABELS[doc_type]} (key \"{doc_type}\"), extract these fields:\n{field_lines}")
+    body = "\n\n".join(sections)
+    return f"""Please analyze the following documents. Each image is preceded by a line naming its document type.
+
+{body}
+
+{COMBINED_PROMPT_INSTRUCTIONS}"""
+
+
+class RefinementStats:
+    """How often extractions needed a follow-up pass, and how often it helped"""
+
+    def __init__(self):
+        self.counters = {"checked": 0, "refined": 0, "escalated": 0, "fields_requeried": 0, "fields_fixed": 0}
+
+    def add(self, **counts):
+        for key, value in counts.items():
+            self.counters[key] += value
+
+    def snapshot(self) -> dict:
+        return dict(self.counters)
+
+
+# Shared by every DocumentProcessor in the process
+refinement_stats = RefinementStats()
+
+
+def source_suffix(source: DocumentSource) -> str:
+    """Lower-case file extension of a document source, from sniffed type for uploads"""
+    if isinstance(source, IngestedFile):
+        return source.suffix
+    return Path(source).suffix.lower()
+
+
+def _deduplicated(on_field: FieldCallback) -> FieldCallback:
+    """Forward each field once; a fallback call repeats fields the combined stream already sent"""
+    sent = {}
+    
+    def forward(doc_type: str, key: str, value):
+        if (doc_type, key) in sent and sent[(doc_type, key)] == value:
+            return
+        sent[(doc_type, key)] = value
+        on_field(doc_type, key, value)
+    return forward
+
+
+def prompt_version(prompt: str) -> str:
+    """Derive the prompt version from its text so edits invalidate cached results"""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+
+
+class DocumentProcessor:
+    def __init__(self, api_key: str, cache: Optional[ExtractionCache] = None,
+                 executor: Optional[BoundedExecutor] = None, image_budgets: Optional[dict] = None,
+                 client: Optional[GeminiClient] = None, escalation_model: Optional[str] = ESCALATION_MODEL,
+                 refine: bool = True, crop_regions: bool = True, renderer: Optional[PageRenderer] = None,
+                 prompt_mode: str = "full"):
+        """Initialize with the API key, an optional shared extraction cache, model executor and client.
+
+        Pass a client from a GeminiClientRegistry to share its connection, rate limit
+        and retry policy across requests; otherwise a private client is created.
+        With refine, missing or invalid fields are re-asked with a narrowed prompt,
+        then escalated to escalation_model (None disables escalation). PDF pages are
+        rasterized by renderer (pass a shared one with worker processes; by default
+        pages render in the calling thread). prompt_mode "compact" sends the short
+        schema-built prompts and, where the SDK supports it, asks for JSON output
+        matching the schema.
+        """
+        if prompt_mode not in PROMPT_MODES:
+            raise ValueError(f"Unknown prompt mode: {prompt_mode}")
+        self.model_name = MODEL_NAME
+        self.prompt_mode = prompt_mode
+        self.prompts = PROMPT_MODES[prompt_mode]
+        self.escalation_model = escalation_model if escalation_model != MODEL_NAME else None
+        self.refine = refine
+        self.crop_regions = crop_regions
+        self.client = client or GeminiClient(api_key, executor=executor)
+        self.cache = cache
+        self.image_budgets = image_budgets or IMAGE_BUDGETS
+        self.renderer = renderer or PageRenderer()
+    
+    def _load_model_images(self, source: DocumentSource, doc_type: str) -> list:
+        """Load the document as model content, shrunk to the upload budget for its type.
+        
+        Images give a single part. PDFs give one labelled part per selected page,
+        so fields beyond the first page reach the model in the same request.
+        Size statistics go to image_stats and render times to the current timing
+        scope; nothing per call is kept on the shared processor.
+        """
+        budget = self.image_budgets.get(doc_type)
+        if source_suffix(source) == ".pdf":
+            data = source.data if isinstance(source, IngestedFile) else Path(source).read_bytes()
+            pages = self.renderer.render(data, doc_type, budget, len(data))
+            if len(pages) == 1:
+                return [pages[0].part]
+            contents = []
+            for page in pages:
+                contents += [f"Page {page.number} of the document:", page.part]
+            return contents
+        
+        # Let the preprocessor open raster files itself so it can use reduced-size JPEG decoding
+        image = source.data if isinstance(source, IngestedFile) else source
+        with metrics.timer("image_prep"):
+            part, _ = prepare_image(image, doc_type, budget)
+        return [part]
+    
+    def _parse_json_response(self, text: str) -> dict:
+        """Parse JSON from the model response text"""
+        with metrics.timer("parse"):
+            return self._parse_json_text(text)
+    
+    def _parse_json_text(self, text: str) -> dict:
+        text = text.strip()
+        if text.startswith("```json"):
+            text = text[7:]
+        if text.startswith("```"):
+            text = text[3:]
+        if text.endswith("```"):
+            text = text[:-3]
+        text = text.strip()
+        
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            start = text.find("{")
+            end = text.rfind("}") + 1
+            if start != -1 and end > start:
+                try:
+                    return json.loads(text[start:end])
+                except json.JSONDecodeError:
+                    pass
+            return {"error": "Failed to parse response", "raw_response": text[:500]}
+    
+    async def extract_passport_info(self, source: DocumentSource, on_field: Optional[FieldCallback] = None) -> dict:
+        """Extract information from a passport (file path or in-memory upload)"""
+        return await self._extract(source, "passport", on_field)
+    
+    async def extract_g28_info(self, source: DocumentSource, on_field: Optional[FieldCallback] = None) -> dict:
+        """Extract information from a G-28 form (file path or in-memory upload)"""
+        return await self._extract(source, "g28", on_field)
+    
+    async def extract_documents(self, files: dict, on_field: Optional[FieldCallback] = None) -> dict:
+        """Extract several documents ({doc_type: source}) in as few model calls as possible.
+        
+        Cached documents and fillable G-28 PDFs are resolved locally; the rest share
+        one multimodal request. If that combined response cannot be parsed, each
+        remaining document falls back to its own call. Identical concurrent
+        requests share the same calls.
+        
+        With on_field, the model response is streamed and each field is reported
+        as soon as it is complete, before validation and refinement; the returned
+        dict remains the final, validated result.
+        """
+        results = {}
+        keys = {}
+        remaining = []
+        for doc_type, source in files.items():
+            if self.cache is not None:
+                try:
+                    keys[doc_type] = await self._cache_key(source, doc_type)
+                except OSError as e:
+                    results[doc_type] = {"error": f"File processing failed: {str(e)}"}
+                    continue
+                cached = await self.cache.lookup(keys[doc_type])
+                if cached is not None:
+                    results[doc_type] = cached
+                    continue
+            remaining.append(doc_type)
+        
+        pending = {doc_type: files[doc_type] for doc_type in remaining}
+        if pending and self.cache is None:
+            results.update(await self._extract_uncached(pending, keys, on_field))
+        elif pending:
+            # Each document is cached under its own key; the batch key only shares the calls.
+            # Coalesced callers get no field stream, only the result.
+            batch_key = make_batch_key([keys[doc_type] for doc_type in remaining])
+            resolved = await self.cache.get_or_compute(
+                batch_key, lambda: self._extract_uncached(pending, keys, on_field), store=False)
+            results.update({doc_type: dict(values) for doc_type, values in resolved.items()})
+        
+        return {doc_type: results[doc_type] for doc_type in files}
+    
+    async def _extract_uncached(self, files: dict, keys: dict, on_field: Optional[FieldCallback] = None) -> dict:
+        """Extract documents missing from the cache, caching each successful result under its key"""
+        if on_field is not None:
+            on_field = _deduplicated(on_field)
+        
+        # PDFs whose form layer could be read and lone documents do not benefit from a combined request;
+        # scanned or flattened PDFs without usable form data join it like any image
+        form_reads = await asyncio.gather(*(self._read_form_values(files[doc_type], doc_type) for doc_type in files))
+        form_values = {doc_type: values for doc_type, values in zip(files, form_reads) if values is not None}
+        individual = [doc_type for doc_type in files if doc_type not in form_values]
+        combined = individual if len(individual) >= 2 else []
+        
+        results = {}
+        if combined:
+            results = await self._run_combined_extraction({doc_type: files[doc_type] for doc_type in combined},
+                                                           on_field)
+            # Documents the combined call did not resolve get their own call
+            individual = [doc_type for doc_type in combined if doc_type not in results]
+        
+        outcomes = await asyncio.gather(
+            *(self._complete_from_form(files[doc_type], doc_type, values, on_field)
+              for doc_type, values in form_values.items()),
+            *(self._run_extraction(files[doc_type], doc_type, on_field, read_form=False) for doc_type in individual))
+        results.update(zip([*form_values, *individual], outcomes))
+        
+        if self.cache is not None:
+            for doc_type, values in results.items():
+                if "error" not in values:
+                    await self.cache.put(keys[doc_type], values)
+        return results
+    
+    def _has_local_fast_path(self, source: DocumentSource, doc_type: str) -> bool:
+        return doc_type == "g28" and source_suffix(source) == ".pdf"
+    
+    async def _read_form_values(self, source: DocumentSource, doc_type: str) -> Optional[dict]:
+        """Field values from a fillable PDF's form layer; None when the document has none to offer"""
+        if not self._has_local_fast_path(source, doc_type):
+            return None
+        pdf = source.open() if isinstance(source, IngestedFile) else source
+        with metrics.timer("pdf_form_read"):
+            return await asyncio.to_thread(extract_g28_fields, pdf)
+    
+    async def _complete_from_form(self, source: DocumentSource, doc_type: str, form_values: dict,
+                                  on_field: Optional[FieldCallback] = None) -> dict:
+        """Report the values read from the form layer, then ask the model for whatever it lacked"""
+        if on_field:
+            for key, value in form_values.items():
+                on_field(doc_type, key, value)
+        return await self._complete_from_model(source, doc_type, form_values)
+    
+    async def _run_combined_extraction(self, files: dict, on_field: Optional[FieldCallback] = None) -> dict:
+        """One model call for several documents, returning {doc_type: values} for those it resolved.
+        
+        A document that fails to load gets its own error result and is left out of
+        the request, so it cannot fail the others. Documents missing from the
+        returned dict (the response did not match the merged schema, or fewer than
+        two loaded) need a call of their own.
+        """
+        results = {}
+        loaded = {}
+        outcomes = await asyncio.gather(*(
+            asyncio.to_thread(self._load_model_images, source, doc_type)
+            for doc_type, source in files.items()
+        ), return_exceptions=True)
+        for doc_type, outcome in zip(files, outcomes):
+            if isinstance(outcome, Exception):
+                results[doc_type] = {"error": f"File processing failed: {str(outcome)}"}
+            elif isinstance(outcome, BaseException):
+                raise outcome
+            else:
+                loaded[doc_type] = outcome
+        if len(loaded) < 2:
+            return results
+        
+        doc_types = list(loaded)
+        images = list(loaded.values())
+        contents = [build_combined_prompt(doc_types)]
+        for doc_type, image in zip(doc_types, images):
+            contents += [f"Document type: {doc_type}", *image]
+        
+        def on_member(path: tuple, value):
+            # Members arrive as (doc_type, key) under the merged schema
+            if len(path) == 2 and path[0] in doc_types:
+                on_field(path[0], path[1], value)
         
         try:
-            response = self.model.generate_content([prompt, image])
-            return self._parse_json_response(response.text)
+            text = await self._generate_text(contents, "+".join(doc_types), combined_response_schema(doc_types),
+                                             on_member if on_field else None)
+            parsed = self._parse_json_response(text)
+        except OverloadedError:
+            raise
+        except Exception as e:
+            print(f"Combined extraction failed: {e}")
+            return results
+        
+        if not all(isinstance(parsed.get(doc_type), dict) for doc_type in doc_types):
+            print("Combined extraction could not be parsed, falling back to per-document calls")
+            return results
+        refined = await asyncio.gather(*(
+            self._refine(doc_type, parsed[doc_type], image) for doc_type, image in zip(doc_types, images)
+        ))
+        results.update(zip(doc_types, refined))
+        return results
+    
+    async def _cache_key(self, source: DocumentSource, doc_type: str) -> str:
+        if isinstance(source, IngestedFile):
+            # Hashed while the upload streamed in
+            content_hash = source.sha256
+        else:
+            content_hash = await asyncio.to_thread(file_sha256, source)
+        version = prompt_version(self.prompts[doc_type])
+        if source_suffix(source) == ".pdf":
+            # Which pages are rendered, and how, changes what the model sees
+            version += f"+render{RENDER_VERSION}"
+        return make_cache_key(content_hash, doc_type, version, self._model_chain())
+    
+    async def _extract(self, source: DocumentSource, doc_type: str, on_field: Optional[FieldCallback] = None) -> dict:
+        """Run an extraction, going through the cache when one is configured"""
+        if self.cache is None:
+            return await self._run_extraction(source, doc_type, on_field)
+        
+        try:
+            key = await self._cache_key(source, doc_type)
+        except OSError as e:
+            return {"error": f"File processing failed: {str(e)}"}
+        
+        # Cache hits and callers coalesced onto another request's call get no field stream, only the result
+        return await self.cache.get_or_compute(key, lambda: self._run_extraction(source, doc_type, on_field))
+    
+    async def _run_extraction(self, source: DocumentSource, doc_type: str,
+                              on_field: Optional[FieldCallback] = None, read_form: bool = True) -> dict:
+        """Load the document and send it to the model with the prompt for its type.
+        
+        Pass read_form=False when the PDF form layer has already been tried.
+        """
+        if read_form:
+            form_values = await self._read_form_values(source, doc_type)
+            if form_values is not None:
+                return await self._complete_from_form(source, doc_type, form_values, on_field)
+        
+        try:
+            image = await asyncio.to_thread(self._load_model_images, source, doc_type)
+        except Exception as e:
+            return {"error": f"File processing failed: {str(e)}"}
+        
+        def on_member(path: tuple, value):
+            if len(path) == 1:
+                on_field(doc_type, path[0], value)
+        
+        try:
+            text = await self._generate_text([self.prompts[doc_type], *image], doc_type,
+                                             response_schema(doc_type, list(field_descriptions(doc_type))),
+                                             on_member if on_field else None)
+            values = self._parse_json_response(text)
+        except OverloadedError:
+            raise
         except Exception as e:
             return {"error": f"API call failed: {str(e)}"}
+        return await self._refine(doc_type, values, image)
+    
+    def _model_chain(self) -> str:
+        """Models that can contribute to a result, for the cache key"""
+        if self.refine and self.escalation_model:
+            return f"{self.model_name}>{self.escalation_model}"
+        return self.model_name
+    
+    async def _refine(self, doc_type: str, values: dict, image: list) -> dict:
+        """Re-ask only for missing/invalid fields: first on the same model, then on the escalation model.
+        
+        An unparseable first response counts as every field missing. Answers from
+        the follow-up passes are only taken when they pass validation.
+        """
+        refinement_stats.add(checked=1)
+        if not self.refine or ("error" in values and "raw_response" not in values):
+            # Nothing to refine, or the call itself failed (already retried by the client)
+            return values
+        
+        keys = list(field_descriptions(doc_type))
+        parse_failed = "error" in values
+        current = {} if parse_failed else dict(values)
+        problems = {key: "missing" for key in keys} if parse_failed else fields_needing_retry(doc_type, current, keys)
+        if not problems:
+            return values
+        
+        initial = len(problems)
+        refinement_stats.add(refined=1, fields_requeried=initial)
+        models = [self.model_name] + ([self.escalation_model] if self.escalation_model else [])
+        for model_name in models:
+            if model_name != self.model_name:
+                refinement_stats.add(escalated=1)
+            print(f"{doc_type}: re-asking {model_name} for {', '.join(sorted(problems))}")
+            answer = await self._requery(model_name, doc_type, problems, current, image)
+            for key in problems:
+                value = (answer or {}).get(key)
+                if value is not None and check_field(doc_type, key, value) is None:
+                    if not is_missing(value) or key not in current:
+                        current[key] = value
+            problems = fields_needing_retry(doc_type, {key: current.get(key, "N/A") for key in keys}, keys)
+            if not problems:
+                break
+        
+        refinement_stats.add(fields_fixed=max(0, initial - len(problems)))
+        if parse_failed and not current:
+            return values
+        return {key: current.get(key, "N/A") for key in keys}
+    
+    async def _requery(self, model_name: str, doc_type: str, problems: dict, current: dict,
+                       image: list) -> Optional[dict]:
+        """One narrowed call for the problem fields; None if it fails or cannot be parsed"""
+        rejected = {key: (current[key], reason) for key, reason in problems.items()
+                    if reason != "missing" and key in current}
+        contents = [build_fields_prompt(doc_type, list(problems), rejected), *image]
+        if self.crop_regions and doc_type == "passport" and MRZ_FIELDS & set(problems):
+            first_page = next((part for part in image if isinstance(part, dict)), None)
+            crop = await asyncio.to_thread(crop_bottom_band, first_page) if first_page is not None else None
+            if crop is not None:
+                contents += ["Zoomed view of the machine-readable zone at the bottom of the page:", crop]
+        
+        try:
+            response = await self._generate(contents, model_name, doc_type, response_schema(doc_type, list(problems)))
+            parsed = self._parse_json_response(response.text)
+        except OverloadedError:
+            raise
+        except Exception as e:
+            print(f"{doc_type}: follow-up call to {model_name} failed: {e}")
+            return None
+        return None if "error" in parsed else parsed
+    
+    async def _complete_from_model(self, source: DocumentSource, doc_type: str, values: dict) -> dict:
+        """Ask the model only for the fields a local parse could not provide"""
+        missing = [key for key in field_descriptions(doc_type) if key not in values]
+        if not missing:
+            print(f"{doc_type}: all fields read from PDF form data, skipping model call")
+            return values
+        
+        print(f"{doc_type}: {len(values)} fields read from PDF form data, asking model for {len(missing)}")
+        try:
+            image = await asyncio.to_thread(self._load_model_images, source, doc_type)
+        except Exception as e:
+            return {"error": f"File processing failed: {str(e)}"}
+        
+        try:
+            response = await self._generate([build_fields_prompt(doc_type, missing), *image], doc_type=doc_type,
+                                            schema=response_schema(doc_type, missing))
+            model_values = self._parse_json_response(response.text)
+        except OverloadedError:
+            raise
+        except Exception as e:
+            return {"error": f"API call failed: {str(e)}"}
+        if "error" in model_values:
+            return model_values
+        
+        merged = {**{key: model_values.get(key, "N/A") for key in missing}, **values}
+        # The model's answers get the same validation and targeted re-asks as any other extraction
+        return await self._refine(doc_type, {key: merged[key] for key in field_descriptions(doc_type)}, image)
+    
+    def _generation_config(self, schema: Optional[dict]) -> Optional[dict]:
+        """Structured JSON output in compact mode; the full prompts keep the model's defaults"""
+        if self.prompt_mode != "compact" or schema is None:
+            return None
+        return structured_output_config(schema)
+    
+    async def _generate(self, contents: list, model_name: Optional[str] = None, doc_type: Optional[str] = None,
+                        schema: Optional[dict] = None):
+        """Call the model through the client, which throttles, retries and runs it off the event loop.
+        
+        Tokens and request bytes are accounted under doc_type.
+        """
+        with metrics.timer("model_call"):
+            response = await self.client.generate(model_name or self.model_name, contents,
+                                                  self._generation_config(schema))
+        record_call(doc_type, contents, response, response.text)
+        return response
+    
+    async def _generate_text(self, contents: list, doc_type: str, schema: Optional[dict] = None,
+                             on_member: Optional[Callable[[tuple, object], None]] = None) -> str:
+        """Response text of a main extraction call; with on_member the response is streamed.
+        
+        While streaming, each JSON member is handed to on_member(path, value) on the
+        event loop as soon as it is complete. Chunks are forwarded from the worker
+        thread in order, so every member is delivered before this returns.
+        """
+        if on_member is None:
+            return (await self._generate(contents, doc_type=doc_type, schema=schema)).text
+        
+        loop = asyncio.get_running_loop()
+        parser = IncrementalJsonParser()
+        started = time.perf_counter()
+        
+        def deliver(piece: str):
+            nonlocal started
+            for path, value in parser.feed(piece):
+                if started is not None:
+                    # Time to first field, the latency a streaming client actually waits
+                    metrics.observe("model_first_field", time.perf_counter() - started)
+                    started = None
+                on_member(path, value)
+        
+        with metrics.timer("model_call"):
+            response = await self.client.generate_stream(
+                self.model_name, contents, lambda piece: loop.call_soon_threadsafe(deliver, piece),
+                self._generation_config(schema))
+        record_call(doc_type, contents, response, response.text)
+        return response.text
@@ -0,0 +1,323 @@
+"""
+Driver pool module: keep pre-launched headless Chrome instances warm for form filling
+"""
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Optional
+
+# Selenium and webdriver_manager are imported where they are used, so the service starts without them
+if TYPE_CHECKING:
+    from selenium.webdriver.chrome.options import Options
+
+
+def build_chrome_options() -> "Options":
+    """Chrome options shared by pooled and standalone drivers"""
+    from selenium.webdriver.chrome.options import Options
+    chrome_options = Options()
+    chrome_options.add_argument("--window-size=1280,900")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--headless=new")  # Use headless mode
+    chrome_options.add_argument("--disable-logging")  # Disable logging
+    chrome_options.add_argument("--log-level=3")  # Only show fatal errors
+    chrome_options.add_argument("--disable-gcm")  # Disable Google Cloud Messaging
+    chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])  # Suppress logging
+    return chrome_options
+
+
+def resolve_driver_path() -> Optional[str]:
+    """Resolve the ChromeDriver binary once; None means fall back to the system PATH"""
+    try:
+        from webdriver_manager.chrome import ChromeDriverManager
+        # Auto-download and manage ChromeDriver
+        # On Windows, ensure we get the correct executable
+        return ChromeDriverManager().install()
+    except Exception as e:
+        print(f"Warning: ChromeDriverManager failed ({e}), will use system ChromeDriver...")
+        return None
+
+
+def launch_driver(driver_path: Optional[str]):
+    """Start a Chrome instance using a resolved driver path, falling back to the system PATH"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    chrome_options = build_chrome_options()
+    if driver_path:
+        try:
+            # Suppress ChromeDriver logging by redirecting to null
+            service = Service(driver_path, service_log_path=os.devnull)
+            return webdriver.Chrome(service=service, options=chrome_options)
+        except Exception as e:
+            print(f"Warning: resolved ChromeDriver failed ({e}), trying system ChromeDriver...")
+    try:
+        return webdriver.Chrome(options=chrome_options)
+    except Exception as e:
+        raise Exception(f"Failed to initialize ChromeDriver: {e}. Please ensure Chrome browser is installed and ChromeDriver is available.")
+
+
+def process_tree_rss_mb(root_pid: int) -> Optional[float]:
+    """Resident memory of a process and all of its descendants, from /proc (Linux only; None elsewhere)"""
+    children = {}
+    rss_pages = {}
+    try:
+        entries = os.scandir("/proc")
+    except OSError:
+        return None
+    with entries:
+        for entry in entries:
+            if not entry.name.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry.name}/stat") as f:
+                    # Fields after the parenthesised command name: state, ppid, ..., rss is the 22nd
+                    fields = f.read().rsplit(")", 1)[1].split()
+            except (OSError, IndexError):
+                continue
+            pid = int(entry.name)
+            children.setdefault(int(fields[1]), []).append(pid)
+            rss_pages[pid] = int(fields[21])
+    if root_pid not in rss_pages:
+        return None
+    total = 0
+    pending = [root_pid]
+    while pending:
+        pid = pending.pop()
+        total += rss_pages.get(pid, 0)
+        pending += children.get(pid, [])
+    return total * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def browser_memory_mb(driver) -> Optional[float]:
+    """Resident memory of ChromeDriver and every Chrome process it started"""
+    try:
+        pid = driver.service.process.pid
+    except AttributeError:
+        return None
+    return process_tree_rss_mb(pid)
+
+
+class PooledDriver:
+    """A browser instance plus the bookkeeping the pool needs to recycle it"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+        self.created_at = time.time()
+        self.baseline_memory = None  # process-tree RSS parked on about:blank after the first job
+
+
+class DriverPool:
+    """Fixed-size pool of warm Chrome instances.
+
+    Browsers are health-checked on checkout, reset (cookies, storage, navigation)
+    on return, and replaced after max_uses jobs, after max_age_seconds, or once
+    the resident memory of their process tree has grown by more than
+    max_memory_growth_mb. Memory is always measured in the same state, parked on
+    about:blank right after a reset, against the reading taken after the
+    browser's first job; where it cannot be measured (non-Linux hosts) only the
+    use and age limits apply.
+    """
+
+    def __init__(self, size: int = 2, max_uses: int = 50, max_memory_growth_mb: int = 256,
+                 acquire_timeout: float = 60, max_age_seconds: float = 3600):
+        self.size = max(1, size)
+        self.max_uses = max_uses
+        self.max_age_seconds = max_age_seconds
+        self.max_memory_growth_mb = max_memory_growth_mb
+        self.acquire_timeout = acquire_timeout
+        self.driver_path = None
+
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        # Held only while the driver binary is resolved, which may download it; never nested in _lock
+        self._resolve_lock = threading.Lock()
+        self._resolved = False
+        self._live = 0
+        self._closed = False
+
+        self.launched = 0
+        self.recycled = 0
+        self.acquired = 0
+        self.memory_recycles = 0
+
+    def _resolve(self):
+        if self._resolved:
+            return
+        with self._resolve_lock:
+            if self._resolved:
+                return
+            driver_path = resolve_driver_path()
+            with self._lock:
+                self.driver_path = driver_path
+                self._resolved = True
+
+    def start(self):
+        """Resolve the driver binary and pre-launch the whole pool"""
+        self._resolve()
+        while True:
+            with self._lock:
+                if self._closed or self._live >= self.size:
+                    return
+                self._live += 1
+            try:
+                self._park(self._launch())
+            except Exception as e:
+                with self._lock:
+                    self._live -= 1
+                print(f"Warning: could not pre-launch browser: {e}")
+                return
+
+    def _park(self, pooled: PooledDriver):
+        """Make a browser available, or quit it if the pool shut down while it was out"""
+        with self._lock:
+            if not self._closed:
+                self._idle.put(pooled)
+                return
+        self._discard(pooled)
+
+    def _launch(self) -> PooledDriver:
+        pooled = PooledDriver(launch_driver(self.driver_path))
+        self.launched += 1
+        return pooled
+
+    def _is_healthy(self, pooled: PooledDriver) -> bool:
+        try:
+            return pooled.driver.execute_script("return 1;") == 1
+        except Exception:
+            return False
+
+    def _discard(self, pooled: PooledDriver):
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            print(f"Error closing driver: {e}")
+        with self._lock:
+            self._live -= 1
+        self.recycled += 1
+
+    def acquire(self, timeout: Optional[float] = None) -> PooledDriver:
+        """Check out a healthy browser, launching one if the pool is not yet full"""
+        self._resolve()
+        deadline = time.monotonic() + (self.acquire_timeout if timeout is None else timeout)
+        while True:
+            if self._closed:
+                raise RuntimeError("driver pool is shut down")
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                pooled = None
+
+            if pooled is None:
+                with self._lock:
+                    can_launch = self._live < self.size
+                    if can_launch:
+                        self._live += 1
+                if can_launch:
+                    try:
+                        pooled = self._launch()
+                    except Exception:
+                        with self._lock:
+                            self._live -= 1
+                        raise
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError("No browser available in the driver pool")
+                    try:
+                        pooled = self._idle.get(timeout=remaining)
+                    except queue.Empty:
+                        raise TimeoutError("No browser available in the driver pool")
+
+            if self._is_healthy(pooled):
+                self.acquired += 1
+                return pooled
+            self._discard(pooled)
+
+    def release(self, pooled: PooledDriver):
+        """Return a browser, resetting it or replacing it if it is worn out"""
+        pooled.uses += 1
+        if (self._closed or self._should_recycle(pooled) or not self._reset(pooled.driver)
+                or self._memory_grown(pooled)):
+            self._discard(pooled)
+            if not self._closed:
+                # Keep the pool warm without making the caller wait for a launch
+                threading.Thread(target=self.start, daemon=True).start()
+            return
+        self._park(pooled)
+
+    def _should_recycle(self, pooled: PooledDriver) -> bool:
+        if self.max_uses and pooled.uses >= self.max_uses:
+            return True
+        return bool(self.max_age_seconds) and time.time() - pooled.created_at > self.max_age_seconds
+
+    def _memory_grown(self, pooled: PooledDriver) -> bool:
+        """Compare the freshly reset browser's memory with its reading after the first job"""
+        if not self.max_memory_growth_mb:
+            return False
+        current = browser_memory_mb(pooled.driver)
+        if current is None:
+            return False
+        if pooled.baseline_memory is None:
+            # The first job warms caches and the renderer; growth is counted from there
+            pooled.baseline_memory = current
+            return False
+        if current - pooled.baseline_memory > self.max_memory_growth_mb:
+            self.memory_recycles += 1
+            return True
+        return False
+
+    def _reset(self, driver) -> bool:
+        """Clear cookies, storage and extra windows, then park the browser on a blank page"""
+        try:
+            handles = driver.window_handles
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(handles[0])
+            driver.execute_script(
+                "try { window.localStorage.clear(); window.sessionStorage.clear(); } catch (e) {}")
+            driver.delete_all_cookies()
+            driver.get("about:blank")
+            return True
+        except Exception as e:
+            print(f"Warning: browser reset failed, recycling it: {e}")
+            return False
+
+    @contextmanager
+    def driver(self, timeout: Optional[float] = None):
+        """Context manager yielding a pooled WebDriver"""
+        pooled = self.acquire(timeout)
+        try:
+            yield pooled.driver
+        finally:
+            self.release(pooled)
+
+    def stats(self) -> dict:
+        """Pool size and lifetime counters"""
+        return {
+            "size": self.size,
+            "live": self._live,
+            "idle": self._idle.qsize(),
+            "max_uses": self.max_uses,
+            "max_age_seconds": self.max_age_seconds,
+            "launched": self.launched,
+            "recycled": self.recycled,
+            "acquired": self.acquired,
+            "memory_recycles": self.memory_recycles,
+            "driver_path": self.driver_path,
+        }
+
+    def shutdown(self):
+        """Quit every idle browser; checked-out and still-launching ones are quit when they come back"""
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(pooled)
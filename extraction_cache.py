@@ -0,0 +1,278 @@
+"""
+Extraction cache module: content-addressed cache for document extraction results
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+
+def file_sha256(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Hash a file's contents without loading it into memory at once"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _unlink_all(paths: list):
+    for path in paths:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _read_json(path: Path) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_json(path: Path, value: dict) -> int:
+    """Atomically replace path with value as JSON; returns the file size"""
+    # Per-thread temp name, so concurrent writes of one key never share a temp file
+    tmp_path = path.with_name(f"{path.stem}.{threading.get_ident()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(value, f)
+    os.replace(tmp_path, path)
+    return path.stat().st_size
+
+
+def make_cache_key(content_hash: str, doc_type: str, prompt_version: str, model_name: str) -> str:
+    """Build the cache key from everything that influences the extraction result"""
+    raw = f"{content_hash}:{doc_type}:{prompt_version}:{model_name}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def make_batch_key(keys: list) -> str:
+    """Key for extracting several documents together, distinct from every single-document key"""
+    raw = "batch:" + ":".join(keys)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _Inflight:
+    """A computation shared by concurrent callers, and how many of them are still waiting"""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class ExtractionCache:
+    """Two-tier (memory LRU + optional disk) cache with in-flight request coalescing.
+
+    Only successful results are stored; results containing an "error" key are
+    handed to the callers that were waiting on them but never cached.
+    """
+
+    def __init__(self, max_entries: int = 256, disk_dir: Optional[str] = None,
+                 disk_max_bytes: int = 100 * 1024 * 1024, ttl_seconds: float = 7 * 24 * 3600):
+        self.max_entries = max_entries
+        self.disk_max_bytes = disk_max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+
+        self._memory = OrderedDict()  # key -> (stored_at, value)
+        self._inflight = {}  # key -> _Inflight shared by concurrent callers
+        self._disk_index = {}  # key -> (stored_at, size)
+        self._disk_bytes = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._load_disk_index()
+
+    def _load_disk_index(self):
+        """Scan the disk tier once at startup; later updates are tracked incrementally"""
+        for entry in os.scandir(self.disk_dir):
+            if entry.is_file() and entry.name.endswith(".json"):
+                stat = entry.stat()
+                self._disk_index[entry.name[:-5]] = (stat.st_mtime, stat.st_size)
+                self._disk_bytes += stat.st_size
+        _unlink_all(self._evict_disk())
+
+    def _is_expired(self, stored_at: float) -> bool:
+        return self.ttl_seconds > 0 and time.time() - stored_at > self.ttl_seconds
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / f"{key}.json"
+
+    def _forget_disk_entry(self, key: str) -> Path:
+        _, size = self._disk_index.pop(key, (0, 0))
+        self._disk_bytes -= size
+        return self._disk_path(key)
+
+    async def _remove_disk_entries(self, keys: list):
+        paths = [self._forget_disk_entry(key) for key in keys]
+        if paths:
+            await asyncio.to_thread(_unlink_all, paths)
+
+    def _evict_disk(self) -> list:
+        """Drop expired entries, then the oldest ones until under the size budget.
+
+        Only the index is updated; returns the paths the caller must delete.
+        """
+        evicted = [self._forget_disk_entry(key) for key, (stored_at, _) in list(self._disk_index.items())
+                   if self._is_expired(stored_at)]
+
+        if self._disk_bytes <= self.disk_max_bytes:
+            return evicted
+        for key, _ in sorted(self._disk_index.items(), key=lambda item: item[1][0]):
+            if self._disk_bytes <= self.disk_max_bytes:
+                break
+            evicted.append(self._forget_disk_entry(key))
+        return evicted
+
+    def _remember(self, key: str, stored_at: float, value: dict):
+        self._memory[key] = (stored_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[dict]:
+        """Look up a result in memory, then on disk (promoting disk hits to memory).
+
+        Memory hits and misses never leave the event loop; only a disk read does.
+        """
+        entry = self._memory.get(key)
+        if entry is not None:
+            stored_at, value = entry
+            if not self._is_expired(stored_at):
+                self._memory.move_to_end(key)
+                return dict(value)
+            del self._memory[key]
+
+        if self.disk_dir is None or key not in self._disk_index:
+            return None
+
+        disk_entry = self._disk_index[key]
+        stored_at, _ = disk_entry
+        if self._is_expired(stored_at):
+            await self._remove_disk_entries([key])
+            return None
+        try:
+            value = await asyncio.to_thread(_read_json, self._disk_path(key))
+        except (OSError, json.JSONDecodeError):
+            if self._disk_index.get(key) == disk_entry:
+                await self._remove_disk_entries([key])
+            return None
+
+        self.disk_hits += 1
+        # A put() or clear() may have run during the read; only promote a still-current entry
+        if self._disk_index.get(key) == disk_entry:
+            self._remember(key, stored_at, value)
+        return dict(value)
+
+    async def lookup(self, key: str) -> Optional[dict]:
+        """get() that also counts the hit or miss, for callers computing values themselves"""
+        value = await self.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def put(self, key: str, value: dict):
+        """Store a successful extraction result in both tiers; error results are ignored.
+
+        The memory tier is updated immediately. File writes and evictions run on a
+        worker thread; the disk index is only touched on the event loop.
+        """
+        if "error" in value:
+            return
+        stored_at = time.time()
+        self._remember(key, stored_at, dict(value))
+
+        if self.disk_dir is None:
+            return
+        try:
+            size = await asyncio.to_thread(_write_json, self._disk_path(key), value)
+        except OSError as e:
+            print(f"Warning: failed to write extraction cache entry: {e}")
+            return
+
+        _, old_size = self._disk_index.get(key, (0, 0))
+        self._disk_index[key] = (stored_at, size)
+        self._disk_bytes += size - old_size
+        evicted = self._evict_disk()
+        if evicted:
+            await asyncio.to_thread(_unlink_all, evicted)
+
+    async def _compute(self, key: str, compute: Callable[[], Awaitable[dict]], store: bool) -> dict:
+        try:
+            value = await compute()
+        finally:
+            # A cancelled computation has already been replaced by a newer one for this key
+            inflight = self._inflight.get(key)
+            if inflight is not None and inflight.task is asyncio.current_task():
+                del self._inflight[key]
+        if store:
+            await self.put(key, value)
+        return value
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[dict]], store: bool = True) -> dict:
+        """Return the cached result, or run compute() once for all concurrent callers.
+
+        compute() runs in a task owned by the cache, not by the first caller, so a
+        cancelled caller only stops waiting: the others still get the result, and
+        it is still cached. The computation is cancelled only when every caller
+        waiting on it has gone.
+
+        With store=False the result is only shared with concurrent callers, never
+        looked up or cached: for results whose parts are cached under their own keys.
+        """
+        if store:
+            cached = await self.get(key)
+            if cached is not None:
+                self.hits += 1
+                return cached
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+        else:
+            if store:
+                self.misses += 1
+            inflight = _Inflight(asyncio.ensure_future(self._compute(key, compute, store)))
+            self._inflight[key] = inflight
+
+        inflight.waiters += 1
+        try:
+            return dict(await asyncio.shield(inflight.task))
+        finally:
+            inflight.waiters -= 1
+            if not inflight.waiters and not inflight.task.done():
+                # Unregister in the same step, so a caller arriving before the task
+                # processes the cancel starts a fresh computation instead of joining it
+                if self._inflight.get(key) is inflight:
+                    del self._inflight[key]
+                inflight.task.cancel()
+
+    async def clear(self):
+        """Remove every cached entry from both tiers"""
+        self._memory.clear()
+        await self._remove_disk_entries(list(self._disk_index))
+
+    def stats(self) -> dict:
+        """Hit/miss counters and tier sizes"""
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_entries": len(self._disk_index),
+            "disk_bytes": self._disk_bytes,
+        }
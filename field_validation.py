@@ -0,0 +1,120 @@
+"""
+Field validation module: format checks that decide which extracted fields need a second look
+"""
+import re
+from datetime import date, datetime
+from typing import Optional
+
+# Fields worth another model call when they come back as "N/A". Optional fields
+# (fax, USCIS account, ...) are often legitimately blank and are left alone.
+REQUIRED_FIELDS = {
+    "passport": (
+        "full_name", "first_name", "last_name", "date_of_birth", "passport_number",
+        "nationality", "gender", "date_of_expiry",
+    ),
+    "g28": (
+        "attorney_name", "attorney_first_name", "attorney_last_name", "attorney_address",
+        "attorney_city", "attorney_state", "attorney_zip", "attorney_phone", "client_name",
+    ),
+}
+
+# Fields printed in the passport's machine-readable zone (the bottom band of the data page)
+MRZ_FIELDS = {"passport_number", "date_of_birth", "date_of_expiry", "last_name", "first_name", "gender"}
+
+PASSPORT_NUMBER_PATTERN = re.compile(r"^[A-Z0-9]{6,9}$")
+ZIP_PATTERN = re.compile(r"^\d{5}(-\d{4})?$")
+EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[A-Za-z]{2,}$")
+PHONE_PATTERN = re.compile(r"^\+?[\d\s().-]{7,20}$")
+ALIEN_NUMBER_PATTERN = re.compile(r"^A?-?\d{7,9}$", re.IGNORECASE)
+
+
+def _parse_iso_date(value: str) -> Optional[date]:
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def _check_date(value: str) -> Optional[str]:
+    parsed = _parse_iso_date(value)
+    if parsed is None:
+        return "not a YYYY-MM-DD date"
+    if not 1900 <= parsed.year <= 2100:
+        return "year out of range"
+    return None
+
+
+def _check_pattern(pattern: re.Pattern, reason: str, strip_spaces: bool = False):
+    def check(value: str) -> Optional[str]:
+        candidate = value.replace(" ", "").upper() if strip_spaces else value
+        return None if pattern.match(candidate) else reason
+    return check
+
+
+def _check_gender(value: str) -> Optional[str]:
+    return None if value.strip().lower() in ("male", "female", "m", "f", "x") else "not Male/Female"
+
+
+# doc_type -> field -> check(value) returning a reason string when the value is invalid
+FIELD_CHECKS = {
+    "passport": {
+        "date_of_birth": _check_date,
+        "date_of_issue": _check_date,
+        "date_of_expiry": _check_date,
+        "passport_number": _check_pattern(PASSPORT_NUMBER_PATTERN, "not 6-9 letters/digits", strip_spaces=True),
+        "gender": _check_gender,
+    },
+    "g28": {
+        "attorney_zip": _check_pattern(ZIP_PATTERN, "not a 5 or 9 digit ZIP code"),
+        "attorney_email": _check_pattern(EMAIL_PATTERN, "not an email address"),
+        "attorney_phone": _check_pattern(PHONE_PATTERN, "not a phone number"),
+        "daytime_phone": _check_pattern(PHONE_PATTERN, "not a phone number"),
+        "client_alien_number": _check_pattern(ALIEN_NUMBER_PATTERN, "not an A-Number", strip_spaces=True),
+    },
+}
+
+
+def is_missing(value) -> bool:
+    return value is None or not str(value).strip() or str(value).strip().upper() == "N/A"
+
+
+def check_field(doc_type: str, key: str, value) -> Optional[str]:
+    """Reason the value is unusable, or None if it passes (blank values are not checked here)"""
+    if is_missing(value):
+        return None
+    if not isinstance(value, str):
+        return "not a string"
+    check = FIELD_CHECKS.get(doc_type, {}).get(key)
+    return check(value.strip()) if check else None
+
+
+def _cross_checks(doc_type: str, values: dict) -> dict:
+    problems = {}
+    if doc_type == "passport":
+        birth = _parse_iso_date(str(values.get("date_of_birth", "")))
+        issue = _parse_iso_date(str(values.get("date_of_issue", "")))
+        expiry = _parse_iso_date(str(values.get("date_of_expiry", "")))
+        if birth and expiry and expiry <= birth:
+            problems["date_of_expiry"] = "expiry is not after date of birth"
+        if issue and expiry and expiry <= issue:
+            problems["date_of_expiry"] = "expiry is not after issue date"
+        if birth and issue and issue < birth:
+            problems["date_of_issue"] = "issued before date of birth"
+    return problems
+
+
+def fields_needing_retry(doc_type: str, values: dict, keys) -> dict:
+    """{field: reason} for required fields that are missing and fields that fail validation"""
+    problems = {}
+    for key in keys:
+        value = values.get(key)
+        if is_missing(value):
+            if key in REQUIRED_FIELDS.get(doc_type, ()):
+                problems[key] = "missing"
+            continue
+        reason = check_field(doc_type, key, value)
+        if reason:
+            problems[key] = reason
+    for key, reason in _cross_checks(doc_type, values).items():
+        problems.setdefault(key, reason)
+    return problems
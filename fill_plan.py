@@ -0,0 +1,198 @@
+"""
+Fill plan module: compute the exact field assignments a form fill will perform, without a browser
+"""
+import re
+from datetime import datetime
+from typing import Optional
+
+from form_snapshot import FormSnapshot
+
+STATE_ABBREVIATIONS = {
+    "AL": "Alabama", "AK": "Alaska", "AZ": "Arizona", "AR": "Arkansas",
+    "CA": "California", "CO": "Colorado", "CT": "Connecticut", "DE": "Delaware",
+    "DC": "District of Columbia", "FL": "Florida", "GA": "Georgia", "HI": "Hawaii",
+    "ID": "Idaho", "IL": "Illinois", "IN": "Indiana", "IA": "Iowa",
+    "KS": "Kansas", "KY": "Kentucky", "LA": "Louisiana", "ME": "Maine",
+    "MD": "Maryland", "MA": "Massachusetts", "MI": "Michigan", "MN": "Minnesota",
+    "MS": "Mississippi", "MO": "Missouri", "MT": "Montana", "NE": "Nebraska",
+    "NV": "Nevada", "NH": "New Hampshire", "NJ": "New Jersey", "NM": "New Mexico",
+    "NY": "New York", "NC": "North Carolina", "ND": "North Dakota", "OH": "Ohio",
+    "OK": "Oklahoma", "OR": "Oregon", "PA": "Pennsylvania", "RI": "Rhode Island",
+    "SC": "South Carolina", "SD": "South Dakota", "TN": "Tennessee", "TX": "Texas",
+    "UT": "Utah", "VT": "Vermont", "VA": "Virginia", "WA": "Washington",
+    "WV": "West Virginia", "WI": "Wisconsin", "WY": "Wyoming"
+}
+
+# Step statuses. PLANNED and UNVERIFIED steps are expected to be filled; the others
+# match the field_report statuses the browser should produce. The browser still
+# checks every step against the live page, since the snapshot may be stale.
+PLANNED = "planned"
+UNVERIFIED = "unverified"  # no snapshot of the form yet, so the field could not be checked
+NOT_FOUND = "not_found"
+HIDDEN = "hidden"
+OPTION_NOT_MATCHED = "option_not_matched"
+EXECUTABLE_STATUSES = (PLANNED, UNVERIFIED)
+
+US_DATE_PATTERN = re.compile(r"^(\d{2})/(\d{2})/(\d{4})$")
+
+
+def format_date(date_str):
+    """Format a date from YYYY-MM-DD to mm/dd/yyyy"""
+    if not date_str or date_str == "N/A":
+        return None
+    try:
+        dt = datetime.strptime(date_str, "%Y-%m-%d")
+        return dt.strftime("%m/%d/%Y")
+    except ValueError:
+        return date_str
+
+
+def format_gender(gender_str):
+    """Normalize gender to the form's M/F values"""
+    if not gender_str or gender_str == "N/A":
+        return None
+    gender_lower = gender_str.lower()
+    if "female" in gender_lower or gender_lower == "f":
+        return "F"
+    elif "male" in gender_lower or gender_lower == "m":
+        return "M"
+    return gender_str
+
+
+def format_state(state_str):
+    """Convert a state abbreviation to its full name"""
+    if not state_str or state_str == "N/A":
+        return None
+    state_upper = state_str.upper().strip()
+    return STATE_ABBREVIATIONS.get(state_upper, state_str)
+
+
+def build_assignments(passport_data: dict, g28_data: dict) -> list:
+    """Map extracted data to (field_id, value, field_name) tuples in form order"""
+    assignments = []
+
+    def add(field_id, value, field_name):
+        if not value or value == "N/A":
+            return
+        assignments.append((field_id, str(value), field_name))
+
+    # PART 1: Information About Attorney or Representative (from G-28 data)
+    # Attorney name fields (from G-28)
+    if "attorney_last_name" in g28_data or "attorney_name" in g28_data:
+        attorney_last = g28_data.get("attorney_last_name") or (g28_data.get("attorney_name", "").split()[-1] if g28_data.get("attorney_name") else "")
+        add("family-name", attorney_last, "attorney_family_name")
+
+    if "attorney_first_name" in g28_data or "attorney_name" in g28_data:
+        attorney_first = g28_data.get("attorney_first_name") or (g28_data.get("attorney_name", "").split()[0] if g28_data.get("attorney_name") else "")
+        add("given-name", attorney_first, "attorney_given_name")
+
+    # Attorney address (from G-28)
+    add("street-number", g28_data.get("attorney_address"), "attorney_address")
+    add("city", g28_data.get("attorney_city"), "attorney_city")
+    add("state", format_state(g28_data.get("attorney_state")), "attorney_state")
+    add("zip", g28_data.get("attorney_zip"), "attorney_zip")
+    # Note: country field in Part 1 should probably be left empty or set to "United States"
+
+    # Attorney contact (from G-28)
+    add("daytime-phone", g28_data.get("attorney_phone") or g28_data.get("daytime_phone"), "attorney_phone")
+    add("email", g28_data.get("attorney_email"), "attorney_email")
+
+    # PART 2: Eligibility Information (from G-28 data)
+    add("bar-number", g28_data.get("bar_number"), "bar_number")
+    add("law-firm", g28_data.get("firm_name"), "firm_name")
+
+    # PART 3: Passport Information for the Beneficiary (from Passport data)
+    add("passport-surname", passport_data.get("last_name"), "passport_last_name")
+    add("passport-given-names", passport_data.get("first_name"), "passport_first_name")
+    add("passport-number", passport_data.get("passport_number"), "passport_number")
+    add("passport-country", passport_data.get("issuing_country"), "passport_country")
+    add("passport-nationality", passport_data.get("nationality"), "passport_nationality")
+    add("passport-dob", format_date(passport_data.get("date_of_birth")), "passport_dob")
+    add("passport-pob", passport_data.get("place_of_birth"), "passport_place_of_birth")
+    add("passport-sex", format_gender(passport_data.get("gender")), "passport_sex")
+    add("passport-issue-date", format_date(passport_data.get("date_of_issue")), "passport_issue_date")
+    add("passport-expiry-date", format_date(passport_data.get("date_of_expiry")), "passport_expiry_date")
+
+    return assignments
+
+
+def match_option(options: list, value: str) -> Optional[dict]:
+    """Pick a select option: exact text, then exact value, then partial text match"""
+    lower = value.lower()
+    for option in options:
+        if option["text"] == value:
+            return option
+    for option in options:
+        if option["value"] == value:
+            return option
+    for option in options:
+        text = option["text"].lower()
+        if text and (text in lower or lower in text):
+            return option
+    return None
+
+
+def _resolve_step(field_id: str, value: str, field_name: str, snapshot: Optional[FormSnapshot]) -> dict:
+    step = {"field_id": field_id, "field_name": field_name, "value": value, "display": value, "status": PLANNED}
+    if snapshot is None:
+        step["status"] = UNVERIFIED
+        return step
+
+    control = snapshot.by_id.get(field_id)
+    if control is None:
+        step.update(status=NOT_FOUND, display=None)
+    elif not control["visible"]:
+        step.update(status=HIDDEN, display=None)
+    elif control["tag"] == "select":
+        option = match_option(control["options"] or [], value)
+        if option is None:
+            step.update(status=OPTION_NOT_MATCHED, display=None)
+        else:
+            # The browser selects this exact option value, so preview and fill cannot diverge
+            step.update(value=option["value"], display=option["text"])
+    elif control["type"] == "date":
+        # Date inputs only accept ISO values when set from script
+        match = US_DATE_PATTERN.match(value)
+        if match:
+            iso = f"{match.group(3)}-{match.group(1)}-{match.group(2)}"
+            step.update(value=iso, display=iso)
+    return step
+
+
+class FillPlan:
+    """Ordered field steps for one fill, resolved against a form snapshot when one is available"""
+
+    def __init__(self, steps: list, form_url: str, fingerprint: Optional[str] = None):
+        self.steps = steps
+        self.form_url = form_url
+        self.fingerprint = fingerprint
+
+    @property
+    def resolved(self) -> bool:
+        return self.fingerprint is not None
+
+    def to_dict(self) -> dict:
+        summary = {}
+        for step in self.steps:
+            summary[step["status"]] = summary.get(step["status"], 0) + 1
+        return {
+            "form_url": self.form_url,
+            "resolved": self.resolved,
+            "fingerprint": self.fingerprint,
+            "summary": summary,
+            "steps": self.steps,
+        }
+
+
+def build_fill_plan(passport_data: dict, g28_data: dict, form_url: str,
+                    snapshot: Optional[FormSnapshot] = None) -> FillPlan:
+    """Turn extracted data into the field-by-field plan the browser will execute.
+
+    With a snapshot, missing and hidden fields are flagged and select values are
+    resolved to the option that will be chosen; without one, steps are unverified.
+    """
+    steps = [
+        _resolve_step(field_id, value, field_name, snapshot)
+        for field_id, value, field_name in build_assignments(passport_data, g28_data)
+    ]
+    return FillPlan(steps, form_url, snapshot.fingerprint if snapshot is not None else None)
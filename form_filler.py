@@ -2,341 +2,493 @@
 Form filling module: automatically fill web forms using Selenium
 """
 import asyncio
+import base64
+import math
 import time
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait, Select
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
+import uuid
+from pathlib import Path
+from typing import Callable, Optional
+
+from driver_pool import DriverPool, launch_driver, resolve_driver_path
+from fill_plan import EXECUTABLE_STATUSES, NOT_FOUND, PLANNED, FillPlan, build_fill_plan
+from form_snapshot import FormSnapshot, SnapshotCache, snapshot_cache
+from metrics import metrics
+from storage import write_file
+
+# Wait budgets (seconds) per profile. Every wait returns as soon as its condition
+# holds; only review_pause is an unconditional delay and "fast" skips it.
+WAIT_PROFILES = {
+    "standard": {
+        "page_load_timeout": 20,
+        "element_timeout": 10,
+        "fonts_timeout": 5,
+        "layout_timeout": 5,
+        "review_pause": 5,
+    },
+    "fast": {
+        "page_load_timeout": 15,
+        "element_timeout": 5,
+        "fonts_timeout": 2,
+        "layout_timeout": 2,
+        "review_pause": 0,
+    },
+}
+
+DEFAULT_FORM_URL = "https://mendrika-alma.github.io/form-submission/"
+
+# Fields whose presence means the form has rendered and can be filled
+READY_FIELD_IDS = ("family-name", "passport-number")
+
+# Resolves once layout size has been unchanged for two consecutive animation frames
+LAYOUT_STABLE_SCRIPT = """
+const done = arguments[arguments.length - 1];
+let last = null, stableFrames = 0;
+function tick() {
+    const el = document.documentElement;
+    const size = el.scrollWidth + 'x' + el.scrollHeight;
+    if (size === last) {
+        if (++stableFrames >= 2) { done(true); return; }
+    } else {
+        stableFrames = 0;
+        last = size;
+    }
+    requestAnimationFrame(tick);
+}
+requestAnimationFrame(tick);
+"""
+
+FONTS_READY_SCRIPT = """
+const done = arguments[arguments.length - 1];
+if (!document.fonts) { done(true); return; }
+document.fonts.ready.then(() => done(true));
+"""
+
+# Resolves after the next frame has been painted
+NEXT_PAINT_SCRIPT = """
+const done = arguments[arguments.length - 1];
+requestAnimationFrame(() => requestAnimationFrame(() => done(true)));
+"""
+
+# Sets every field in one round trip and reports per-field status. Values go
+# through the native setter and fire input/change so framework-bound forms see them.
+BULK_FILL_SCRIPT = """
+const assignments = arguments[0];
+const report = {};
+
+function isVisible(el) {
+    if (!(el.offsetWidth || el.offsetHeight || el.getClientRects().length)) return false;
+    return window.getComputedStyle(el).visibility !== 'hidden';
+}
+
+function setNativeValue(el, value) {
+    const proto = el.tagName === 'TEXTAREA' ? HTMLTextAreaElement.prototype : HTMLInputElement.prototype;
+    Object.getOwnPropertyDescriptor(proto, 'value').set.call(el, value);
+}
+
+function fireEvents(el) {
+    el.dispatchEvent(new Event('input', { bubbles: true }));
+    el.dispatchEvent(new Event('change', { bubbles: true }));
+}
+
+function matchOption(select, value) {
+    const options = Array.from(select.options);
+    const lower = value.toLowerCase();
+    return options.find(o => o.text.trim() === value)
+        || options.find(o => o.value === value)
+        || options.find(o => {
+            const text = o.text.trim().toLowerCase();
+            return text && (text.includes(lower) || lower.includes(text));
+        });
+}
+
+for (const a of assignments) {
+    const el = document.getElementById(a.id);
+    if (!el) { report[a.name] = { field_id: a.id, status: 'not_found', value: null }; continue; }
+    if (!isVisible(el)) { report[a.name] = { field_id: a.id, status: 'hidden', value: null }; continue; }
+
+    if (el.tagName === 'SELECT') {
+        // Planned steps carry the exact option value resolved from the form snapshot
+        const option = a.exact
+            ? Array.from(el.options).find(o => o.value === a.value)
+            : matchOption(el, a.value);
+        if (!option) { report[a.name] = { field_id: a.id, status: 'option_not_matched', value: null }; continue; }
+        el.value = option.value;
+        fireEvents(el);
+        report[a.name] = { field_id: a.id, status: 'filled', value: option.text.trim() };
+        continue;
+    }
+
+    let value = a.value;
+    if (el.type === 'date') {
+        // Date inputs only accept ISO values when set from script
+        const m = /^(\\d{2})\\/(\\d{2})\\/(\\d{4})$/.exec(value);
+        if (m) value = m[3] + '-' + m[1] + '-' + m[2];
+    }
+    el.focus();
+    setNativeValue(el, value);
+    fireEvents(el);
+    el.blur();
+    report[a.name] = { field_id: a.id, status: 'filled', value: value };
+}
+return report;
+"""
+
+# Label/placeholder texts to look for when a planned field id is not on the page, per plan field
+LABEL_TEXTS = {
+    "attorney_family_name": ["Family Name", "Last Name", "Surname"],
+    "attorney_given_name": ["Given Name", "First Name"],
+    "attorney_address": ["Street Number and Name", "Street Address", "Address"],
+    "attorney_city": ["City", "City or Town"],
+    "attorney_state": ["State", "Province"],
+    "attorney_zip": ["ZIP Code", "ZIP", "Postal Code"],
+    "attorney_phone": ["Daytime Telephone Number", "Phone Number", "Telephone"],
+    "attorney_email": ["Email Address", "Email"],
+    "bar_number": ["Bar Number", "License Number"],
+    "firm_name": ["Law Firm", "Firm Name", "Organization"],
+    "passport_last_name": ["Surname", "Last Name", "Family Name"],
+    "passport_first_name": ["Given Names", "Given Name", "First Name"],
+    "passport_number": ["Passport Number", "Passport No"],
+    "passport_country": ["Country of Issuance", "Issuing Country"],
+    "passport_nationality": ["Nationality", "Citizenship"],
+    "passport_dob": ["Date of Birth", "Birth Date", "DOB"],
+    "passport_place_of_birth": ["Place of Birth", "Birthplace"],
+    "passport_sex": ["Sex", "Gender"],
+    "passport_issue_date": ["Date of Issue", "Issue Date"],
+    "passport_expiry_date": ["Date of Expiration", "Expiry Date", "Expiration Date"],
+}
+
+
+def _quit_driver(driver):
+    try:
+        driver.quit()
+    except Exception as e:
+        print(f"Error closing driver: {e}")
+
+
+# DevTools image formats and the file extension each is saved under
+SCREENSHOT_FORMATS = {"png": "png", "jpeg": "jpg", "webp": "webp"}
 
 
 class FormFiller:
-    def __init__(self):
-        self.form_url = "https://mendrika-alma.github.io/form-submission/"
+    def __init__(self, driver_pool: Optional[DriverPool] = None, profile: str = "standard",
+                 wait_overrides: Optional[dict] = None, keystroke_fields: Optional[set] = None,
+                 snapshot_cache: SnapshotCache = snapshot_cache, screenshot_dir: str = "uploads/screenshots",
+                 screenshot_format: str = "webp", screenshot_quality: int = 80,
+                 screenshot_max_width: Optional[int] = None, form_url: str = DEFAULT_FORM_URL):
+        self.form_url = form_url
+        self.driver_pool = driver_pool
+        # Field ids typed with real keystrokes instead of the bulk script
+        self.keystroke_fields = set(keystroke_fields or ())
+        self.snapshot_cache = snapshot_cache
+        if screenshot_format not in SCREENSHOT_FORMATS:
+            raise ValueError(f"Unsupported screenshot format: {screenshot_format}")
+        self.screenshot_dir = Path(screenshot_dir)
+        self.screenshot_format = screenshot_format
+        self.screenshot_quality = screenshot_quality
+        self.screenshot_max_width = screenshot_max_width
+        if profile not in WAIT_PROFILES:
+            raise ValueError(f"Unknown fill profile: {profile}")
+        self.profile = profile
+        self.waits = {**WAIT_PROFILES[profile], **(wait_overrides or {})}
     
-    async def fill_form(self, passport_data: dict, g28_data: dict) -> dict:
-        """Fill the form using the extracted data."""
+    async def fill_form(self, passport_data: dict, g28_data: dict, job_id: Optional[str] = None,
+                        progress: Optional[Callable[[str, float], None]] = None) -> dict:
+        """Fill the form using the extracted data; the screenshot is stored under job_id.
+
+        progress(stage, fraction) is called from the browser thread between steps.
+        Exceptions it raises (e.g. a cancellation request) abort the fill.
+        """
+        job_id = job_id or uuid.uuid4().hex
+        progress = progress or (lambda stage, fraction: None)
         
-        # Set Chrome options
-        chrome_options = Options()
-        chrome_options.add_argument("--window-size=1280,900")
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--headless=new")  # Use headless mode
-        chrome_options.add_argument("--disable-logging")  # Disable logging
-        chrome_options.add_argument("--log-level=3")  # Only show fatal errors
-        chrome_options.add_argument("--disable-gcm")  # Disable Google Cloud Messaging
-        chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])  # Suppress logging
+        pooled = None
+        # Browser work is blocking, so it runs on worker threads to keep the event loop free
+        progress("waiting for browser", 0.05)
+        with metrics.timer("driver_acquire"):
+            if self.driver_pool is not None:
+                pooled = await self._checkout(self.driver_pool.acquire, self.driver_pool.release)
+                driver = pooled.driver
+            else:
+                driver = await self._checkout(lambda: launch_driver(resolve_driver_path()), _quit_driver)
         
-        driver = None
+        fill = asyncio.ensure_future(
+            asyncio.to_thread(self._fill_with_driver, driver, passport_data, g28_data, job_id, progress)
+        )
         try:
-            # Auto-download and manage ChromeDriver
-            # On Windows, ensure we get the correct executable
-            driver_path = ChromeDriverManager().install()
-            # Suppress ChromeDriver logging by redirecting to null
-            import os
-            service = Service(driver_path, service_log_path=os.devnull)
-            driver = webdriver.Chrome(service=service, options=chrome_options)
-        except Exception as e:
-            # Fallback: try without explicit service (uses system PATH)
-            print(f"Warning: ChromeDriverManager failed ({e}), trying system ChromeDriver...")
-            try:
-                driver = webdriver.Chrome(options=chrome_options)
-            except Exception as e2:
-                raise Exception(f"Failed to initialize ChromeDriver: {e2}. Please ensure Chrome browser is installed and ChromeDriver is available.")
-        
-        filled_fields = []
+            return await asyncio.shield(fill)
+        finally:
+            if not fill.done():
+                # Cancelled while the browser thread is mid-fill: let it stop before the driver is reused
+                await asyncio.wait([fill])
+            if pooled is not None:
+                # The pool resets the browser (cookies, storage, navigation) before reuse
+                await asyncio.to_thread(self.driver_pool.release, pooled)
+            else:
+                await asyncio.to_thread(_quit_driver, driver)
+    
+    async def _checkout(self, acquire: Callable, give_back: Callable):
+        """Run a blocking browser checkout on a worker thread.
+
+        The thread cannot be interrupted, so if the caller is cancelled while it
+        waits, the browser it eventually returns is handed straight back.
+        """
+        checkout = asyncio.ensure_future(asyncio.to_thread(acquire))
+        try:
+            return await asyncio.shield(checkout)
+        except asyncio.CancelledError:
+            def hand_back(future):
+                if not future.cancelled() and future.exception() is None:
+                    future.get_loop().run_in_executor(None, give_back, future.result())
+            checkout.add_done_callback(hand_back)
+            raise
+    
+    def warm_snapshot(self) -> FormSnapshot:
+        """Load the form once in a pooled browser and cache its snapshot, so fill plans resolve before the first fill"""
+        if self.driver_pool is None:
+            raise ValueError("Warming the form snapshot needs a driver pool")
+        with self.driver_pool.driver() as driver:
+            driver.get(self.form_url)
+            self._wait_for_page_ready(driver)
+            return self._analyze_form_structure(driver)
+    
+    def _fill_with_driver(self, driver, passport_data: dict, g28_data: dict, job_id: str,
+                          progress: Callable[[str, float], None]) -> dict:
+        """Navigate, fill and screenshot using an already running browser"""
+        field_report = {}
         errors = []
         
-        if driver is None:
-            raise Exception("Failed to initialize ChromeDriver")
-        
         try:
             # Navigate to the form page
+            progress("loading form", 0.15)
             print(f"Visiting form: {self.form_url}")
-            driver.get(self.form_url)
-            time.sleep(2)  
+            with metrics.timer("page_load"):
+                driver.get(self.form_url)
+                self._wait_for_page_ready(driver)
             
             print("Starting to fill the form...")
             
             # Analyze form structure
-            self._analyze_form_structure(driver)
-            
-            # Helper function to format date from YYYY-MM-DD to mm/dd/yyyy
-            def format_date(date_str):
-                if not date_str or date_str == "N/A":
-                    return None
-                try:
-                    from datetime import datetime
-                    dt = datetime.strptime(date_str, "%Y-%m-%d")
-                    return dt.strftime("%m/%d/%Y")
-                except:
-                    return date_str
-            
-            # Helper function to format gender
-            def format_gender(gender_str):
-                if not gender_str or gender_str == "N/A":
-                    return None
-                gender_lower = gender_str.lower()
-                if "female" in gender_lower or gender_lower == "f":
-                    return "F"
-                elif "male" in gender_lower or gender_lower == "m":
-                    return "M"
-                return gender_str
-            
-            # Helper function to format state (convert abbreviation to full name)
-            def format_state(state_str):
-                if not state_str or state_str == "N/A":
-                    return None
-                state_abbrev_map = {
-                    "AL": "Alabama", "AK": "Alaska", "AZ": "Arizona", "AR": "Arkansas",
-                    "CA": "California", "CO": "Colorado", "CT": "Connecticut", "DE": "Delaware",
-                    "DC": "District of Columbia", "FL": "Florida", "GA": "Georgia", "HI": "Hawaii",
-                    "ID": "Idaho", "IL": "Illinois", "IN": "Indiana", "IA": "Iowa",
-                    "KS": "Kansas", "KY": "Kentucky", "LA": "Louisiana", "ME": "Maine",
-                    "MD": "Maryland", "MA": "Massachusetts", "MI": "Michigan", "MN": "Minnesota",
-                    "MS": "Mississippi", "MO": "Missouri", "MT": "Montana", "NE": "Nebraska",
-                    "NV": "Nevada", "NH": "New Hampshire", "NJ": "New Jersey", "NM": "New Mexico",
-                    "NY": "New York", "NC": "North Carolina", "ND": "North Dakota", "OH": "Ohio",
-                    "OK": "Oklahoma", "OR": "Oregon", "PA": "Pennsylvania", "RI": "Rhode Island",
-                    "SC": "South Carolina", "SD": "South Dakota", "TN": "Tennessee", "TX": "Texas",
-                    "UT": "Utah", "VT": "Vermont", "VA": "Virginia", "WA": "Washington",
-                    "WV": "West Virginia", "WI": "Wisconsin", "WY": "Wyoming"
-                }
-                state_upper = state_str.upper().strip()
-                return state_abbrev_map.get(state_upper, state_str)
-            
-            # Helper function to fill a field by ID
-            def fill_field_by_id(field_id, value, field_name=""):
-                if not value or value == "N/A" or value == "":
-                    return False
-                try:
-                    element = driver.find_element(By.ID, field_id)
-                    if element.is_displayed():
-                        tag_name = element.tag_name.lower()
-                        input_type = element.get_attribute("type") or ""
-                        
-                        if tag_name == "select":
-                            select = Select(element)
-                            try:
-                                select.select_by_visible_text(str(value))
-                            except:
-                                try:
-                                    select.select_by_value(str(value))
-                                except:
-                                    # Try partial match
-                                    for option in select.options:
-                                        if str(value).lower() in option.text.lower() or option.text.lower() in str(value).lower():
-                                            select.select_by_visible_text(option.text)
-                                            break
-                        elif input_type == "date":
-                            # For date fields, format the value
-                            formatted_value = format_date(value) if isinstance(value, str) and "-" in value else value
-                            element.clear()
-                            element.send_keys(str(formatted_value))
-                        else:
-                            element.clear()
-                            element.send_keys(str(value))
-                        
-                        display_name = field_name if field_name else field_id
-                        filled_fields.append(display_name)
-                        print(f"  {display_name}: {value}")
-                        return True
-                except Exception as e:
-                    return False
-                return False
-            
-            # PART 1: Information About Attorney or Representative (from G-28 data)
-            print("\nFilling Part 1: Attorney Information...")
-            
-            # Attorney name fields (from G-28)
-            if "attorney_last_name" in g28_data or "attorney_name" in g28_data:
-                attorney_last = g28_data.get("attorney_last_name") or (g28_data.get("attorney_name", "").split()[-1] if g28_data.get("attorney_name") else "")
-                fill_field_by_id("family-name", attorney_last, "attorney_family_name")
+            with metrics.timer("form_snapshot"):
+                snapshot = self._analyze_form_structure(driver)
             
-            if "attorney_first_name" in g28_data or "attorney_name" in g28_data:
-                attorney_first = g28_data.get("attorney_first_name") or (g28_data.get("attorney_name", "").split()[0] if g28_data.get("attorney_name") else "")
-                fill_field_by_id("given-name", attorney_first, "attorney_given_name")
-            
-            # Attorney address (from G-28)
-            fill_field_by_id("street-number", g28_data.get("attorney_address"), "attorney_address")
-            fill_field_by_id("city", g28_data.get("attorney_city"), "attorney_city")
-            state_formatted = format_state(g28_data.get("attorney_state"))
-            fill_field_by_id("state", state_formatted, "attorney_state")
-            fill_field_by_id("zip", g28_data.get("attorney_zip"), "attorney_zip")
-            # Note: country field in Part 1 should probably be left empty or set to "United States"
-            
-            # Attorney contact (from G-28)
-            fill_field_by_id("daytime-phone", g28_data.get("attorney_phone") or g28_data.get("daytime_phone"), "attorney_phone")
-            fill_field_by_id("email", g28_data.get("attorney_email"), "attorney_email")
-            
-            # PART 2: Eligibility Information (from G-28 data)
-            print("\nFilling Part 2: Eligibility Information...")
-            fill_field_by_id("bar-number", g28_data.get("bar_number"), "bar_number")
-            fill_field_by_id("law-firm", g28_data.get("firm_name"), "firm_name")
-            
-            # PART 3: Passport Information for the Beneficiary (from Passport data)
-            print("\nFilling Part 3: Passport Information...")
-            fill_field_by_id("passport-surname", passport_data.get("last_name"), "passport_last_name")
-            fill_field_by_id("passport-given-names", passport_data.get("first_name"), "passport_first_name")
-            fill_field_by_id("passport-number", passport_data.get("passport_number"), "passport_number")
-            fill_field_by_id("passport-country", passport_data.get("issuing_country"), "passport_country")
-            fill_field_by_id("passport-nationality", passport_data.get("nationality"), "passport_nationality")
-            
-            # Date of birth - format it
-            dob_formatted = format_date(passport_data.get("date_of_birth"))
-            fill_field_by_id("passport-dob", dob_formatted, "passport_dob")
-            
-            fill_field_by_id("passport-pob", passport_data.get("place_of_birth"), "passport_place_of_birth")
-            
-            # Gender/Sex - format it
-            gender_formatted = format_gender(passport_data.get("gender"))
-            fill_field_by_id("passport-sex", gender_formatted, "passport_sex")
-            
-            # Issue and expiry dates - format them
-            issue_date_formatted = format_date(passport_data.get("date_of_issue"))
-            fill_field_by_id("passport-issue-date", issue_date_formatted, "passport_issue_date")
-            
-            expiry_date_formatted = format_date(passport_data.get("date_of_expiry"))
-            fill_field_by_id("passport-expiry-date", expiry_date_formatted, "passport_expiry_date")
+            progress("filling fields", 0.4)
+            # The same plan /fill-plan previews, resolved against the live page's snapshot
+            plan = build_fill_plan(passport_data, g28_data, self.form_url, snapshot)
+            field_report = self._apply_plan(driver, plan, snapshot)
+            filled_fields = [name for name, entry in field_report.items() if entry["status"] == "filled"]
             
             print(f"\nFilling completed. Total fields filled: {len(filled_fields)}")
             
-            print("Waiting 5 seconds for review...")
-            time.sleep(5)
+            progress("reviewing", 0.6)
+            if self.waits["review_pause"] > 0:
+                print(f"Waiting {self.waits['review_pause']} seconds for review...")
+                time.sleep(self.waits["review_pause"])
             
             # Full page screenshot
-            screenshot_path = "uploads/form_filled.png"
-            self._take_full_page_screenshot(driver, screenshot_path)
+            progress("capturing screenshot", 0.85)
+            with metrics.timer("screenshot"):
+                screenshot_path = self._capture_screenshot(driver, job_id)
             print(f"Full page screenshot saved: {screenshot_path}")
             
             return {
+                "job_id": job_id,
                 "filled_fields": filled_fields,
+                "field_report": field_report,
                 "errors": errors,
-                "screenshot": "form_filled.png",
+                "screenshot": screenshot_path.name,
                 "total_filled": len(filled_fields)
             }
             
         except Exception as e:
             errors.append(str(e))
             print(f"Error: {e}")
+            filled_fields = [name for name, entry in field_report.items() if entry["status"] == "filled"]
             return {
+                "job_id": job_id,
                 "filled_fields": filled_fields,
+                "field_report": field_report,
                 "errors": errors,
                 "screenshot": None,
                 "total_filled": len(filled_fields)
             }
-        finally:
-            if driver is not None:
-                try:
-                    time.sleep(3)
-                    driver.quit()
-                except Exception as e:
-                    print(f"Error closing driver: {e}")
     
-    def _analyze_form_structure(self, driver):
-        """Analyze form structure"""
-        print("\nAnalyzing form structure...")
+    def _apply_plan(self, driver, plan: FillPlan, snapshot: Optional[FormSnapshot] = None) -> dict:
+        """Execute a fill plan: one script call for all fields, keystroke fields typed individually.
+
+        Steps the plan expects to skip (missing, hidden, no matching option) are not
+        trusted as final: they go through the same live lookup as every other field,
+        and if the page disagrees the cached snapshot is dropped. With a snapshot,
+        fields whose id is not on the page are then looked up by label or placeholder.
+        """
+        bulk = [
+            {"id": step["field_id"], "value": step["value"], "name": step["field_name"], "exact": step["status"] == PLANNED}
+            for step in plan.steps
+            if step["field_id"] not in self.keystroke_fields
+        ]
+        with metrics.timer("fill_bulk"):
+            report = driver.execute_script(BULK_FILL_SCRIPT, bulk) if bulk else {}
+        
+        for step in plan.steps:
+            if step["field_id"] in self.keystroke_fields:
+                with metrics.timer("fill_typed_field"):
+                    report[step["field_name"]] = self._type_field(driver, step["field_id"], step["value"])
+        
+        stale = [step["field_name"] for step in plan.steps
+                 if step["status"] not in EXECUTABLE_STATUSES and report[step["field_name"]]["status"] != step["status"]]
+        if stale and plan.resolved:
+            print(f"Warning: cached form snapshot is stale ({', '.join(stale)}), dropping it")
+            self.snapshot_cache.invalidate(plan.form_url, plan.fingerprint)
         
-        inputs = driver.find_elements(By.CSS_SELECTOR, "input, select, textarea")
+        if snapshot is not None:
+            report.update(self._fill_by_label_or_placeholder(driver, snapshot, plan, report))
+        
+        # Keep the report in form order; values are personal data, so only statuses are logged
+        report = {step["field_name"]: report[step["field_name"]] for step in plan.steps if step["field_name"] in report}
+        for field_name, entry in report.items():
+            print(f"  {field_name}: {entry['status']}")
+        return report
+    
+    def _type_field(self, driver, field_id: str, value: str) -> dict:
+        """Fill one field with real keystrokes, for inputs that ignore scripted values"""
+        from selenium.common.exceptions import NoSuchElementException
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import Select
+        try:
+            element = driver.find_element(By.ID, field_id)
+        except NoSuchElementException:
+            return {"field_id": field_id, "status": "not_found", "value": None}
+        if not element.is_displayed():
+            return {"field_id": field_id, "status": "hidden", "value": None}
         
-        for inp in inputs:
+        if element.tag_name.lower() == "select":
+            select = Select(element)
             try:
-                if inp.is_displayed():
-                    tag = inp.tag_name
-                    name = inp.get_attribute("name") or ""
-                    id_attr = inp.get_attribute("id") or ""
-                    placeholder = inp.get_attribute("placeholder") or ""
-                    input_type = inp.get_attribute("type") or ""
-                    
-                    if name or id_attr:
-                        print(f"  - {tag}[name='{name}', id='{id_attr}', type='{input_type}', placeholder='{placeholder}']")
-            except:
-                continue
+                select.select_by_visible_text(value)
+            except NoSuchElementException:
+                try:
+                    select.select_by_value(value)
+                except NoSuchElementException:
+                    # Try partial match
+                    for option in select.options:
+                        if option.text and (value.lower() in option.text.lower() or option.text.lower() in value.lower()):
+                            select.select_by_visible_text(option.text)
+                            break
+                    else:
+                        return {"field_id": field_id, "status": "option_not_matched", "value": None}
+            return {"field_id": field_id, "status": "filled", "value": select.first_selected_option.text}
         
-        print("")
+        element.clear()
+        element.send_keys(value)
+        return {"field_id": field_id, "status": "filled", "value": value}
     
-    def _fill_by_label_or_placeholder(self, driver, data_key: str, value: str) -> bool:
-        """Find and fill by label or placeholder"""
+    def _run_wait_script(self, driver, script: str, timeout: float, what: str):
+        """Run an async readiness script, tolerating a timeout (the fill is best-effort)"""
+        from selenium.common.exceptions import TimeoutException
+        driver.set_script_timeout(timeout)
+        try:
+            driver.execute_async_script(script)
+        except TimeoutException:
+            print(f"Warning: timed out after {timeout}s waiting for {what}")
+    
+    def _wait_for_page_ready(self, driver):
+        """Wait for document ready, the target fields, web fonts and a stable layout"""
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+        WebDriverWait(driver, self.waits["page_load_timeout"]).until(
+            lambda d: d.execute_script("return document.readyState") == "complete")
         
-        label_texts = {
-            "first_name": ["First Name", "Given Name", "First"],
-            "last_name": ["Last Name", "Family Name", "Surname", "Last"],
-            "full_name": ["Full Name", "Name", "Complete Name"],
-            "date_of_birth": ["Date of Birth", "DOB", "Birth Date", "Birthday"],
-            "passport_number": ["Passport Number", "Passport No", "Passport"],
-            "nationality": ["Nationality", "Country", "Citizenship"],
-            "gender": ["Gender", "Sex"],
-            "place_of_birth": ["Place of Birth", "Birthplace"],
-            "attorney_name": ["Attorney Name", "Representative Name", "Lawyer"],
-            "firm_name": ["Law Firm", "Firm Name", "Organization", "Company"],
-            "attorney_address": ["Address", "Street Address"],
-            "attorney_city": ["City"],
-            "attorney_state": ["State", "Province"],
-            "attorney_zip": ["ZIP", "ZIP Code", "Postal Code"],
-            "attorney_phone": ["Phone", "Phone Number", "Telephone"],
-            "attorney_email": ["Email", "Email Address"],
-            "bar_number": ["Bar Number", "License Number"],
-        }
+        selector = ", ".join(f"#{field_id}" for field_id in READY_FIELD_IDS)
+        try:
+            WebDriverWait(driver, self.waits["element_timeout"]).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, selector)))
+        except TimeoutException:
+            print("Warning: expected form fields did not appear, filling what is available")
         
-        texts_to_try = label_texts.get(data_key, [])
+        self._run_wait_script(driver, FONTS_READY_SCRIPT, self.waits["fonts_timeout"], "web fonts")
+        self._run_wait_script(driver, LAYOUT_STABLE_SCRIPT, self.waits["layout_timeout"], "stable layout")
+    
+    def _analyze_form_structure(self, driver) -> FormSnapshot:
+        """Analyze form structure from a single DOM snapshot (cached per URL + fingerprint)"""
+        snapshot, from_cache = self.snapshot_cache.get_snapshot(driver, self.form_url)
+        if from_cache:
+            print(f"\nUsing cached form structure ({len(snapshot.controls)} controls)")
+            return snapshot
         
-        for label_text in texts_to_try:
-            try:
-                # Try locating by placeholder
-                inputs = driver.find_elements(By.CSS_SELECTOR, 
-                    f'input[placeholder*="{label_text}" i], textarea[placeholder*="{label_text}" i]')
-                
-                for inp in inputs:
-                    if inp.is_displayed():
-                        inp.clear()
-                        inp.send_keys(str(value))
-                        return True
-                
-                # Try locating by label
-                labels = driver.find_elements(By.XPATH, 
-                    f'//label[contains(translate(text(), "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz"), "{label_text.lower()}")]')
-                
-                for label in labels:
-                    for_attr = label.get_attribute("for")
-                    if for_attr:
-                        try:
-                            inp = driver.find_element(By.ID, for_attr)
-                            if inp.is_displayed():
-                                if inp.tag_name.lower() == "select":
-                                    select = Select(inp)
-                                    select.select_by_visible_text(str(value))
-                                else:
-                                    inp.clear()
-                                    inp.send_keys(str(value))
-                                return True
-                        except:
-                            continue
-                    
-                    # Find input inside the label
-                    try:
-                        inp = label.find_element(By.CSS_SELECTOR, "input, select, textarea")
-                        if inp.is_displayed():
-                            if inp.tag_name.lower() == "select":
-                                select = Select(inp)
-                                select.select_by_visible_text(str(value))
-                            else:
-                                inp.clear()
-                                inp.send_keys(str(value))
-                            return True
-                    except:
-                        continue
-                        
-            except Exception:
+        print("\nAnalyzing form structure...")
+        for control in snapshot.controls:
+            if control["visible"] and (control["name"] or control["id"]):
+                print(f"  - {control['tag']}[name='{control['name']}', id='{control['id']}', type='{control['type']}', placeholder='{control['placeholder']}']")
+        print("")
+        return snapshot
+    
+    def _fill_by_label_or_placeholder(self, driver, snapshot: FormSnapshot, plan: FillPlan, report: dict) -> dict:
+        """Fill fields whose id was not found via the snapshot's label/placeholder index.
+
+        Controls already targeted by the plan are never reused, so a fallback cannot
+        overwrite another field. Returns report entries for the fields it found.
+        """
+        claimed = {step["field_id"] for step in plan.steps}
+        bulk = []
+        typed = []
+        for step in plan.steps:
+            if report.get(step["field_name"], {}).get("status") != NOT_FOUND:
+                continue
+            control = snapshot.find(LABEL_TEXTS.get(step["field_name"], []))
+            if control is None or not control["id"] or control["id"] in claimed:
                 continue
+            claimed.add(control["id"])
+            target = typed if control["id"] in self.keystroke_fields else bulk
+            target.append({"id": control["id"], "value": step["value"], "name": step["field_name"], "exact": False})
+        
+        entries = {}
+        if bulk:
+            with metrics.timer("fill_bulk"):
+                entries.update(driver.execute_script(BULK_FILL_SCRIPT, bulk))
+        for assignment in typed:
+            with metrics.timer("fill_typed_field"):
+                entries[assignment["name"]] = self._type_field(driver, assignment["id"], assignment["value"])
+        for field_name, entry in entries.items():
+            print(f"  {field_name}: not found by id, matched {entry['field_id']} by label")
+        return entries
+    
+    def _capture_screenshot(self, driver, job_id: str) -> Path:
+        """Capture the full page for this job, preferring a single DevTools call"""
+        self.screenshot_dir.mkdir(parents=True, exist_ok=True)
+        screenshot_path = self.screenshot_dir / f"{job_id}.{SCREENSHOT_FORMATS[self.screenshot_format]}"
+        try:
+            self._take_devtools_screenshot(driver, screenshot_path)
+        except Exception as e:
+            print(f"Warning: DevTools screenshot failed ({e}), falling back to scroll-and-stitch")
+            screenshot_path = screenshot_path.with_suffix(".png")
+            self._take_full_page_screenshot(driver, str(screenshot_path))
+        return screenshot_path
+    
+    def _take_devtools_screenshot(self, driver, screenshot_path: Path):
+        """Capture beyond the viewport with Page.captureScreenshot (no resize, scroll or stitching)"""
+        layout = driver.execute_cdp_cmd("Page.getLayoutMetrics", {})
+        content = layout.get("cssContentSize") or layout["contentSize"]
+        width = math.ceil(content["width"])
+        height = math.ceil(content["height"])
+        
+        scale = 1
+        if self.screenshot_max_width and width > self.screenshot_max_width:
+            scale = self.screenshot_max_width / width
+        
+        params = {
+            "format": self.screenshot_format,
+            "captureBeyondViewport": True,
+            "clip": {"x": 0, "y": 0, "width": width, "height": height, "scale": scale},
+        }
+        if self.screenshot_format != "png":
+            params["quality"] = self.screenshot_quality
         
-        return False
+        result = driver.execute_cdp_cmd("Page.captureScreenshot", params)
+        write_file(screenshot_path, base64.b64decode(result["data"]))
     
     def _take_full_page_screenshot(self, driver, screenshot_path: str):
-        """Take a full page screenshot by scrolling and stitching"""
+        """Take a full page screenshot by scrolling and stitching (fallback when DevTools is unavailable)"""
         from PIL import Image
         import io
         
@@ -358,7 +510,7 @@ class FormFiller:
         window_height = min(total_height, max_window_height)
         
         driver.set_window_size(window_width, window_height)
-        time.sleep(1)  # Wait for resize
+        self._run_wait_script(driver, LAYOUT_STABLE_SCRIPT, self.waits["layout_timeout"], "resize")
         
         # Get the actual viewport dimensions after resize
         viewport_height = driver.execute_script("return window.innerHeight")
@@ -375,7 +527,7 @@ class FormFiller:
             while scroll_position < total_height:
                 # Scroll to the current position
                 driver.execute_script(f"window.scrollTo(0, {scroll_position});")
-                time.sleep(0.5)  # Wait for rendering
+                self._run_wait_script(driver, NEXT_PAINT_SCRIPT, self.waits["layout_timeout"], "repaint")
                 
                 # Take screenshot of current viewport
                 screenshot_bytes = driver.get_screenshot_as_png()
@@ -0,0 +1,152 @@
+"""
+Form snapshot module: capture all form controls in one script call and index them in Python
+"""
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+# Cheap fingerprint of everything a snapshot records that a fill plan depends on:
+# control structure (tag/id/name/type), visibility and select options, hashed in-page
+FINGERPRINT_SCRIPT = """
+function isVisible(el) {
+    if (!(el.offsetWidth || el.offsetHeight || el.getClientRects().length)) return false;
+    return window.getComputedStyle(el).visibility !== 'hidden';
+}
+const controls = document.querySelectorAll('input, select, textarea');
+let hash = 5381;
+for (const el of controls) {
+    let key = el.tagName + '|' + el.id + '|' + (el.name || '') + '|' + (el.type || '') + '|' + (isVisible(el) ? 'v' : 'h');
+    if (el.tagName === 'SELECT') {
+        for (const o of el.options) key += '|' + o.value + '=' + o.text.trim();
+    }
+    key += ';';
+    for (let i = 0; i < key.length; i++) {
+        hash = ((hash << 5) + hash + key.charCodeAt(i)) | 0;
+    }
+}
+return controls.length + ':' + (hash >>> 0).toString(16);
+"""
+
+# Everything the filler needs to know about each control, in a single round trip
+SNAPSHOT_SCRIPT = """
+function isVisible(el) {
+    if (!(el.offsetWidth || el.offsetHeight || el.getClientRects().length)) return false;
+    return window.getComputedStyle(el).visibility !== 'hidden';
+}
+function labelText(el) {
+    const texts = [];
+    if (el.labels) {
+        for (const label of el.labels) texts.push(label.textContent);
+    }
+    if (!texts.length && el.getAttribute('aria-label')) texts.push(el.getAttribute('aria-label'));
+    return texts.join(' ').replace(/\\s+/g, ' ').trim();
+}
+return Array.from(document.querySelectorAll('input, select, textarea')).map(el => ({
+    tag: el.tagName.toLowerCase(),
+    id: el.id || '',
+    name: el.getAttribute('name') || '',
+    type: el.getAttribute('type') || '',
+    visible: isVisible(el),
+    placeholder: el.getAttribute('placeholder') || '',
+    label: labelText(el),
+    options: el.tagName === 'SELECT'
+        ? Array.from(el.options).map(o => ({ text: o.text.trim(), value: o.value }))
+        : null,
+}));
+"""
+
+
+def normalize_label(text: str) -> str:
+    """Case-fold and collapse punctuation/whitespace so label lookups are forgiving"""
+    return re.sub(r"[^a-z0-9]+", " ", (text or "").lower()).strip()
+
+
+class FormSnapshot:
+    """Form controls captured from the page, indexed by id, label and placeholder"""
+
+    def __init__(self, controls: list, fingerprint: str = ""):
+        self.controls = controls
+        self.fingerprint = fingerprint
+        self.by_id = {c["id"]: c for c in controls if c["id"]}
+        self.by_label = {}
+        self.by_placeholder = {}
+        for control in controls:
+            if control["label"]:
+                self.by_label.setdefault(normalize_label(control["label"]), []).append(control)
+            if control["placeholder"]:
+                self.by_placeholder.setdefault(normalize_label(control["placeholder"]), []).append(control)
+
+    def _lookup(self, index: dict, text: str) -> Optional[dict]:
+        """Exact normalized match first, then the first entry containing the text"""
+        needle = normalize_label(text)
+        if not needle:
+            return None
+        for control in index.get(needle, []):
+            if control["visible"]:
+                return control
+        for key, controls in index.items():
+            if needle in key:
+                for control in controls:
+                    if control["visible"]:
+                        return control
+        return None
+
+    def find(self, texts: list) -> Optional[dict]:
+        """Find a visible control by placeholder or label, trying each text in order"""
+        for text in texts:
+            control = self._lookup(self.by_placeholder, text) or self._lookup(self.by_label, text)
+            if control is not None:
+                return control
+        return None
+
+
+class SnapshotCache:
+    """Snapshots keyed by form URL + DOM fingerprint, so unchanged forms are captured once"""
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        """Cache size and hit/miss counters"""
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def latest(self, url: str) -> Optional[FormSnapshot]:
+        """The most recently used snapshot of a form, for planning a fill without a browser"""
+        with self._lock:
+            for (entry_url, _), snapshot in reversed(self._entries.items()):
+                if entry_url == url:
+                    return snapshot
+        return None
+
+    def invalidate(self, url: str, fingerprint: str):
+        """Drop a snapshot the live page turned out to disagree with"""
+        with self._lock:
+            self._entries.pop((url, fingerprint), None)
+
+    def get_snapshot(self, driver, url: str) -> tuple:
+        """Return (snapshot, from_cache) for the loaded page, capturing it only if the form changed"""
+        fingerprint = driver.execute_script(FINGERPRINT_SCRIPT)
+        key = (url, fingerprint)
+        with self._lock:
+            snapshot = self._entries.get(key)
+            if snapshot is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return snapshot, True
+            self.misses += 1
+
+        snapshot = FormSnapshot(driver.execute_script(SNAPSHOT_SCRIPT), fingerprint)
+        with self._lock:
+            self._entries[key] = snapshot
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return snapshot, False
+
+
+# Shared by every FormFiller in the process
+snapshot_cache = SnapshotCache()
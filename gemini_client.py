@@ -0,0 +1,349 @@
+"""
+Gemini client module: long-lived per-API-key clients with rate limiting, retries and hedged requests
+"""
+import asyncio
+import functools
+import hashlib
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import TYPE_CHECKING, Callable, Optional
+
+from concurrency import BoundedExecutor, OverloadedError
+
+if TYPE_CHECKING:
+    import google.generativeai as genai
+
+# Latency samples kept for the hedging threshold and the reported percentiles
+LATENCY_WINDOW = 200
+# Hedging only starts once this many latencies have been observed
+MIN_HEDGE_SAMPLES = 20
+
+
+def load_sdk():
+    """Import the Gemini SDK on first use: at close to a second it is the slowest import in the service"""
+    import google.ai.generativelanguage as glm
+    import google.generativeai as genai
+    return genai, glm
+
+
+@functools.lru_cache(maxsize=None)
+def retryable_errors() -> tuple:
+    """Quota, overload and transient server errors; anything else (bad key, bad request) fails at once"""
+    from google.api_core import exceptions as api_exceptions
+    return (
+        api_exceptions.ResourceExhausted,
+        api_exceptions.TooManyRequests,
+        api_exceptions.ServiceUnavailable,
+        api_exceptions.InternalServerError,
+        api_exceptions.BadGateway,
+        api_exceptions.GatewayTimeout,
+        api_exceptions.DeadlineExceeded,
+        ConnectionError,
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def structured_output_fields() -> frozenset:
+    """GenerationConfig fields for JSON-only output that the installed SDK knows (newer than 0.4)"""
+    _, glm = load_sdk()
+    return frozenset(name for name in ("response_mime_type", "response_schema") if name in glm.GenerationConfig.meta.fields)
+
+
+def structured_output_config(schema: dict) -> Optional[dict]:
+    """generation_config asking for a JSON response matching schema, or None where the SDK cannot express it"""
+    supported = structured_output_fields()
+    if "response_mime_type" not in supported:
+        return None
+    config = {"response_mime_type": "application/json"}
+    if "response_schema" in supported:
+        config["response_schema"] = schema
+    return config
+
+
+def is_retryable(error: Exception) -> bool:
+    return isinstance(error, retryable_errors())
+
+
+def _percentile(ordered: list, fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class StreamedResponse:
+    """Text and usage metadata of a streamed call, read like a generate_content response"""
+
+    def __init__(self, text: str, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class TokenBucket:
+    """Requests-per-minute limiter that lets short bursts through.
+
+    Tokens can go negative: each caller reserves its slot and sleeps until it
+    comes up, so waiters are served in arrival order without a queue.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int = 1):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """Take a token, returning how many seconds the caller must wait before using it"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def try_acquire(self) -> bool:
+        """Take a token only if one is available right now"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class GeminiClient:
+    """One API key's connection, models and call policy, shared by every request using that key.
+
+    Calls pass through the token bucket, run on the model executor, and are
+    retried with full-jitter exponential backoff on retryable errors. With
+    hedge_percentile set, a duplicate request is sent when the first one is
+    slower than that percentile of recent latencies (only if the bucket has
+    a spare token), and whichever finishes first wins.
+    """
+
+    def __init__(self, api_key: str, requests_per_minute: float = 0, burst: int = 5,
+                 max_retries: int = 3, base_backoff: float = 1.0, max_backoff: float = 20.0,
+                 hedge_percentile: Optional[float] = None, executor: Optional[BoundedExecutor] = None):
+        # A dedicated service client per key instead of genai.configure(), which is process-global
+        _, glm = load_sdk()
+        self._service_client = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+        self._models = {}
+        self.bucket = TokenBucket(requests_per_minute, burst) if requests_per_minute > 0 else None
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.hedge_percentile = hedge_percentile
+        self.executor = executor
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+
+        self.requests = 0
+        self.successes = 0
+        self.failures = 0
+        self.retries = 0
+        self.throttle_waits = 0
+        self.throttle_wait_seconds = 0.0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def model(self, model_name: str) -> "genai.GenerativeModel":
+        model = self._models.get(model_name)
+        if model is None:
+            genai, _ = load_sdk()
+            model = genai.GenerativeModel(model_name)
+            model._client = self._service_client
+            self._models[model_name] = model
+        return model
+
+    async def _throttle(self):
+        if self.bucket is None:
+            return
+        wait = self.bucket.reserve()
+        if wait > 0:
+            self.throttle_waits += 1
+            self.throttle_wait_seconds += wait
+            await asyncio.sleep(wait)
+
+    async def _call(self, model: "genai.GenerativeModel", contents: list, generation_config: Optional[dict] = None):
+        options = {"generation_config": generation_config} if generation_config else {}
+        if self.executor is None:
+            return await asyncio.to_thread(model.generate_content, contents, **options)
+        return await self.executor.run(model.generate_content, contents, **options)
+
+    def _hedge_threshold(self) -> Optional[float]:
+        if not self.hedge_percentile or len(self._latencies) < MIN_HEDGE_SAMPLES:
+            return None
+        return _percentile(sorted(self._latencies), self.hedge_percentile)
+
+    async def _call_with_hedge(self, model: "genai.GenerativeModel", contents: list,
+                               generation_config: Optional[dict] = None):
+        primary = asyncio.ensure_future(self._call(model, contents, generation_config))
+        threshold = self._hedge_threshold()
+        if threshold is None:
+            return await primary
+
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=threshold)
+            if done or (self.bucket is not None and not self.bucket.try_acquire()):
+                return await primary
+
+            self.hedges += 1
+            hedge = asyncio.ensure_future(self._call(model, contents, generation_config))
+            tasks.add(hedge)
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        return task.result()
+            # Both failed: report the primary's error
+            return primary.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    # The worker thread runs to completion; its result is simply dropped
+                    task.cancel()
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    async def generate(self, model_name: str, contents: list, generation_config: Optional[dict] = None):
+        """generate_content with rate limiting, retries and optional hedging"""
+        model = self.model(model_name)
+        self.requests += 1
+        attempt = 0
+        while True:
+            await self._throttle()
+            started = time.monotonic()
+            try:
+                response = await self._call_with_hedge(model, contents, generation_config)
+            except OverloadedError:
+                raise
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    self.failures += 1
+                    raise
+                attempt += 1
+                self.retries += 1
+                delay = random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+                print(f"Gemini call failed ({type(e).__name__}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            self._latencies.append(time.monotonic() - started)
+            self.successes += 1
+            return response
+
+    @staticmethod
+    def _stream_call(model: "genai.GenerativeModel", contents: list, on_text: Callable[[str], None],
+                     generation_config: Optional[dict] = None) -> StreamedResponse:
+        """Consume a streamed response in the worker thread, handing each text chunk to on_text"""
+        pieces = []
+        usage_metadata = None
+        options = {"generation_config": generation_config} if generation_config else {}
+        for chunk in model.generate_content(contents, stream=True, **options):
+            # Where reported, the last chunk carries the usage totals for the whole call
+            usage_metadata = getattr(chunk, "usage_metadata", None) or usage_metadata
+            try:
+                piece = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. the final one carrying only the finish reason)
+                continue
+            pieces.append(piece)
+            on_text(piece)
+        return StreamedResponse("".join(pieces), usage_metadata)
+
+    async def generate_stream(self, model_name: str, contents: list, on_text: Callable[[str], None],
+                              generation_config: Optional[dict] = None) -> StreamedResponse:
+        """Streamed generate_content: on_text gets each chunk as it arrives, the full response is returned.
+
+        on_text runs in the worker thread. Calls are throttled like generate(), but
+        only retried while nothing has been streamed yet, and never hedged, since
+        chunks already handed out cannot be taken back.
+        """
+        model = self.model(model_name)
+        self.requests += 1
+        attempt = 0
+        received = []
+
+        def forward(piece: str):
+            received.append(len(piece))
+            on_text(piece)
+
+        while True:
+            await self._throttle()
+            started = time.monotonic()
+            try:
+                if self.executor is None:
+                    response = await asyncio.to_thread(self._stream_call, model, contents, forward, generation_config)
+                else:
+                    response = await self.executor.run(self._stream_call, model, contents, forward, generation_config)
+            except OverloadedError:
+                raise
+            except Exception as e:
+                if received or not is_retryable(e) or attempt >= self.max_retries:
+                    self.failures += 1
+                    raise
+                attempt += 1
+                self.retries += 1
+                delay = random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+                print(f"Gemini stream failed ({type(e).__name__}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            self._latencies.append(time.monotonic() - started)
+            self.successes += 1
+            return response
+
+    def stats(self) -> dict:
+        """Call counters and recent latency percentiles"""
+        latencies = sorted(self._latencies)
+        return {
+            "requests": self.requests,
+            "successes": self.successes,
+            "failures": self.failures,
+            "retries": self.retries,
+            "throttle_waits": self.throttle_waits,
+            "throttle_wait_seconds": round(self.throttle_wait_seconds, 3),
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "latency_p50": round(_percentile(latencies, 0.5), 3) if latencies else None,
+            "latency_p95": round(_percentile(latencies, 0.95), 3) if latencies else None,
+            "latency_p99": round(_percentile(latencies, 0.99), 3) if latencies else None,
+        }
+
+
+class GeminiClientRegistry:
+    """Clients keyed by API key, created on first use and kept for reuse (LRU-bounded)"""
+
+    def __init__(self, max_clients: int = 64, **client_options):
+        self.max_clients = max_clients
+        self.client_options = client_options
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key_id(api_key: str) -> str:
+        # Keys are never stored or reported in the clear
+        return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+    def _create(self, api_key: str) -> GeminiClient:
+        return GeminiClient(api_key, **self.client_options)
+
+    def get(self, api_key: str) -> GeminiClient:
+        key_id = self._key_id(api_key)
+        with self._lock:
+            client = self._clients.get(key_id)
+            if client is None:
+                client = self._create(api_key)
+                self._clients[key_id] = client
+                while len(self._clients) > self.max_clients:
+                    self._clients.popitem(last=False)
+            self._clients.move_to_end(key_id)
+            return client
+
+    def stats(self) -> dict:
+        """Per-key counters, identified by a short hash of the key"""
+        with self._lock:
+            clients = list(self._clients.items())
+        return {key_id: client.stats() for key_id, client in clients}
@@ -0,0 +1,219 @@
+"""
+Image preparation module: shrink document images to a pixel/byte budget before model upload
+"""
+import collections
+import io
+import math
+import os
+import threading
+from typing import TYPE_CHECKING, Optional, Union
+
+# Pillow is imported where it is used, so importing the service does not load it
+if TYPE_CHECKING:
+    from PIL import Image
+
+# Per document type upload budget. Passports are small and dense; the G-28 needs
+# more pixels for its fine print. Tune these against the stats at /image-stats.
+IMAGE_BUDGETS = {
+    "passport": {"max_pixels": 2_000_000, "max_bytes": 400_000, "quality": 85, "min_quality": 60},
+    "g28": {"max_pixels": 3_000_000, "max_bytes": 600_000, "quality": 80, "min_quality": 55},
+}
+
+# Border pixels differing from the background by less than this are trimmed
+CROP_THRESHOLD = 24
+# Only crop when it removes at least this fraction of the area
+MIN_CROP_GAIN = 0.05
+
+
+def _byte_ratio(input_bytes: int, output_bytes: int) -> Optional[float]:
+    return round(output_bytes / input_bytes, 4) if input_bytes else None
+
+
+class ImageStats:
+    """Input vs. output size totals per document type, plus the most recent images one by one.
+
+    The recent entries show the spread behind the totals (e.g. a few huge scans
+    among many small photos), which is what a budget is tuned against.
+    """
+
+    def __init__(self, max_recent: int = 100):
+        self._lock = threading.Lock()
+        self._totals = {}
+        self._recent = {}
+        self.max_recent = max_recent
+
+    def record(self, doc_type: str, stats: dict):
+        with self._lock:
+            totals = self._totals.setdefault(doc_type, {
+                "images": 0, "input_bytes": 0, "output_bytes": 0, "input_pixels": 0, "output_pixels": 0,
+            })
+            totals["images"] += 1
+            for key in ("input_bytes", "output_bytes", "input_pixels", "output_pixels"):
+                totals[key] += stats[key]
+            recent = self._recent.setdefault(doc_type, collections.deque(maxlen=self.max_recent))
+            recent.append({**stats, "byte_ratio": _byte_ratio(stats["input_bytes"], stats["output_bytes"])})
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            result = {}
+            for doc_type, totals in self._totals.items():
+                entry = dict(totals)
+                entry["byte_ratio"] = _byte_ratio(totals["input_bytes"], totals["output_bytes"])
+                recent = [dict(item) for item in self._recent[doc_type]]
+                ratios = sorted(item["byte_ratio"] for item in recent if item["byte_ratio"] is not None)
+                entry["recent_byte_ratio"] = {
+                    "p50": ratios[len(ratios) // 2], "p95": ratios[min(len(ratios) - 1, int(len(ratios) * 0.95))],
+                    "max": ratios[-1],
+                } if ratios else None
+                entry["recent"] = recent
+                result[doc_type] = entry
+            return result
+
+
+# Shared by every DocumentProcessor in the process
+image_stats = ImageStats()
+
+
+def _open_with_draft(source, max_pixels: int) -> "Image.Image":
+    """Open an image, letting the JPEG decoder downscale by 1/2, 1/4 or 1/8 while decoding"""
+    from PIL import Image
+    image = Image.open(source)
+    if image.format == "JPEG" and image.width * image.height > max_pixels:
+        scale = math.sqrt(max_pixels / (image.width * image.height))
+        # draft() picks the largest reduction that still yields at least this size
+        image.draft("RGB", (max(1, int(image.width * scale)), max(1, int(image.height * scale))))
+    image.load()
+    return image
+
+
+def _crop_to_document(image: "Image.Image") -> "Image.Image":
+    """Trim a near-uniform border (scanner bed, table) around the document"""
+    from PIL import Image, ImageChops
+    probe = image.convert("L")
+    probe.thumbnail((512, 512))
+    corners = [probe.getpixel((0, 0)), probe.getpixel((probe.width - 1, 0)),
+               probe.getpixel((0, probe.height - 1)), probe.getpixel((probe.width - 1, probe.height - 1))]
+    background = sorted(corners)[len(corners) // 2]
+
+    diff = ImageChops.difference(probe, Image.new("L", probe.size, background))
+    bbox = diff.point(lambda value: 255 if value > CROP_THRESHOLD else 0).getbbox()
+    if bbox is None:
+        return image
+
+    crop_area = (bbox[2] - bbox[0]) * (bbox[3] - bbox[1])
+    if crop_area > probe.width * probe.height * (1 - MIN_CROP_GAIN):
+        return image
+
+    # Map the probe box back to full resolution with a small safety margin
+    scale_x = image.width / probe.width
+    scale_y = image.height / probe.height
+    margin = 2
+    left = max(0, int((bbox[0] - margin) * scale_x))
+    top = max(0, int((bbox[1] - margin) * scale_y))
+    right = min(image.width, int(math.ceil((bbox[2] + margin) * scale_x)))
+    bottom = min(image.height, int(math.ceil((bbox[3] + margin) * scale_y)))
+    return image.crop((left, top, right, bottom))
+
+
+def _encode_jpeg(image: "Image.Image", quality: int) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def crop_bottom_band(part: dict, fraction: float = 0.3, min_width: int = 1000) -> Optional[dict]:
+    """Crop the bottom band of a prepared image (e.g. a passport's MRZ) as a zoomed-in JPEG part"""
+    from PIL import Image
+    try:
+        image = Image.open(io.BytesIO(part["data"]))
+        image.load()
+    except Exception:
+        return None
+    band = image.crop((0, int(image.height * (1 - fraction)), image.width, image.height))
+    if band.width < min_width:
+        scale = min_width / band.width
+        band = band.resize((min_width, max(1, int(band.height * scale))), Image.LANCZOS)
+    if band.mode != "RGB":
+        band = band.convert("RGB")
+    return {"mime_type": "image/jpeg", "data": _encode_jpeg(band, 90)}
+
+
+def _read_source(source) -> bytes:
+    if isinstance(source, bytes):
+        return source
+    with open(source, "rb") as f:
+        return f.read()
+
+
+def prepare_image(source: Union[str, bytes, "Image.Image"], doc_type: str, budget: Optional[dict] = None,
+                  input_bytes: Optional[int] = None) -> tuple:
+    """Orient, crop, downscale and re-encode an image to fit the document type's budget.
+
+    The source is a file path, the encoded file bytes, or an already decoded image.
+    Returns (part, stats), where part is an inline JPEG blob for generate_content.
+    """
+    from PIL import Image, ImageOps
+    budget = budget or IMAGE_BUDGETS[doc_type]
+    max_pixels = budget["max_pixels"]
+
+    encoded = isinstance(source, (str, bytes))
+    if encoded:
+        if input_bytes is None:
+            input_bytes = len(source) if isinstance(source, bytes) else os.path.getsize(source)
+        opener = (lambda: io.BytesIO(source)) if isinstance(source, bytes) else (lambda: source)
+        with Image.open(opener()) as header:
+            input_pixels = header.width * header.height
+        image = _open_with_draft(opener(), max_pixels)
+    else:
+        image = source
+        input_pixels = image.width * image.height
+
+    original = image
+    if image.getexif().get(0x0112, 1) != 1:
+        # Apply the camera's EXIF orientation tag so the model sees the page upright
+        image = ImageOps.exif_transpose(image)
+    image = _crop_to_document(image)
+
+    pixels = image.width * image.height
+    if (encoded and image is original and original.format == "JPEG" and pixels == input_pixels
+            and pixels <= max_pixels and input_bytes <= budget["max_bytes"]):
+        # Already an upright, tight JPEG within budget: re-encoding would only add bytes.
+        # A drafted decode is smaller than the file, so it is re-encoded instead.
+        data = _read_source(source)
+        stats = {
+            "input_bytes": input_bytes,
+            "output_bytes": len(data),
+            "input_pixels": input_pixels,
+            "output_pixels": pixels,
+            "quality": None,
+        }
+        image_stats.record(doc_type, stats)
+        return {"mime_type": "image/jpeg", "data": data}, stats
+
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    if pixels > max_pixels:
+        scale = math.sqrt(max_pixels / pixels)
+        image = image.resize((max(1, int(image.width * scale)), max(1, int(image.height * scale))), Image.LANCZOS)
+
+    # Step quality down first, then resolution, until the encoded size fits
+    quality = budget["quality"]
+    data = _encode_jpeg(image, quality)
+    while len(data) > budget["max_bytes"]:
+        if quality - 10 >= budget["min_quality"]:
+            quality -= 10
+        else:
+            image = image.resize((max(1, int(image.width * 0.85)), max(1, int(image.height * 0.85))), Image.LANCZOS)
+        data = _encode_jpeg(image, quality)
+        if image.width < 200 or image.height < 200:
+            break
+
+    stats = {
+        "input_bytes": input_bytes or 0,
+        "output_bytes": len(data),
+        "input_pixels": input_pixels,
+        "output_pixels": image.width * image.height,
+        "quality": quality,
+    }
+    image_stats.record(doc_type, stats)
+    return {"mime_type": "image/jpeg", "data": data}, stats
@@ -0,0 +1,212 @@
+"""
+Ingestion module: stream uploads into memory while hashing, sniffing and size-checking them
+"""
+import asyncio
+import hashlib
+import io
+from pathlib import Path
+from typing import Optional
+from fastapi import HTTPException, Request, UploadFile
+from fastapi.routing import APIRoute
+from multipart.multipart import parse_options_header
+from starlette.datastructures import FormData
+from starlette.formparsers import MultiPartException, MultiPartParser
+
+from metrics import metrics
+from storage import write_file
+
+# Magic bytes -> (extension, MIME type). The client-supplied content_type is not trusted.
+MAGIC_TYPES = (
+    (b"%PDF-", "pdf", "application/pdf"),
+    (b"\xff\xd8\xff", "jpg", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "png", "image/png"),
+)
+
+# Enough leading bytes to recognise every signature above
+SNIFF_BYTES = 8
+
+CHUNK_SIZE = 64 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """The upload exceeded the configured maximum size"""
+
+
+class UnsupportedFileTypeError(Exception):
+    """The upload's magic bytes do not match a supported document type"""
+
+
+def sniff_file_type(head: bytes) -> Optional[tuple]:
+    """Return (extension, MIME type) for the leading bytes of a file, or None"""
+    for magic, extension, mime_type in MAGIC_TYPES:
+        if head.startswith(magic):
+            return extension, mime_type
+    return None
+
+
+class InMemoryMultiPartParser(MultiPartParser):
+    """Multipart parser whose file spool threshold is set per instance rather than on the class"""
+
+    def __init__(self, *args, max_file_size: int, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_file_size = max(self.max_file_size, max_file_size)
+
+
+class InMemoryUploadRequest(Request):
+    """Request that parses multipart bodies with InMemoryMultiPartParser; other content types are unchanged"""
+
+    def __init__(self, scope, receive, max_file_size: int):
+        super().__init__(scope, receive)
+        self.max_file_size = max_file_size
+
+    async def _get_form(self, *, max_files=1000, max_fields=1000) -> FormData:
+        if self._form is None:
+            content_type, _ = parse_options_header(self.headers.get("Content-Type"))
+            if content_type == b"multipart/form-data":
+                parser = InMemoryMultiPartParser(self.headers, self.stream(), max_files=max_files,
+                                                 max_fields=max_fields, max_file_size=self.max_file_size)
+                try:
+                    self._form = await parser.parse()
+                except MultiPartException as exc:
+                    raise HTTPException(status_code=400, detail=exc.message)
+        return await super()._get_form(max_files=max_files, max_fields=max_fields)
+
+
+def in_memory_upload_route(max_bytes: int) -> type:
+    """APIRoute class whose multipart uploads up to max_bytes per file stay in memory instead of spilling to a temp file.
+
+    Starlette only exposes the spool threshold as a class attribute of its parser,
+    so instead of changing it for the whole process the routes built from this
+    class parse their bodies with a parser configured for this request alone.
+    """
+
+    class InMemoryUploadRoute(APIRoute):
+        def get_route_handler(self):
+            handler = super().get_route_handler()
+
+            async def in_memory_handler(request: Request):
+                return await handler(InMemoryUploadRequest(request.scope, request.receive, max_bytes))
+
+            return in_memory_handler
+
+    return InMemoryUploadRoute
+
+
+class RequestBodyLimit:
+    """ASGI middleware capping request bodies under path_prefix before the multipart parser reads them.
+
+    A declared Content-Length over max_bytes is answered with 413 without reading
+    the body at all; bodies without one (chunked) are counted as they arrive and
+    cut off with 413 as soon as they pass the limit.
+    """
+
+    def __init__(self, app, max_bytes: int, path_prefix: str = "/upload"):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_prefix = path_prefix
+
+    def _too_large(self):
+        from fastapi.responses import JSONResponse
+        return JSONResponse({"detail": f"Request body exceeds {self.max_bytes // (1024 * 1024)} MB"}, status_code=413)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        declared = dict(scope["headers"]).get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > self.max_bytes:
+            await self._too_large()(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised inside the route's body parsing, where FastAPI turns it into the response
+                    raise HTTPException(status_code=413, detail=f"Request body exceeds {self.max_bytes // (1024 * 1024)} MB")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+class IngestedFile:
+    """An upload held in memory, identified by its content hash"""
+
+    def __init__(self, data: bytes, sha256: str, extension: str, mime_type: str,
+                 filename: str = "", path: Optional[str] = None):
+        self.data = data
+        self.sha256 = sha256
+        self.extension = extension
+        self.mime_type = mime_type
+        self.filename = filename
+        self.path = path
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    @property
+    def suffix(self) -> str:
+        return f".{self.extension}"
+
+    def open(self) -> io.BytesIO:
+        """A fresh binary stream over the contents"""
+        return io.BytesIO(self.data)
+
+
+async def ingest_upload(upload: UploadFile, max_bytes: int, persist_dir: Optional[Path] = None) -> IngestedFile:
+    """Read an upload chunk by chunk, hashing and type-checking it as it arrives.
+
+    The multipart body has already been parsed (and spooled) by the time the
+    endpoint runs, so this is a per-file check on data already received; the
+    whole request is capped earlier by RequestBodyLimit. The size limit and file
+    type are enforced as soon as the offending bytes are seen, so nothing past
+    them is hashed or copied. When persist_dir is given the file is also written there under its content
+    hash, which makes concurrent uploads of same-named files collision-free.
+    """
+    digest = hashlib.sha256()
+    chunks = []
+    size = 0
+    head = b""
+    file_type = None
+
+    with metrics.timer("upload_read"):
+        while True:
+            chunk = await upload.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLargeError(f"File exceeds the {max_bytes // (1024 * 1024)} MB upload limit")
+            chunks.append(chunk)
+            digest.update(chunk)
+            if file_type is None:
+                head += chunk[:SNIFF_BYTES - len(head)]
+                if len(head) >= SNIFF_BYTES:
+                    file_type = sniff_file_type(head)
+                    if file_type is None:
+                        raise UnsupportedFileTypeError("Unsupported file type")
+
+    if file_type is None:
+        file_type = sniff_file_type(head)
+        if file_type is None:
+            raise UnsupportedFileTypeError("Unsupported file type")
+
+    extension, mime_type = file_type
+    # The chunks are joined once, straight into the bytes the processor and cache keep
+    data = chunks[0] if len(chunks) == 1 else b"".join(chunks)
+    ingested = IngestedFile(data, digest.hexdigest(), extension, mime_type, upload.filename or "")
+
+    if persist_dir is not None:
+        path = Path(persist_dir) / f"{ingested.sha256}.{extension}"
+        if not path.exists():
+            with metrics.timer("upload_write"):
+                await asyncio.to_thread(write_file, path, ingested.data)
+        ingested.path = str(path)
+
+    return ingested
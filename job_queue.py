@@ -0,0 +1,234 @@
+"""
+Job queue module: run extraction and form filling as background jobs on per-lane worker limits
+"""
+import asyncio
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from concurrency import OverloadedError
+from metrics import metrics
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobCancelled(BaseException):
+    """Raised at a progress checkpoint once cancellation was requested.
+
+    Derives from BaseException (like asyncio.CancelledError) so the generic
+    `except Exception` handlers inside the work functions do not swallow it.
+    """
+
+
+class Job:
+    """One submitted operation, its progress and its outcome"""
+
+    def __init__(self, kind: str, lane: str, owner: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.lane = lane
+        self.owner = owner
+        self.status = QUEUED
+        self.stage = "queued"
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # (stage, seconds) pairs recorded while the job ran, for Server-Timing on its result
+        self.timings = None
+        # (event, data) pairs published while the job runs, e.g. fields streamed out of an extraction
+        self.events = []
+        self._changed = asyncio.Event()
+        self._cancel_requested = threading.Event()
+        self._task = None
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel_requested.is_set()
+
+    def report(self, stage: str, progress: Optional[float] = None):
+        """Record progress; safe to call from worker threads. Doubles as a cancellation checkpoint."""
+        if self._cancel_requested.is_set():
+            raise JobCancelled()
+        self.stage = stage
+        if progress is not None:
+            self.progress = max(self.progress, min(1.0, progress))
+
+    def publish(self, event: str, data: dict):
+        """Hand an event to everyone following the job; call from the event loop thread"""
+        self.events.append((event, data))
+        self._changed.set()
+
+    async def follow(self, start: int = 0, poll_seconds: float = 1.0):
+        """Yield (event_id, event, data) for published events from index start, plus "status" changes.
+
+        Ends once the job has finished and every event was delivered. Status
+        updates carry no id; published events are numbered so a reconnecting
+        client can resume after the last one it saw.
+        """
+        index = start
+        last_state = None
+        while True:
+            # Cleared before draining, so an event published while the consumer is busy wakes the next wait
+            self._changed.clear()
+            while index < len(self.events):
+                event, data = self.events[index]
+                index += 1
+                yield index, event, data
+            state = (self.status, self.stage, round(self.progress, 2))
+            if state != last_state:
+                last_state = state
+                yield None, "status", self.to_dict()
+            if self.status in FINISHED_STATES:
+                return
+            try:
+                # Progress reported from worker threads is picked up by polling
+                await asyncio.wait_for(self._changed.wait(), poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def to_dict(self) -> dict:
+        now = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "lane": self.lane,
+            "status": self.status,
+            "cancel_requested": self.cancel_requested,
+            "stage": self.stage,
+            "progress": round(self.progress, 3),
+            "error": self.error,
+            "queued_seconds": round((self.started_at or now) - self.created_at, 3),
+            "run_seconds": round(now - self.started_at, 3) if self.started_at else None,
+        }
+
+
+class JobQueue:
+    """Background jobs with a concurrency limit per lane.
+
+    Lanes map to the real bottleneck of the work: e.g. "model" for Gemini calls
+    and "browser" for Selenium sessions. Each lane runs at most its configured
+    number of jobs at once and accepts up to max_queued waiting jobs; beyond that
+    submit() raises OverloadedError. Finished jobs are kept for retention_seconds
+    so clients can fetch their results.
+    """
+
+    def __init__(self, lanes: dict, max_queued: int = 32, retention_seconds: float = 3600,
+                 interruptible_lanes: tuple = ("model",)):
+        self.lanes = {name: max(1, limit) for name, limit in lanes.items()}
+        self.max_queued = max_queued
+        self.retention_seconds = retention_seconds
+        # Running jobs in these lanes are cancelled at once; others stop at their next checkpoint
+        self.interruptible_lanes = set(interruptible_lanes)
+        self._semaphores = {}
+        self._jobs = OrderedDict()
+        self._counts = {name: {"queued": 0, "running": 0, "succeeded": 0, "failed": 0, "cancelled": 0, "rejected": 0}
+                        for name in self.lanes}
+
+    def _semaphore(self, lane: str) -> asyncio.Semaphore:
+        # Created lazily so they bind to the running event loop
+        if lane not in self._semaphores:
+            self._semaphores[lane] = asyncio.Semaphore(self.lanes[lane])
+        return self._semaphores[lane]
+
+    def _purge(self):
+        """Forget finished jobs older than the retention window.
+
+        Jobs are kept in submission order, which is not the order they finish in,
+        so every finished job is checked rather than stopping at the first recent one.
+        """
+        cutoff = time.time() - self.retention_seconds
+        for job_id, job in list(self._jobs.items()):
+            if job.status in FINISHED_STATES and job.finished_at <= cutoff:
+                del self._jobs[job_id]
+
+    def submit(self, kind: str, lane: str, work: Callable[[Job], Awaitable], owner: Optional[str] = None) -> Job:
+        """Queue work(job) on the given lane and return its job immediately"""
+        if lane not in self.lanes:
+            raise ValueError(f"Unknown job lane: {lane}")
+        counts = self._counts[lane]
+        if counts["queued"] >= self.max_queued:
+            counts["rejected"] += 1
+            raise OverloadedError(f"{lane} job")
+
+        self._purge()
+        job = Job(kind, lane, owner)
+        self._jobs[job.id] = job
+        counts["queued"] += 1
+        job._task = asyncio.get_running_loop().create_task(self._run(job, work))
+        return job
+
+    async def _run(self, job: Job, work: Callable[[Job], Awaitable]):
+        counts = self._counts[job.lane]
+        started = False
+        try:
+            async with self._semaphore(job.lane):
+                counts["queued"] -= 1
+                counts["running"] += 1
+                started = True
+                job.status = RUNNING
+                job.started_at = time.time()
+                with metrics.scope() as job.timings:
+                    metrics.observe(f"{job.lane}_queue_wait", job.started_at - job.created_at)
+                    job.report("running", 0.0)
+                    job.result = await work(job)
+            job.status = SUCCEEDED
+            job.stage = "done"
+            job.progress = 1.0
+        except (asyncio.CancelledError, JobCancelled):
+            job.status = CANCELLED
+            job.stage = "cancelled"
+        except Exception as e:
+            job.status = FAILED
+            job.error = getattr(e, "detail", None) or str(e)
+        finally:
+            job.finished_at = time.time()
+            if started:
+                counts["running"] -= 1
+            else:
+                counts["queued"] -= 1
+            counts[job.status] += 1
+            job._changed.set()
+
+    def get(self, job_id: str, owner: Optional[str] = None) -> Optional[Job]:
+        """Look up a job; jobs submitted with an owner are only visible to that owner"""
+        job = self._jobs.get(job_id)
+        if job is None or (job.owner is not None and job.owner != owner):
+            return None
+        return job
+
+    def cancel(self, job: Job) -> bool:
+        """Request cancellation; returns False if the job had already finished"""
+        if job.status in FINISHED_STATES:
+            return False
+        job._cancel_requested.set()
+        if job.status == QUEUED or job.lane in self.interruptible_lanes:
+            job._task.cancel()
+        return True
+
+    async def shutdown(self):
+        """Cancel every unfinished job and wait for them to wind down"""
+        tasks = []
+        for job in self._jobs.values():
+            if job.status not in FINISHED_STATES:
+                self.cancel(job)
+                tasks.append(job._task)
+        if tasks:
+            await asyncio.wait(tasks)
+
+    def stats(self) -> dict:
+        """Per-lane limits and job counters"""
+        return {
+            "lanes": {name: {"max_running": limit, **self._counts[name]} for name, limit in self.lanes.items()},
+            "max_queued": self.max_queued,
+            "retained_jobs": len(self._jobs),
+        }
@@ -1,19 +1,61 @@
 """
 FastAPI backend: handle file uploads and coordinate modules
 """
+import asyncio
+import json
 import os
-import shutil
-from pathlib import Path
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import APIRouter, Depends, FastAPI, UploadFile, File, HTTPException, Form, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from document_processor import DocumentProcessor
-from form_filler import FormFiller
+from concurrency import BoundedExecutor, OverloadedError
+from document_processor import ESCALATION_MODEL, MODEL_NAME, PROMPT_MODES, DocumentProcessor, refinement_stats
+from driver_pool import DriverPool
+from extraction_cache import ExtractionCache
+from image_prep import image_stats
+from ingestion import (RequestBodyLimit, UnsupportedFileTypeError, UploadTooLargeError, in_memory_upload_route,
+                       ingest_upload)
+from fill_plan import build_fill_plan
+from form_filler import DEFAULT_FORM_URL, FormFiller, WAIT_PROFILES
+from form_snapshot import snapshot_cache
+from gemini_client import GeminiClientRegistry, load_sdk, retryable_errors
+from job_queue import FAILED, FINISHED_STATES, SUCCEEDED, Job, JobQueue
+from metrics import metrics, server_timing_header
+from model_usage import usage_stats
+from pdf_render import PageRenderer
+from session_store import SESSION_COOKIE, Session, SessionStore, create_backend
+from storage import UploadStorage
+from warmup import Warmup
+
+# Warm browsers shared by all /fill-form requests; size it to the available cores
+driver_pool = DriverPool(
+    size=int(os.getenv("DRIVER_POOL_SIZE", str(max(1, (os.cpu_count() or 2) // 2)))),
+    max_uses=int(os.getenv("DRIVER_POOL_MAX_USES", "50")),
+    max_memory_growth_mb=int(os.getenv("DRIVER_POOL_MAX_MEMORY_MB", "256")),
+    max_age_seconds=float(os.getenv("DRIVER_POOL_MAX_AGE", "3600")),
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start the background warm-up and the storage janitor; shut everything down on exit"""
+    warmup.start()
+    storage.start_janitor()
+    yield
+    await warmup.stop()
+    await storage.stop_janitor()
+    await job_queue.shutdown()
+    model_executor.shutdown()
+    pdf_renderer.shutdown()
+    await asyncio.to_thread(driver_pool.shutdown)
+
 
 # Create FastAPI app
-app = FastAPI(title="Document Automation System")
+app = FastAPI(title="Document Automation System", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -24,16 +66,189 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Create upload directory
-UPLOAD_DIR = Path("uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
+# Persisted uploads and fill screenshots live in per-session/per-job directories under
+# STORAGE_DIR; a background janitor evicts them by age and keeps the total under the quota
+storage = UploadStorage(
+    root=os.getenv("STORAGE_DIR", "uploads"),
+    ttl_seconds=float(os.getenv("STORAGE_TTL", str(24 * 3600))),
+    max_bytes=int(os.getenv("STORAGE_MAX_MB", "500")) * 1024 * 1024,
+    sweep_interval=float(os.getenv("STORAGE_SWEEP_INTERVAL", "60")),
+)
+SCREENSHOT_MEDIA_TYPES = {".png": "image/png", ".jpg": "image/jpeg", ".webp": "image/webp"}
+FORM_URL = os.getenv("FORM_URL", DEFAULT_FORM_URL)
+
+DOCUMENT_TYPES = ("passport", "g28")
+
+# Uploads are streamed into memory; set PERSIST_UPLOADS=1 to also keep a content-addressed copy on disk
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "20")) * 1024 * 1024
+PERSIST_UPLOADS = os.getenv("PERSIST_UPLOADS", "0").lower() in ("1", "true", "yes")
+# Upload routes keep files up to MAX_UPLOAD_BYTES in memory; other multipart requests keep Starlette's default
+upload_router = APIRouter(route_class=in_memory_upload_route(MAX_UPLOAD_BYTES))
+# Upload requests are capped before the multipart parser reads them (room for every document plus form overhead)
+app.add_middleware(RequestBodyLimit, max_bytes=len(DOCUMENT_TYPES) * MAX_UPLOAD_BYTES + 64 * 1024)
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# In-memory storage for extracted data and API key
-extracted_data = {}
-api_key_storage = {"key": None}
+# Per-client API key and extracted documents, keyed by a session cookie.
+# Use SESSION_BACKEND=sqlite or redis when running more than one worker process.
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(24 * 3600)))
+session_store = SessionStore(create_backend(
+    os.getenv("SESSION_BACKEND", "memory"),
+    ttl_seconds=SESSION_TTL,
+    max_entries=int(os.getenv("SESSION_MAX_ENTRIES", "1000")),
+    sqlite_path=os.getenv("SESSION_SQLITE_PATH", "sessions.db"),
+    redis_url=os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0"),
+))
+
+# Per-stage histograms at /metrics and Server-Timing headers; METRICS_ENABLED=0 makes every timer a no-op
+metrics.enabled = os.getenv("METRICS_ENABLED", "1").lower() in ("1", "true", "yes")
+
+
+@app.middleware("http")
+async def session_middleware(request: Request, call_next):
+    """Attach the caller's session to the request and persist whatever the endpoint changed"""
+    with metrics.timer("session_load"):
+        session = await session_store.load(request.cookies.get(SESSION_COOKIE))
+    request.state.session = session
+    response = await call_next(request)
+    if session.modified:
+        with metrics.timer("session_save"):
+            await session_store.save(session)
+        if session.is_new:
+            response.set_cookie(SESSION_COOKIE, session.id, max_age=int(SESSION_TTL) or None,
+                                httponly=True, samesite="lax")
+    return response
+
+
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    """Time the request per route and report its stage timings in a Server-Timing header"""
+    if not metrics.enabled:
+        return await call_next(request)
+    started = time.perf_counter()
+    with metrics.scope() as timings:
+        response = await call_next(request)
+    elapsed = time.perf_counter() - started
+    route = request.scope.get("route")
+    # Route templates, not raw paths, so job ids do not create a series each
+    metrics.observe_request(request.method, getattr(route, "path", "unmatched"), response.status_code, elapsed)
+    response.headers["Server-Timing"] = server_timing_header(timings, total=elapsed)
+    return response
+
+
+def current_session(request: Request) -> Session:
+    return request.state.session
+
+
+def extracted_documents(session: Session) -> dict:
+    """The session's extracted data as {"passport": {...}, "g28": {...}}"""
+    return {doc_type: session.get(doc_type) for doc_type in DOCUMENT_TYPES if doc_type in session}
+
+# Extraction results shared across requests, keyed on file content
+extraction_cache = ExtractionCache(
+    max_entries=int(os.getenv("EXTRACTION_CACHE_SIZE", "256")),
+    disk_dir=os.getenv("EXTRACTION_CACHE_DIR") or None,
+    disk_max_bytes=int(os.getenv("EXTRACTION_CACHE_DISK_MB", "100")) * 1024 * 1024,
+    ttl_seconds=float(os.getenv("EXTRACTION_CACHE_TTL", str(7 * 24 * 3600))),
+)
+
+# Model calls run on their own bounded pool; overflow is rejected with 503
+model_executor = BoundedExecutor(
+    max_concurrent=int(os.getenv("MAX_CONCURRENT_MODEL_CALLS", "4")),
+    max_queue=int(os.getenv("MODEL_QUEUE_LIMIT", "16")),
+    name="model",
+)
+
+# One long-lived Gemini client per API key: connection reuse, quota-matched rate limit, retries
+gemini_clients = GeminiClientRegistry(
+    requests_per_minute=float(os.getenv("GEMINI_RPM", "0")),
+    burst=int(os.getenv("GEMINI_BURST", "5")),
+    max_retries=int(os.getenv("GEMINI_MAX_RETRIES", "3")),
+    hedge_percentile=float(os.getenv("GEMINI_HEDGE_PERCENTILE", "0")) or None,
+    executor=model_executor,
+)
+
+# Selected PDF pages are rasterized side by side in worker processes (0 renders in the request's thread)
+pdf_renderer = PageRenderer(max_workers=int(os.getenv("PDF_RENDER_WORKERS", str(min(4, os.cpu_count() or 1)))))
+
+# Fields still missing/invalid after a narrowed retry are escalated to this model ("none" disables)
+ESCALATION_MODEL_NAME = os.getenv("ESCALATION_MODEL", ESCALATION_MODEL)
+if ESCALATION_MODEL_NAME.lower() in ("", "none", "off"):
+    ESCALATION_MODEL_NAME = None
+
+# "compact" sends short schema-built prompts instead of the full ones with example JSON
+PROMPT_MODE = os.getenv("PROMPT_MODE", "full").lower()
+if PROMPT_MODE not in PROMPT_MODES:
+    raise ValueError(f"PROMPT_MODE must be one of {', '.join(PROMPT_MODES)}")
+
+# Uploads and fills return a job id at once; each lane is sized to its bottleneck
+job_queue = JobQueue(
+    lanes={
+        "model": int(os.getenv("JOB_MODEL_WORKERS", str(model_executor.max_concurrent))),
+        "browser": int(os.getenv("JOB_BROWSER_WORKERS", str(driver_pool.size))),
+    },
+    max_queued=int(os.getenv("JOB_QUEUE_LIMIT", "32")),
+    retention_seconds=float(os.getenv("JOB_RETENTION", "3600")),
+)
+
+
+def warm_gemini() -> dict:
+    """Import the Gemini SDK; with GEMINI_API_KEY set, also build that key's client and models"""
+    load_sdk()
+    retryable_errors()
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        return {"client": False}
+    client = gemini_clients.get(api_key)
+    for model_name in filter(None, (MODEL_NAME, ESCALATION_MODEL_NAME)):
+        client.model(model_name)
+    return {"client": True}
+
+
+def warm_browsers() -> dict:
+    """Resolve the driver binary and launch the whole browser pool"""
+    driver_pool.start()
+    stats = driver_pool.stats()
+    if not stats["live"]:
+        raise RuntimeError("no browser could be launched")
+    return {"live": stats["live"], "driver_path": stats["driver_path"]}
+
+
+def warm_form_snapshot() -> dict:
+    """Load the form once so /fill-plan resolves select options before the first fill"""
+    snapshot = FormFiller(driver_pool=driver_pool, form_url=FORM_URL).warm_snapshot()
+    return {"controls": len(snapshot.controls), "fingerprint": snapshot.fingerprint}
+
+
+# One-time startup work, done in the background so the server accepts connections at once.
+# WARMUP lists the components to warm ("all" or "none"); /ready reports their progress.
+WARMUP = os.getenv("WARMUP", "all").lower()
+warmup = Warmup(enabled=None if WARMUP == "all" else {name.strip() for name in WARMUP.split(",")})
+warmup.add("gemini", warm_gemini)
+warmup.add("pdf_render", pdf_renderer.warm)
+# Form filling is optional: a host without Chrome can still serve extractions
+warmup.add("browser", warm_browsers, required=False)
+warmup.add("form_snapshot", warm_form_snapshot, after=("browser",), required=False)
+
+
+def overloaded_response(e: OverloadedError) -> HTTPException:
+    """Map executor back-pressure to a retryable HTTP error"""
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
+async def read_upload(file: UploadFile, session: Session, label: str = ""):
+    """Ingest an upload, mapping size and type rejections to client errors"""
+    try:
+        upload = await ingest_upload(file, MAX_UPLOAD_BYTES, storage.session_dir(session.id) if PERSIST_UPLOADS else None)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UnsupportedFileTypeError as e:
+        raise HTTPException(status_code=400, detail=f"{e} for {label}" if label else str(e))
+    if upload.path:
+        # A re-upload of the same file refreshes its age instead of writing it again
+        await asyncio.to_thread(storage.track, upload.path, True)
+    return upload
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -44,114 +259,331 @@ async def root():
 
 
 @app.post("/set-api-key")
-async def set_api_key(api_key: str = Form(...)):
+async def set_api_key(api_key: str = Form(...), session: Session = Depends(current_session)):
     """Set the API key"""
-    api_key_storage["key"] = api_key
+    session.set("api_key", api_key)
     return JSONResponse({"status": "success", "message": "API key has been set"})
 
 
 @app.get("/check-api-key")
-async def check_api_key():
+async def check_api_key(session: Session = Depends(current_session)):
     """Check whether the API key is set"""
-    return JSONResponse({"has_key": api_key_storage["key"] is not None})
+    return JSONResponse({"has_key": session.get("api_key") is not None})
 
 
-@app.post("/upload/passport")
-async def upload_passport(file: UploadFile = File(...)):
-    """Upload a passport file"""
-    if not api_key_storage["key"]:
-        raise HTTPException(status_code=400, detail="Please set the API key first")
+def accepted_job(job: Job, message: str) -> JSONResponse:
+    """202 response pointing the client at the job's status and result"""
+    return JSONResponse({
+        "status": "accepted",
+        "message": message,
+        "job_id": job.id,
+        "status_url": f"/jobs/{job.id}",
+        "result_url": f"/jobs/{job.id}/result",
+        "events_url": f"/jobs/{job.id}/events",
+    }, status_code=202)
+
+
+def submit_extraction(session: Session, files: dict, message: str, stream: bool = False) -> JSONResponse:
+    """Queue extraction of {doc_type: upload} and store the results in the session when done.
     
-    try:
-        allowed_types = ["image/jpeg", "image/png", "application/pdf"]
-        if file.content_type not in allowed_types:
-            raise HTTPException(status_code=400, detail="Unsupported file type")
-        
-        file_path = UPLOAD_DIR / f"passport_{file.filename}"
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+    With stream, the model response is streamed and each field is published as a
+    "field" event on the job as soon as it is complete (see /jobs/{id}/events).
+    """
+    api_key = session.get("api_key")
+    
+    async def work(job: Job) -> dict:
+        job.report("extracting", 0.1)
+        # A new key's client is built off the event loop: it may be the first use of the Gemini SDK
+        client = await asyncio.to_thread(gemini_clients.get, api_key)
+        processor = DocumentProcessor(api_key, cache=extraction_cache, executor=model_executor,
+                                      client=client, escalation_model=ESCALATION_MODEL_NAME,
+                                      renderer=pdf_renderer, prompt_mode=PROMPT_MODE)
         
-        # Use stored API key
-        processor = DocumentProcessor(api_key_storage["key"])
-        passport_data = await processor.extract_passport_info(str(file_path))
-        extracted_data["passport"] = passport_data
+        def on_field(doc_type: str, key: str, value):
+            job.publish("field", {"doc_type": doc_type, "key": key, "value": value})
         
-        return JSONResponse({
-            "status": "success",
-            "message": "Passport uploaded successfully",
-            "data": passport_data
-        })
+        field_callback = on_field if stream else None
+        if len(files) == 1:
+            doc_type, upload = next(iter(files.items()))
+            extract = processor.extract_passport_info if doc_type == "passport" else processor.extract_g28_info
+            documents = {doc_type: await extract(upload, field_callback)}
+        else:
+            documents = await processor.extract_documents(files, field_callback)
+        job.report("saving", 0.9)
+        # The request that submitted the job has already returned, so write to the store directly
+        await session_store.update(session.id, documents)
+        return documents
+    
+    try:
+        job = job_queue.submit("extract", "model", work, owner=session.id)
+    except OverloadedError as e:
+        raise overloaded_response(e)
+    return accepted_job(job, message)
+
+
+@upload_router.post("/upload/passport", status_code=202)
+async def upload_passport(file: UploadFile = File(...), stream: bool = False,
+                          session: Session = Depends(current_session)):
+    """Upload a passport file; extraction runs as a background job"""
+    if not session.get("api_key"):
+        raise HTTPException(status_code=400, detail="Please set the API key first")
+    
+    try:
+        upload = await read_upload(file, session)
+        return submit_extraction(session, {"passport": upload}, "Passport uploaded, extraction queued", stream)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/upload/g28")
-async def upload_g28(file: UploadFile = File(...)):
-    """Upload a G-28 form"""
-    if not api_key_storage["key"]:
+@upload_router.post("/upload/g28", status_code=202)
+async def upload_g28(file: UploadFile = File(...), stream: bool = False,
+                     session: Session = Depends(current_session)):
+    """Upload a G-28 form; extraction runs as a background job"""
+    if not session.get("api_key"):
         raise HTTPException(status_code=400, detail="Please set the API key first")
     
     try:
-        allowed_types = ["image/jpeg", "image/png", "application/pdf"]
-        if file.content_type not in allowed_types:
-            raise HTTPException(status_code=400, detail="Unsupported file type")
-        
-        file_path = UPLOAD_DIR / f"g28_{file.filename}"
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        processor = DocumentProcessor(api_key_storage["key"])
-        g28_data = await processor.extract_g28_info(str(file_path))
-        extracted_data["g28"] = g28_data
-        
-        return JSONResponse({
-            "status": "success",
-            "message": "G-28 form uploaded successfully",
-            "data": g28_data
-        })
+        upload = await read_upload(file, session)
+        return submit_extraction(session, {"g28": upload}, "G-28 form uploaded, extraction queued", stream)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@upload_router.post("/upload/documents", status_code=202)
+async def upload_documents(passport: Optional[UploadFile] = File(None), g28: Optional[UploadFile] = File(None),
+                           stream: bool = False, session: Session = Depends(current_session)):
+    """Upload a passport and a G-28 together; both are extracted in one background job"""
+    if not session.get("api_key"):
+        raise HTTPException(status_code=400, detail="Please set the API key first")
+    
+    uploads = {doc_type: file for doc_type, file in (("passport", passport), ("g28", g28)) if file is not None}
+    if not uploads:
+        raise HTTPException(status_code=400, detail="Please upload at least one document")
+    
+    try:
+        files = {}
+        for doc_type, file in uploads.items():
+            files[doc_type] = await read_upload(file, session, doc_type)
+        return submit_extraction(session, files, "Documents uploaded, extraction queued", stream)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+app.include_router(upload_router)
+
+
 @app.get("/extracted-data")
-async def get_extracted_data():
+async def get_extracted_data(session: Session = Depends(current_session)):
     """Get extracted data"""
-    return JSONResponse(extracted_data)
+    return JSONResponse(extracted_documents(session))
+
+
+@app.get("/cache-stats")
+async def cache_stats():
+    """Report extraction cache hit/miss counters"""
+    return JSONResponse(extraction_cache.stats())
+
+
+@app.get("/model-stats")
+async def model_stats():
+    """Report model executor load, per-key retry, throttle and latency counters, and token usage"""
+    return JSONResponse({
+        **model_executor.stats(),
+        "clients": gemini_clients.stats(),
+        "prompt_mode": PROMPT_MODE,
+        "usage": usage_stats.snapshot(),
+        "refinement": refinement_stats.snapshot(),
+        "pdf_render": pdf_renderer.stats(),
+    })
+
+
+@app.get("/image-stats")
+async def get_image_stats():
+    """Report input vs. uploaded image bytes and pixels per document type"""
+    return JSONResponse(image_stats.snapshot())
+
+
+@app.get("/session-stats")
+async def session_stats():
+    """Report the session backend and live session count"""
+    return JSONResponse(await asyncio.to_thread(session_store.stats))
+
+
+@app.get("/storage-stats")
+async def storage_stats():
+    """Report upload storage usage and janitor eviction counters"""
+    return JSONResponse(storage.stats())
+
+
+@app.get("/driver-pool")
+async def driver_pool_stats():
+    """Report browser pool size and recycling counters"""
+    return JSONResponse(driver_pool.stats())
+
+
+@app.get("/fill-plan")
+async def get_fill_plan(session: Session = Depends(current_session)):
+    """Preview the exact field values a fill would enter, without launching a browser"""
+    extracted_data = extracted_documents(session)
+    if not extracted_data:
+        raise HTTPException(status_code=400, detail="Please upload documents first")
+    
+    # Selects are resolved against the last snapshot of the form; before any fill has run the plan is unverified
+    with metrics.timer("fill_plan"):
+        plan = build_fill_plan(extracted_data.get("passport", {}), extracted_data.get("g28", {}),
+                               FORM_URL, snapshot_cache.latest(FORM_URL))
+    return JSONResponse(plan.to_dict())
+
+
+@app.post("/fill-form", status_code=202)
+async def fill_form(profile: str = os.getenv("FILL_PROFILE", "standard"), session: Session = Depends(current_session)):
+    """Fill the form using extracted data; the browser run is a background job"""
+    extracted_data = extracted_documents(session)
+    if profile not in WAIT_PROFILES:
+        raise HTTPException(status_code=400, detail=f"Unknown fill profile: {profile}")
+    if not extracted_data:
+        raise HTTPException(status_code=400, detail="Please upload documents first")
+    
+    # Pass passport and G-28 data separately so form filler can use correct data for each section
+    passport_data = extracted_data.get("passport", {})
+    g28_data = extracted_data.get("g28", {})
+    
+    async def work(job: Job) -> dict:
+        # Each fill writes into its own job directory; the job id doubles as the screenshot id
+        job_dir = storage.job_dir(session.id, job.id, create=False)
+        form_filler = FormFiller(
+            driver_pool=driver_pool,
+            profile=profile,
+            screenshot_dir=str(job_dir),
+            screenshot_format=os.getenv("SCREENSHOT_FORMAT", "webp"),
+            screenshot_quality=int(os.getenv("SCREENSHOT_QUALITY", "80")),
+            screenshot_max_width=int(os.getenv("SCREENSHOT_MAX_WIDTH", "0")) or None,
+            form_url=FORM_URL,
+        )
+        result = await form_filler.fill_form(passport_data, g28_data, job_id=job.id, progress=job.report)
+        if result.get("screenshot"):
+            await asyncio.to_thread(storage.track, job_dir / result["screenshot"])
+            result["screenshot_url"] = f"/screenshots/{result['job_id']}"
+        return result
+    
+    try:
+        job = job_queue.submit("fill", "browser", work, owner=session.id)
+    except OverloadedError as e:
+        raise overloaded_response(e)
+    return accepted_job(job, "Form filling queued")
+
+
+def owned_job(job_id: str, session: Session) -> Job:
+    job = job_queue.get(job_id, owner=session.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, session: Session = Depends(current_session)):
+    """Report a job's status, current stage and progress"""
+    return JSONResponse(owned_job(job_id, session).to_dict())
+
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str, session: Session = Depends(current_session)):
+    """Return a finished job's result (409 while it is still queued or running)"""
+    job = owned_job(job_id, session)
+    # The job ran after its submitting request returned, so its stage timings are reported here
+    metrics.attach(job.timings)
+    if job.status == SUCCEEDED:
+        return JSONResponse({"status": "success", "job": job.to_dict(), "result": job.result})
+    if job.status in FINISHED_STATES:
+        raise HTTPException(status_code=500 if job.status == FAILED else 410, detail=job.error or f"Job {job.status}")
+    raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+
+
+def sse_message(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    """One Server-Sent Events message"""
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines += [f"event: {event}", f"data: {json.dumps(data)}"]
+    return "\n".join(lines) + "\n\n"
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request, session: Session = Depends(current_session)):
+    """Stream a job's status changes and published fields as Server-Sent Events, ending with its result"""
+    job = owned_job(job_id, session)
+    last_event_id = request.headers.get("last-event-id", "")
+    start = int(last_event_id) if last_event_id.isdigit() else 0
+    
+    async def stream():
+        async for event_id, event, data in job.follow(start):
+            yield sse_message(event, data, event_id)
+        if job.status == SUCCEEDED:
+            yield sse_message("result", {"status": "success", "job": job.to_dict(), "result": job.result})
+        else:
+            yield sse_message("failed", {"detail": job.error or f"Job {job.status}", "job": job.to_dict()})
+    
+    # Proxies must not buffer the stream, or fields would only arrive with the result
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str, session: Session = Depends(current_session)):
+    """Cancel a queued or running job"""
+    job = owned_job(job_id, session)
+    if not job_queue.cancel(job):
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+    return JSONResponse(job.to_dict())
+
+
+@app.get("/job-stats")
+async def job_stats():
+    """Report per-lane job limits and counters"""
+    return JSONResponse(job_queue.stats())
+
+
+@app.get("/ready")
+async def readiness():
+    """Readiness probe: 200 once the warm-up has finished, 503 while components are still warming"""
+    status = warmup.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
 
 
-@app.post("/fill-form")
-async def fill_form():
-    """Fill the form using extracted data"""
-    print(extracted_data)
+@app.get("/metrics")
+async def get_metrics():
+    """Per-stage and per-route latency histograms in the Prometheus text format"""
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/screenshots/{job_id}")
+async def get_screenshot(job_id: str, session: Session = Depends(current_session)):
+    """Stream the full-page screenshot captured for one of the session's fill jobs"""
     try:
-        if not extracted_data:
-            raise HTTPException(status_code=400, detail="Please upload documents first")
-        
-        # Pass passport and G-28 data separately so form filler can use correct data for each section
-        passport_data = extracted_data.get("passport", {})
-        g28_data = extracted_data.get("g28", {})
-        
-        form_filler = FormFiller()
-        result = await form_filler.fill_form(passport_data, g28_data)
-        
-        return JSONResponse({
-            "status": "success",
-            "message": "Form filling completed",
-            "result": result
-        })
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        job_dir = storage.job_dir(session.id, job_id, create=False)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid job id")
+    for suffix, media_type in SCREENSHOT_MEDIA_TYPES.items():
+        path = job_dir / f"{job_id}{suffix}"
+        if path.is_file():
+            return FileResponse(path, media_type=media_type)
+    raise HTTPException(status_code=404, detail="Screenshot not found")
 
 
 @app.post("/clear")
-async def clear_data():
-    """Clear uploaded and extracted data"""
-    global extracted_data
-    extracted_data = {}
+async def clear_data(session: Session = Depends(current_session)):
+    """Clear this session's uploaded and extracted data"""
+    for doc_type in DOCUMENT_TYPES:
+        session.remove(doc_type)
     
-    for file in UPLOAD_DIR.iterdir():
-        if file.is_file() and file.name != ".gitkeep":
-            file.unlink()
+    # Only the caller's own directory is removed; other sessions' files are left alone
+    await asyncio.to_thread(storage.clear_session, session.id)
     
     return JSONResponse({"status": "success", "message": "Data has been cleared"})
 
@@ -0,0 +1,199 @@
+"""
+Metrics module: per-stage timing histograms exported in Prometheus format and as Server-Timing headers
+"""
+import bisect
+import contextvars
+import threading
+import time
+from typing import Optional
+
+# Upper bounds (seconds) shared by every histogram; model calls and page loads dominate the tail
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Stage timings recorded while handling the current request or job, for Server-Timing
+_current_timings = contextvars.ContextVar("stage_timings", default=None)
+
+
+class Histogram:
+    """Cumulative-bucket histogram of durations in seconds"""
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += seconds
+
+    def snapshot(self) -> tuple:
+        """(cumulative counts per bucket including +Inf, sum)"""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative = []
+        running = 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total
+
+
+class _NullTimer:
+    """Shared do-nothing context manager returned while metrics are disabled"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+class _StageTimer:
+    __slots__ = ("_metrics", "_stage", "_started")
+
+    def __init__(self, metrics: "StageMetrics", stage: str):
+        self._metrics = metrics
+        self._stage = stage
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Failed stages are timed too: a slow failure is still where the time went
+        self._metrics.observe(self._stage, time.perf_counter() - self._started)
+        return False
+
+
+class _TimingScope:
+    """Collect the stage timings recorded inside the block (including worker threads it starts)"""
+
+    __slots__ = ("_enabled", "_token", "timings")
+
+    def __init__(self, enabled: bool):
+        self._enabled = enabled
+        self._token = None
+        self.timings = None
+
+    def __enter__(self) -> Optional[list]:
+        if self._enabled:
+            self.timings = []
+            self._token = _current_timings.set(self.timings)
+        return self.timings
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._token is not None:
+            _current_timings.reset(self._token)
+        return False
+
+
+class StageMetrics:
+    """Per-stage and per-route latency histograms.
+
+    timer(stage) is the instrumentation point used across the pipeline. While
+    disabled it returns a shared no-op object, so the cost is one attribute
+    check. Durations are also appended to the current request's or job's
+    timing list (see scope()) for the Server-Timing header.
+    """
+
+    def __init__(self, enabled: bool = True, buckets: tuple = DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self._stages = {}
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def _histogram(self, family: dict, key) -> Histogram:
+        histogram = family.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = family.setdefault(key, Histogram(self.buckets))
+        return histogram
+
+    def timer(self, stage: str):
+        """Context manager timing one stage"""
+        if not self.enabled:
+            return NULL_TIMER
+        return _StageTimer(self, stage)
+
+    def observe(self, stage: str, seconds: float):
+        """Record a stage duration measured elsewhere"""
+        if not self.enabled:
+            return
+        self._histogram(self._stages, stage).observe(seconds)
+        timings = _current_timings.get()
+        if timings is not None:
+            timings.append((stage, seconds))
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float):
+        if self.enabled:
+            self._histogram(self._routes, (method, route, str(status))).observe(seconds)
+
+    def scope(self) -> _TimingScope:
+        """Start a fresh timing list for a request or job; yields None while disabled"""
+        return _TimingScope(self.enabled)
+
+    def attach(self, timings: Optional[list]):
+        """Add timings recorded elsewhere (e.g. by a background job) to the current request's list"""
+        current = _current_timings.get()
+        if current is not None and timings:
+            current.extend(timings)
+
+    def render_prometheus(self) -> str:
+        """All histograms in the Prometheus text exposition format"""
+        lines = []
+        families = (
+            ("pipeline_stage_seconds", "Time spent in each pipeline stage", self._stages,
+             lambda key: f'stage="{_escape(key)}"'),
+            ("http_request_seconds", "HTTP request latency by route", self._routes,
+             lambda key: f'method="{key[0]}",route="{_escape(key[1])}",status="{key[2]}"'),
+        )
+        for name, description, family, format_labels in families:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} histogram")
+            with self._lock:
+                items = sorted(family.items())
+            for key, histogram in items:
+                labels = format_labels(key)
+                cumulative, total = histogram.snapshot()
+                for bound, count in zip(self.buckets, cumulative):
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {cumulative[-1]}')
+                lines.append(f"{name}_sum{{{labels}}} {total:.6f}")
+                lines.append(f"{name}_count{{{labels}}} {cumulative[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def server_timing_header(timings: list, total: Optional[float] = None) -> str:
+    """Format (stage, seconds) pairs as a Server-Timing value; repeated stages are summed"""
+    durations = {}
+    counts = {}
+    for stage, seconds in timings:
+        durations[stage] = durations.get(stage, 0.0) + seconds
+        counts[stage] = counts.get(stage, 0) + 1
+    entries = []
+    for stage, seconds in durations.items():
+        entry = f"{stage};dur={seconds * 1000:.1f}"
+        if counts[stage] > 1:
+            entry += f';desc="{counts[stage]} calls"'
+        entries.append(entry)
+    if total is not None:
+        entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+# Shared by every module; main.py turns it off with METRICS_ENABLED=0
+metrics = StageMetrics()
@@ -0,0 +1,112 @@
+"""
+Model usage module: per-call token and payload accounting, aggregated per document type
+"""
+import io
+import math
+import threading
+from typing import Optional
+
+
+# Fallback estimates for responses without usage metadata (the SDK pinned here reports none)
+CHARS_PER_TOKEN = 4
+# Gemini bills an image as one 258-token tile when both sides are at most 384px, else per 768px tile
+TOKENS_PER_IMAGE_TILE = 258
+SMALL_IMAGE_SIDE = 384
+IMAGE_TILE_SIDE = 768
+
+
+def _text_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def image_tokens(part: dict) -> int:
+    """Estimated input tokens of an inline image part, from its dimensions"""
+    from PIL import Image
+    try:
+        with Image.open(io.BytesIO(part["data"])) as image:
+            width, height = image.size
+    except Exception:
+        return TOKENS_PER_IMAGE_TILE
+    if width <= SMALL_IMAGE_SIDE and height <= SMALL_IMAGE_SIDE:
+        return TOKENS_PER_IMAGE_TILE
+    return math.ceil(width / IMAGE_TILE_SIDE) * math.ceil(height / IMAGE_TILE_SIDE) * TOKENS_PER_IMAGE_TILE
+
+
+def measure_request(contents: list) -> dict:
+    """Size of a generate_content request: payload bytes and estimated text/image tokens"""
+    text_bytes = image_bytes = text_tokens = images = 0
+    for part in contents:
+        if isinstance(part, str):
+            text_bytes += len(part.encode("utf-8"))
+            text_tokens += _text_tokens(part)
+        elif isinstance(part, dict) and "data" in part:
+            image_bytes += len(part["data"])
+            images += image_tokens(part)
+    return {"request_bytes": text_bytes + image_bytes, "image_bytes": image_bytes,
+            "prompt_tokens": text_tokens, "image_tokens": images}
+
+
+def response_usage(response, text: str, request: dict) -> dict:
+    """Token counts of one call: from the response's usage metadata when present, else estimated.
+
+    Reported prompt tokens exclude the image tokens, so the two add up to the
+    input total either way.
+    """
+    metadata = getattr(response, "usage_metadata", None)
+    prompt_total = getattr(metadata, "prompt_token_count", None) if metadata is not None else None
+    if not prompt_total:
+        return {"prompt_tokens": request["prompt_tokens"], "image_tokens": request["image_tokens"],
+                "output_tokens": _text_tokens(text), "cached_tokens": 0, "estimated": True}
+
+    image_total = request["image_tokens"]
+    for detail in getattr(metadata, "prompt_tokens_details", None) or ():
+        # Newer API versions break the input down by modality
+        if "IMAGE" in str(getattr(detail, "modality", "")):
+            image_total = detail.token_count
+    return {
+        "prompt_tokens": max(0, prompt_total - image_total),
+        "image_tokens": min(image_total, prompt_total),
+        "output_tokens": getattr(metadata, "candidates_token_count", None) or _text_tokens(text),
+        "cached_tokens": getattr(metadata, "cached_content_token_count", None) or 0,
+        "estimated": False,
+    }
+
+
+class UsageStats:
+    """Token and request-byte totals per document type (combined calls count as e.g. "passport+g28")"""
+
+    FIELDS = ("prompt_tokens", "image_tokens", "output_tokens", "cached_tokens", "request_bytes", "image_bytes")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def record(self, doc_type: str, request: dict, usage: dict):
+        with self._lock:
+            totals = self._totals.setdefault(doc_type, dict.fromkeys(("calls", "estimated_calls", *self.FIELDS), 0))
+            totals["calls"] += 1
+            totals["estimated_calls"] += usage["estimated"]
+            for key in self.FIELDS:
+                totals[key] += usage[key] if key in usage else request[key]
+
+    def snapshot(self) -> dict:
+        """Totals plus per-call means for each document type"""
+        with self._lock:
+            result = {}
+            for doc_type, totals in self._totals.items():
+                entry = dict(totals)
+                entry["per_call"] = {key: round(totals[key] / totals["calls"], 1) for key in self.FIELDS}
+                result[doc_type] = entry
+            return result
+
+
+# Shared by every DocumentProcessor in the process
+usage_stats = UsageStats()
+
+
+def record_call(doc_type: Optional[str], contents: list, response, text: str) -> dict:
+    """Account one model call under doc_type; returns the call's usage"""
+    request = measure_request(contents)
+    usage = response_usage(response, text, request)
+    usage_stats.record(doc_type or "unknown", request, usage)
+    return {**request, **usage}
@@ -0,0 +1,154 @@
+"""
+PDF form field module: read G-28 values straight from a fillable PDF's form widgets
+"""
+import logging
+from typing import Optional
+
+# Keys in the same order as the model prompt's schema
+G28_KEYS = (
+    "attorney_name", "attorney_first_name", "attorney_last_name", "firm_name",
+    "attorney_address", "attorney_city", "attorney_state", "attorney_zip",
+    "attorney_phone", "attorney_fax", "attorney_email", "bar_number",
+    "uscis_online_account", "client_name", "client_alien_number", "daytime_phone",
+)
+
+# Output key -> candidate widget names on the official G-28 (edition 09/17/18)
+G28_FIELD_MAP = {
+    "attorney_last_name": ["Pt1Line2a_FamilyName[0]"],
+    "attorney_first_name": ["Pt1Line2b_GivenName[0]"],
+    "firm_name": ["Pt2Line1d_NameofFirmOrOrganization[0]", "Line2b_NameofOrganization[0]"],
+    "attorney_address": ["Line3a_StreetNumber[0]"],
+    "attorney_city": ["Line3c_CityOrTown[0]"],
+    "attorney_state": ["Line3d_State[0]"],
+    "attorney_zip": ["Line3e_ZipCode[0]"],
+    "attorney_phone": ["Line4_DaytimeTelephoneNumber[0]"],
+    "attorney_fax": ["Pt1ItemNumber7_FaxNumber[0]"],
+    "attorney_email": ["Line6_EMail[0]"],
+    "bar_number": ["Pt2Line1b_BarNumber[0]"],
+    "uscis_online_account": ["Pt1Line1_USCISOnlineAcctNumber[0]"],
+    "client_alien_number": ["Pt3Line9_ANumber[0]"],
+    "daytime_phone": ["Line9_DaytimeTelephoneNumber[0]"],
+}
+
+# Unit number appended to the street address when present
+G28_ADDRESS_UNIT_FIELD = "Line3b_AptSteFlrNumber[0]"
+G28_CLIENT_NAME_FIELDS = ("Pt3Line5b_GivenName[0]", "Pt3Line5a_FamilyName[0]")
+
+# Fewer populated mapped fields than this means a flattened or blank form
+MIN_POPULATED_FIELDS = 3
+
+
+def _resolve(obj):
+    """Follow an indirect reference; older pypdf releases hand some entries (e.g. /Annots) back unresolved"""
+    return obj.get_object() if hasattr(obj, "get_object") else obj
+
+
+def _field_name(widget) -> Optional[str]:
+    """Terminal field name of a widget, taken from its parent when the widget is unnamed"""
+    node = widget
+    while node is not None:
+        name = node.get("/T")
+        if name is not None:
+            return str(_resolve(name)).split(".")[-1]
+        parent = node.get("/Parent")
+        node = _resolve(parent) if parent is not None else None
+    return None
+
+
+def _field_value(widget):
+    node = widget
+    while node is not None:
+        if "/V" in node:
+            return _resolve(node["/V"])
+        parent = node.get("/Parent")
+        node = _resolve(parent) if parent is not None else None
+    return None
+
+
+def read_form_fields(source) -> dict:
+    """Read text and choice widget values from every page (path or binary stream).
+
+    Walks the page annotations rather than the AcroForm field tree, which is
+    frequently broken in PDFs re-saved by viewers.
+    """
+    from pypdf import PdfReader
+    logging.getLogger("pypdf").setLevel(logging.ERROR)
+
+    reader = PdfReader(source)
+    values = {}
+    for page in reader.pages:
+        for annot in _resolve(page.get("/Annots")) or []:
+            widget = _resolve(annot)
+            if widget.get("/Subtype") != "/Widget":
+                continue
+            name = _field_name(widget)
+            value = _field_value(widget)
+            if name is None or value is None or name in values:
+                continue
+            if isinstance(value, list):
+                value = value[0] if value else ""
+            if str(value).startswith("/"):
+                # Button states such as /Off or /Y are not text values
+                continue
+            values[name] = str(value).strip()
+    return values
+
+
+def _clean(value: Optional[str]) -> str:
+    return value if value else "N/A"
+
+
+def extract_g28_fields(source) -> Optional[dict]:
+    """Map a fillable G-28's widget values to the extraction schema.
+
+    Returns None when the PDF carries no usable form data (no pypdf, not a
+    fillable form, or too few populated fields), so the caller falls back to
+    the model. Fields present on the form but left blank are reported as "N/A".
+    """
+    try:
+        fields = read_form_fields(source)
+    except ImportError:
+        return None
+    except Exception as e:
+        print(f"Warning: could not read PDF form fields: {e}")
+        return None
+
+    result = {}
+    populated = 0
+    for key, names in G28_FIELD_MAP.items():
+        for name in names:
+            if name in fields:
+                value = fields[name]
+                if value and value != "N/A":
+                    result[key] = value
+                    populated += 1
+                    break
+                result.setdefault(key, _clean(value))
+    if populated < MIN_POPULATED_FIELDS:
+        return None
+
+    unit = fields.get(G28_ADDRESS_UNIT_FIELD)
+    if unit and unit != "N/A" and result.get("attorney_address", "N/A") != "N/A":
+        result["attorney_address"] = f"{result['attorney_address']}, {unit}"
+
+    alien_number = result.get("client_alien_number", "N/A")
+    if alien_number != "N/A" and not alien_number.upper().startswith("A"):
+        # The form prints the "A-" prefix outside the box
+        result["client_alien_number"] = f"A{alien_number}"
+
+    first = result.get("attorney_first_name", "N/A")
+    last = result.get("attorney_last_name", "N/A")
+    if first != "N/A" or last != "N/A":
+        result["attorney_name"] = " ".join(part for part in (first, last) if part != "N/A")
+    elif "attorney_first_name" in result or "attorney_last_name" in result:
+        result["attorney_name"] = "N/A"
+
+    client_parts = [fields.get(name) for name in G28_CLIENT_NAME_FIELDS]
+    client_parts = [part for part in client_parts if part and part != "N/A"]
+    if client_parts:
+        result["client_name"] = " ".join(client_parts)
+    elif any(name in fields for name in G28_CLIENT_NAME_FIELDS):
+        result["client_name"] = "N/A"
+
+    # Keys without any widget on this form edition are left out for the model to fill
+    return {key: result[key] for key in G28_KEYS if key in result}
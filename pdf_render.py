@@ -0,0 +1,227 @@
+"""
+PDF render module: pick the pages that matter and rasterize them in parallel at a per-page DPI
+"""
+import io
+import logging
+import math
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import types
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional
+
+from image_prep import IMAGE_BUDGETS, image_stats, prepare_image
+from metrics import metrics
+
+# Text-layer phrases marking the pages that hold each schema's fields. On the
+# G-28 they pick Part 1-2 (attorney, eligibility) and Part 3 (client) and skip
+# the signature and additional-information pages.
+PAGE_KEYWORDS = {
+    "passport": ("passport", "passeport", "nationality", "date of birth", "p<"),
+    "g28": (
+        "information about attorney", "eligibility information", "information about client",
+        "family name", "bar number", "daytime telephone", "email address", "a-number", "law firm",
+    ),
+}
+
+# Most pages sent to the model per document type
+MAX_PAGES = {"passport": 1, "g28": 2}
+
+# A page with less extractable text than this is treated as scanned
+MIN_TEXT_CHARS = 50
+# Scanned PDFs are triaged from one low-resolution render of every page
+THUMBNAIL_DPI = 20
+# Thumbnails with less ink than this (fraction of full black) are blank pages
+MIN_INK = 0.01
+
+MIN_DPI = 72
+MAX_DPI = 300
+
+# Bumped whenever page selection or rendering changes what the model sees
+RENDER_VERSION = "2"
+
+
+class RenderedPage:
+    """One page rasterized and fitted to the upload budget"""
+
+    def __init__(self, number: int, dpi: int, part: dict, stats: dict, render_seconds: float):
+        self.number = number
+        self.dpi = dpi
+        self.part = part
+        self.stats = stats
+        self.render_seconds = render_seconds
+
+
+def page_dpi(width_points: float, height_points: float, max_pixels: int) -> int:
+    """Resolution at which the page just fills the pixel budget, so nothing is rendered only to be shrunk"""
+    area_inches = (width_points / 72) * (height_points / 72)
+    if area_inches <= 0:
+        return MIN_DPI
+    return int(max(MIN_DPI, min(MAX_DPI, math.sqrt(max_pixels / area_inches))))
+
+
+def _read_pages(data: bytes) -> Optional[list]:
+    """[(text, width, height)] per page from the PDF's text layer, or None if it cannot be read"""
+    from pypdf import PdfReader
+    logging.getLogger("pypdf").setLevel(logging.ERROR)
+    try:
+        reader = PdfReader(io.BytesIO(data))
+        pages = []
+        for page in reader.pages:
+            box = page.mediabox
+            pages.append((page.extract_text() or "", float(box.width), float(box.height)))
+        return pages
+    except Exception as e:
+        print(f"Warning: could not read PDF text layer: {e}")
+        return None
+
+
+def _pick_by_keywords(pages: list, doc_type: str, max_pages: int) -> list:
+    keywords = PAGE_KEYWORDS.get(doc_type, ())
+    scores = []
+    for index, (text, _, _) in enumerate(pages):
+        lower = text.lower()
+        scores.append((sum(1 for keyword in keywords if keyword in lower), index))
+    hits = [entry for entry in scores if entry[0] > 0]
+    if not hits:
+        return list(range(min(max_pages, len(pages))))
+    # Highest scores win, earlier pages break ties; the result is back in document order
+    best = sorted(hits, key=lambda entry: (-entry[0], entry[1]))[:max_pages]
+    return sorted(index for _, index in best)
+
+
+def _pick_by_thumbnails(data: bytes, max_pages: int) -> list:
+    from pdf2image import convert_from_bytes
+    from PIL import ImageStat
+    thumbnails = convert_from_bytes(data, dpi=THUMBNAIL_DPI, grayscale=True)
+    ink = [(1 - ImageStat.Stat(thumb).mean[0] / 255, index) for index, thumb in enumerate(thumbnails)]
+    inked = [entry for entry in ink if entry[0] >= MIN_INK] or ink[:1]
+    best = sorted(inked, key=lambda entry: (-entry[0], entry[1]))[:max_pages]
+    return sorted(index for _, index in best)
+
+
+def select_pages(data: bytes, doc_type: str, max_pixels: int, max_pages: Optional[int] = None) -> list:
+    """Choose (page_number, dpi) pairs to render: text-layer keywords, else ink on low-DPI thumbnails"""
+    max_pages = max_pages or MAX_PAGES.get(doc_type, 1)
+    pages = _read_pages(data)
+    if pages and sum(len(text.strip()) for text, _, _ in pages) >= MIN_TEXT_CHARS * len(pages):
+        indexes = _pick_by_keywords(pages, doc_type, max_pages)
+    else:
+        indexes = _pick_by_thumbnails(data, max_pages)
+
+    selected = []
+    for index in indexes:
+        # Letter size when the page box is unknown (thumbnail path on an unreadable PDF)
+        _, width, height = pages[index] if pages and index < len(pages) else ("", 612, 792)
+        selected.append((index + 1, page_dpi(width, height, max_pixels)))
+    return selected
+
+
+def render_page(data: bytes, page_number: int, dpi: int, doc_type: str, budget: dict,
+                input_bytes: Optional[int]) -> RenderedPage:
+    """Rasterize one page and fit it to the budget; runs inside the worker process"""
+    from pdf2image import convert_from_bytes
+    started = time.perf_counter()
+    images = convert_from_bytes(data, dpi=dpi, first_page=page_number, last_page=page_number)
+    if not images:
+        raise ValueError(f"page {page_number} produced no image")
+    render_seconds = time.perf_counter() - started
+    part, stats = prepare_image(images[0], doc_type, budget, input_bytes)
+    return RenderedPage(page_number, dpi, part, stats, render_seconds)
+
+
+def _warm_worker() -> int:
+    """Load the PDF libraries in a worker process ahead of its first page"""
+    import PIL.Image  # noqa: F401
+    import pdf2image  # noqa: F401
+    import pypdf  # noqa: F401
+    return os.getpid()
+
+
+# Stands in for __main__ while workers are spawned. A spawned worker otherwise
+# re-imports the parent's main script (main.py under "python main.py") and reruns
+# its module-level setup; a module without __file__ or __spec__ gives it nothing to import.
+_WORKER_MAIN = types.ModuleType("__mp_main__")
+
+
+class PageRenderer:
+    """Render selected PDF pages, one page per worker process.
+
+    Each page is a separate pdftoppm run plus decode/resize/JPEG encode, so the
+    pages of a document (and of concurrent requests) render side by side. The
+    pool uses "spawn" so workers never inherit the server's threads or browser
+    handles. With max_workers=0 pages are rendered in the calling thread.
+    """
+
+    def __init__(self, max_workers: int = 0):
+        self.max_workers = max(0, max_workers)
+        self._pool = None
+        self._lock = threading.Lock()
+        self.documents = 0
+        self.pages_rendered = 0
+
+    def _submit(self, fn, *args) -> Future:
+        """Submit to the worker pool; a submission may spawn a worker, so it runs with _WORKER_MAIN as __main__"""
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            main = sys.modules["__main__"]
+            sys.modules["__main__"] = _WORKER_MAIN
+            try:
+                return self._pool.submit(fn, *args)
+            finally:
+                sys.modules["__main__"] = main
+
+    def render(self, data: bytes, doc_type: str, budget: Optional[dict] = None,
+               input_bytes: Optional[int] = None) -> list:
+        """Render the relevant pages of a PDF as budget-fitted JPEG parts, in page order"""
+        budget = budget or IMAGE_BUDGETS[doc_type]
+        try:
+            with metrics.timer("pdf_page_select"):
+                selected = select_pages(data, doc_type, budget["max_pixels"])
+            # The whole file counts as input once, against the first page
+            jobs = [(data, number, dpi, doc_type, budget, input_bytes if position == 0 else None)
+                    for position, (number, dpi) in enumerate(selected)]
+            if self.max_workers:
+                futures = [self._submit(render_page, *job) for job in jobs]
+                pages = [future.result() for future in futures]
+            else:
+                pages = [render_page(*job) for job in jobs]
+        except Exception as e:
+            raise ValueError(f"PDF conversion failed: {e}")
+
+        for page in pages:
+            metrics.observe("pdf_render_page", page.render_seconds)
+            if self.max_workers:
+                # prepare_image recorded these in the worker process
+                image_stats.record(doc_type, page.stats)
+        with self._lock:
+            self.documents += 1
+            self.pages_rendered += len(pages)
+        return pages
+
+    def warm(self) -> dict:
+        """Import the PDF libraries and start every worker process now instead of on the first upload"""
+        _warm_worker()
+        if not self.max_workers:
+            return {"workers": 0}
+        # One task per worker; none is idle yet, so each submission spawns a process
+        futures = [self._submit(_warm_worker) for _ in range(self.max_workers)]
+        return {"workers": len({future.result() for future in futures})}
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "documents": self.documents,
+            "pages_rendered": self.pages_rendered,
+        }
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
@@ -0,0 +1,296 @@
+"""
+Session store module: per-session state (API key, extracted documents) behind pluggable backends
+"""
+import asyncio
+import json
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+SESSION_COOKIE = "session_id"
+
+
+def new_session_id() -> str:
+    return secrets.token_urlsafe(32)
+
+
+class MemorySessionBackend:
+    """In-process sessions with sliding TTL and LRU eviction beyond max_entries.
+
+    Only suitable for a single worker process; use the SQLite or Redis backend
+    when running several uvicorn workers.
+    """
+
+    blocking = False
+
+    def __init__(self, ttl_seconds: float = 24 * 3600, max_entries: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._sessions = OrderedDict()  # session_id -> (touched_at, values)
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def _expired(self, touched_at: float, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - touched_at > self.ttl_seconds
+
+    def _evict(self, now: float):
+        # Entries are kept in touch order, so expired ones sit at the front
+        while self._sessions:
+            session_id, (touched_at, _) = next(iter(self._sessions.items()))
+            if not self._expired(touched_at, now) and len(self._sessions) <= self.max_entries:
+                break
+            del self._sessions[session_id]
+            self.evictions += 1
+
+    def load(self, session_id: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            touched_at, values = entry
+            if self._expired(touched_at, now):
+                del self._sessions[session_id]
+                self.evictions += 1
+                return None
+            self._sessions[session_id] = (now, values)
+            self._sessions.move_to_end(session_id)
+            return dict(values)
+
+    def update(self, session_id: str, changes: dict, removed: set):
+        now = time.time()
+        with self._lock:
+            _, values = self._sessions.get(session_id, (now, {}))
+            values = {**values, **changes}
+            for key in removed:
+                values.pop(key, None)
+            self._sessions[session_id] = (now, values)
+            self._sessions.move_to_end(session_id)
+            self._evict(now)
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "sessions": len(self._sessions), "evictions": self.evictions}
+
+
+class SQLiteSessionBackend:
+    """Sessions in a SQLite file shared by every worker process on the host.
+
+    Each value is its own row, so concurrent requests of one session that touch
+    different keys (e.g. passport and G-28 uploads) do not overwrite each other.
+    """
+
+    blocking = True
+
+    # Expired sessions are swept at most this often
+    PURGE_INTERVAL = 60
+
+    def __init__(self, path: str = "sessions.db", ttl_seconds: float = 24 * 3600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, expires_at REAL NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_values (session_id TEXT NOT NULL, key TEXT NOT NULL, "
+            "value TEXT NOT NULL, PRIMARY KEY (session_id, key))"
+        )
+
+    def _expires_at(self, now: float) -> float:
+        return now + self.ttl_seconds if self.ttl_seconds > 0 else float("inf")
+
+    def _purge(self, now: float):
+        if now - self._last_purge < self.PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        self._conn.execute(
+            "DELETE FROM session_values WHERE session_id IN (SELECT session_id FROM sessions WHERE expires_at < ?)", (now,)
+        )
+        self._conn.execute("DELETE FROM sessions WHERE expires_at < ?", (now,))
+
+    def load(self, session_id: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT expires_at FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None or row[0] < now:
+                return None
+            self._conn.execute("UPDATE sessions SET expires_at = ? WHERE session_id = ?", (self._expires_at(now), session_id))
+            rows = self._conn.execute("SELECT key, value FROM session_values WHERE session_id = ?", (session_id,)).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def update(self, session_id: str, changes: dict, removed: set):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO sessions (session_id, expires_at) VALUES (?, ?) "
+                    "ON CONFLICT(session_id) DO UPDATE SET expires_at = excluded.expires_at",
+                    (session_id, self._expires_at(now)),
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO session_values (session_id, key, value) VALUES (?, ?, ?)",
+                    [(session_id, key, json.dumps(value)) for key, value in changes.items()],
+                )
+                self._conn.executemany(
+                    "DELETE FROM session_values WHERE session_id = ? AND key = ?",
+                    [(session_id, key) for key in removed],
+                )
+                self._purge(now)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM session_values WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM sessions WHERE expires_at >= ?", (time.time(),)).fetchone()[0]
+        return {"backend": "sqlite", "path": self.path, "sessions": count}
+
+
+class RedisSessionBackend:
+    """Sessions as Redis hashes with a sliding expiry, shared across hosts.
+
+    Any Redis-protocol server works. Pass client= to use a local stand-in
+    (e.g. fakeredis) instead of connecting to url.
+    """
+
+    blocking = True
+
+    def __init__(self, url: str = "redis://localhost:6379/0", ttl_seconds: float = 24 * 3600,
+                 prefix: str = "session:", client=None):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError("SESSION_BACKEND=redis requires the 'redis' package (pip install redis)")
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.ttl_seconds = int(ttl_seconds)
+        self.prefix = prefix
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.prefix}{session_id}"
+
+    def load(self, session_id: str) -> Optional[dict]:
+        key = self._key(session_id)
+        pipe = self.client.pipeline()
+        pipe.hgetall(key)
+        if self.ttl_seconds > 0:
+            pipe.expire(key, self.ttl_seconds)
+        values = pipe.execute()[0]
+        if not values:
+            return None
+        return {_text(field): json.loads(value) for field, value in values.items()}
+
+    def update(self, session_id: str, changes: dict, removed: set):
+        key = self._key(session_id)
+        pipe = self.client.pipeline()
+        if changes:
+            pipe.hset(key, mapping={field: json.dumps(value) for field, value in changes.items()})
+        if removed:
+            pipe.hdel(key, *removed)
+        if self.ttl_seconds > 0:
+            pipe.expire(key, self.ttl_seconds)
+        pipe.execute()
+
+    def delete(self, session_id: str):
+        self.client.delete(self._key(session_id))
+
+    def stats(self) -> dict:
+        return {"backend": "redis"}
+
+
+def _text(value) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def create_backend(kind: str, ttl_seconds: float, max_entries: int = 1000,
+                   sqlite_path: str = "sessions.db", redis_url: str = "redis://localhost:6379/0"):
+    """Build the session backend named by kind: memory, sqlite or redis"""
+    if kind == "memory":
+        return MemorySessionBackend(ttl_seconds=ttl_seconds, max_entries=max_entries)
+    if kind == "sqlite":
+        return SQLiteSessionBackend(path=sqlite_path, ttl_seconds=ttl_seconds)
+    if kind == "redis":
+        return RedisSessionBackend(url=redis_url, ttl_seconds=ttl_seconds)
+    raise ValueError(f"Unknown session backend: {kind}")
+
+
+class Session:
+    """One client's state; changes are recorded per key and written back after the request"""
+
+    def __init__(self, session_id: str, values: dict, is_new: bool):
+        self.id = session_id
+        self.is_new = is_new
+        self._values = values
+        self._changes = {}
+        self._removed = set()
+
+    def get(self, key: str, default=None):
+        return self._values.get(key, default)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._values
+
+    def set(self, key: str, value):
+        self._values[key] = value
+        self._changes[key] = value
+        self._removed.discard(key)
+
+    def remove(self, key: str):
+        self._values.pop(key, None)
+        self._changes.pop(key, None)
+        self._removed.add(key)
+
+    @property
+    def modified(self) -> bool:
+        return bool(self._changes or self._removed)
+
+
+class SessionStore:
+    """Load and save sessions, keeping blocking backends off the event loop"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def _call(self, fn, *args):
+        if self.backend.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def load(self, session_id: Optional[str]) -> Session:
+        """Return the stored session, or a fresh one for missing/expired ids"""
+        if session_id:
+            values = await self._call(self.backend.load, session_id)
+            if values is not None:
+                return Session(session_id, values, is_new=False)
+        # Never adopt an unknown client-supplied id
+        return Session(new_session_id(), {}, is_new=True)
+
+    async def save(self, session: Session):
+        """Write back only the keys this request changed"""
+        if session.modified:
+            await self._call(self.backend.update, session.id, dict(session._changes), set(session._removed))
+            session._changes.clear()
+            session._removed.clear()
+
+    async def update(self, session_id: str, changes: dict):
+        """Write keys to a session outside of a request (e.g. from a background job)"""
+        await self._call(self.backend.update, session_id, dict(changes), set())
+
+    def stats(self) -> dict:
+        return self.backend.stats()
@@ -0,0 +1,271 @@
+"""
+Storage module: per-session and per-job file directories with TTL and disk-quota eviction
+"""
+import asyncio
+import hashlib
+import heapq
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+# Files the janitor never touches (kept so empty directories stay in git)
+KEEP_FILES = {".gitkeep"}
+
+
+def _dir_name(identifier: str) -> str:
+    """Directory name for a session or job id; session ids are hashed so a listing does not expose live cookies"""
+    return hashlib.sha256(identifier.encode("utf-8")).hexdigest()[:32]
+
+
+def write_file(path: Path, data: bytes, attempts: int = 3):
+    """Write a file into a storage directory, recreating the directory if the janitor removed it.
+
+    The janitor deletes directories its evictions leave empty, which can happen
+    between a writer creating the directory and opening the file.
+    """
+    path = Path(path)
+    for attempt in range(attempts):
+        try:
+            path.write_bytes(data)
+            return
+        except FileNotFoundError:
+            if attempt == attempts - 1:
+                raise
+            path.parent.mkdir(parents=True, exist_ok=True)
+
+
+class UploadStorage:
+    """Files written on behalf of sessions and jobs, kept under a TTL and a disk quota.
+
+    Layout: <root>/sessions/<session>/ for persisted uploads and
+    <root>/sessions/<session>/jobs/<job_id>/ for fill artifacts, so clearing a
+    session removes only its own files. Every file written through track() is
+    indexed with its size and mtime, so usage is known without listing the
+    tree. A janitor sweep evicts expired files and then the oldest files
+    until the total is under the quota. It also walks the tree a few entries
+    at a time to adopt files it did not write (older layouts, restarts) and to
+    forget files removed behind its back, so a sweep costs the same no matter
+    how many files are stored.
+    """
+
+    def __init__(self, root: str = "uploads", ttl_seconds: float = 24 * 3600, max_bytes: int = 500 * 1024 * 1024,
+                 sweep_interval: float = 60, scan_batch: int = 500):
+        self.root = Path(root)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self.scan_batch = max(1, scan_batch)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._files = {}  # path -> (mtime, size)
+        self._by_age = []  # heap of (mtime, path); stale entries are skipped when popped
+        self._bytes = 0
+        self._scan = None  # resumable walk over the tree
+        self._seen = set()  # paths met by the current walk
+        self._scan_started_at = 0.0
+        self._janitor = None
+
+        self.evicted_expired = 0
+        self.evicted_quota = 0
+        self.evicted_bytes = 0
+        self.sessions_cleared = 0
+        self.scans_completed = 0
+        self.last_sweep_seconds = 0.0
+
+    def session_dir(self, session_id: str, create: bool = True) -> Path:
+        """Directory holding one session's persisted uploads"""
+        path = self.root / "sessions" / _dir_name(session_id)
+        if create:
+            path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def job_dir(self, session_id: str, job_id: str, create: bool = True) -> Path:
+        """Directory holding one job's artifacts, inside its session's directory"""
+        if not job_id.isalnum():
+            raise ValueError("Invalid job id")
+        path = self.session_dir(session_id, create=False) / "jobs" / job_id
+        if create:
+            path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def _forget(self, path: str):
+        _, size = self._files.pop(path, (0, 0))
+        self._bytes -= size
+
+    def _add(self, path: str, mtime: float, size: int):
+        self._forget(path)
+        self._files[path] = (mtime, size)
+        self._bytes += size
+        heapq.heappush(self._by_age, (mtime, path))
+
+    def track(self, path, touch: bool = False):
+        """Index a file written under the root; touch refreshes its age (e.g. a re-upload of the same file)"""
+        path = str(path)
+        try:
+            if touch:
+                os.utime(path)
+            stat = os.stat(path)
+        except OSError:
+            return
+        with self._lock:
+            self._add(path, stat.st_mtime, stat.st_size)
+            over_quota = self._bytes > self.max_bytes
+        if over_quota:
+            self._evict()
+
+    def _remove(self, path: str) -> int:
+        """Delete one indexed file and any directories it leaves empty; returns the bytes freed.
+
+        Writers may be about to use a directory removed here; they recreate it (see write_file).
+        """
+        _, size = self._files.get(path, (0, 0))
+        self._forget(path)
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Warning: could not remove {path}: {e}")
+            return 0
+        parent = Path(path).parent
+        while parent != self.root and self.root in parent.parents:
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+            parent = parent.parent
+        return size
+
+    def _evict(self) -> int:
+        """Drop expired files, then the oldest ones until under the quota"""
+        cutoff = time.time() - self.ttl_seconds if self.ttl_seconds > 0 else None
+        evicted = 0
+        with self._lock:
+            while self._by_age:
+                mtime, path = self._by_age[0]
+                if self._files.get(path, (None,))[0] != mtime:
+                    heapq.heappop(self._by_age)  # replaced or removed since it was pushed
+                    continue
+                expired = cutoff is not None and mtime < cutoff
+                if not expired and self._bytes <= self.max_bytes:
+                    break
+                heapq.heappop(self._by_age)
+                self.evicted_bytes += self._remove(path)
+                if expired:
+                    self.evicted_expired += 1
+                else:
+                    self.evicted_quota += 1
+                evicted += 1
+        return evicted
+
+    def _walk(self):
+        """Yield every file under the root, depth first"""
+        pending = [str(self.root)]
+        while pending:
+            directory = pending.pop()
+            try:
+                entries = os.scandir(directory)
+            except OSError:
+                continue
+            # Entries are read lazily, so even a huge flat directory is consumed a batch at a time
+            with entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False) and entry.name not in KEEP_FILES:
+                        yield entry
+
+    def _scan_step(self):
+        """Advance the background walk by up to scan_batch files"""
+        if self._scan is None:
+            self._scan = self._walk()
+            self._seen = set()
+            self._scan_started_at = time.time()
+
+        for _ in range(self.scan_batch):
+            entry = next(self._scan, None)
+            if entry is None:
+                break
+            try:
+                stat = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            with self._lock:
+                self._seen.add(entry.path)
+                if self._files.get(entry.path) != (stat.st_mtime, stat.st_size):
+                    self._add(entry.path, stat.st_mtime, stat.st_size)
+        if entry is not None:
+            return
+
+        # Walk finished: anything indexed before it began and not seen was deleted externally
+        with self._lock:
+            for path, (mtime, _) in list(self._files.items()):
+                if path not in self._seen and mtime < self._scan_started_at:
+                    self._forget(path)
+        self._scan = None
+        self._seen = set()
+        self.scans_completed += 1
+
+    def sweep(self) -> int:
+        """One janitor pass: advance the walk, then evict; returns the number of files removed"""
+        started = time.perf_counter()
+        self._scan_step()
+        evicted = self._evict()
+        self.last_sweep_seconds = time.perf_counter() - started
+        return evicted
+
+    def clear_session(self, session_id: str):
+        """Delete one session's directory (uploads and job artifacts) and nothing else"""
+        directory = self.session_dir(session_id, create=False)
+        prefix = str(directory) + os.sep
+        with self._lock:
+            for path in [path for path in self._files if path.startswith(prefix)]:
+                self._forget(path)
+        shutil.rmtree(directory, ignore_errors=True)
+        self.sessions_cleared += 1
+
+    async def _run_janitor(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                print(f"Warning: storage sweep failed: {e}")
+
+    def start_janitor(self):
+        """Sweep every sweep_interval seconds on the running event loop"""
+        if self._janitor is None:
+            self._janitor = asyncio.get_running_loop().create_task(self._run_janitor())
+
+    async def stop_janitor(self):
+        if self._janitor is not None:
+            self._janitor.cancel()
+            try:
+                await self._janitor
+            except asyncio.CancelledError:
+                pass
+            self._janitor = None
+
+    def stats(self) -> dict:
+        """Disk usage and eviction counters"""
+        with self._lock:
+            files = len(self._files)
+            used = self._bytes
+        return {
+            "root": str(self.root),
+            "files": files,
+            "bytes": used,
+            "max_bytes": self.max_bytes,
+            "usage_ratio": round(used / self.max_bytes, 4) if self.max_bytes else None,
+            "ttl_seconds": self.ttl_seconds,
+            "evicted_expired": self.evicted_expired,
+            "evicted_quota": self.evicted_quota,
+            "evicted_bytes": self.evicted_bytes,
+            "sessions_cleared": self.sessions_cleared,
+            "scans_completed": self.scans_completed,
+            "scan_in_progress": self._scan is not None,
+            "last_sweep_ms": round(self.last_sweep_seconds * 1000, 2),
+        }
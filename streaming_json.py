@@ -0,0 +1,146 @@
+"""
+Streaming JSON module: emit the fields of a JSON object while its text is still arriving
+"""
+import json
+
+WHITESPACE = " \t\r\n"
+# Characters that end a bare number/true/false/null token
+SCALAR_END = ",}] \t\r\n"
+
+
+class _Frame:
+    """An open object or array and where the parser is inside it"""
+
+    def __init__(self, kind: str, start: int, key):
+        self.kind = kind  # "object" or "array"
+        self.start = start
+        self.key = key  # member key this container is the value of (None for the root / array items)
+        self.expect = "key" if kind == "object" else "value"
+        self.pending_key = None
+
+
+class IncrementalJsonParser:
+    """Feed model output chunk by chunk; get back (path, value) for each object member once it is complete.
+
+    Text before the first "{" (a ```json fence, a preamble) is skipped, and so
+    is anything after the root object closes. Members of nested objects are
+    reported with their full key path, e.g. ("passport", "last_name"); arrays
+    are reported whole when they close. The parser is lenient by design: on
+    malformed input it stops emitting, and the caller's full parse of the
+    complete text remains the source of truth.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._stack = []
+        self._token_start = None  # start of the string or scalar being read
+        self._in_string = False
+        self._escaped = False
+        self.done = False
+        self.failed = False
+
+    def feed(self, chunk: str) -> list:
+        """Consume the next piece of text; returns the members completed by it"""
+        if self.done or self.failed:
+            return []
+        self._text += chunk
+        completed = []
+        try:
+            self._scan(completed)
+        except ValueError:
+            self.failed = True
+        return completed
+
+    def _path(self, key) -> tuple:
+        return tuple(frame.key for frame in self._stack[1:]) + (key,)
+
+    def _in_array(self) -> bool:
+        return any(frame.kind == "array" for frame in self._stack)
+
+    def _value_done(self, start: int, end: int, completed: list):
+        """A string, scalar or container value spanning text[start:end] has finished"""
+        frame = self._stack[-1] if self._stack else None
+        if frame is None:
+            return
+        if frame.kind == "object":
+            if frame.expect == "key":
+                frame.pending_key = json.loads(self._text[start:end])
+                frame.expect = "colon"
+                return
+            key = frame.pending_key
+            frame.expect = "comma"
+            if not self._in_array():
+                completed.append((self._path(key), json.loads(self._text[start:end])))
+        else:
+            frame.expect = "comma"
+
+    def _scan(self, completed: list):
+        text = self._text
+        while self._pos < len(text):
+            i = self._pos
+            char = text[i]
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    start, self._token_start = self._token_start, None
+                    self._value_done(start, i + 1, completed)
+                self._pos += 1
+                continue
+
+            if self._token_start is not None:
+                # Inside a bare scalar; it ends at a delimiter, which is then handled normally
+                if char not in SCALAR_END:
+                    self._pos += 1
+                    continue
+                start, self._token_start = self._token_start, None
+                self._value_done(start, i, completed)
+                continue
+
+            if not self._stack:
+                if char == "{":
+                    self._stack.append(_Frame("object", i, None))
+                self._pos += 1
+                continue
+
+            frame = self._stack[-1]
+            self._pos += 1
+            if char in WHITESPACE:
+                continue
+            if frame.kind == "object" and frame.expect == "colon":
+                if char != ":":
+                    raise ValueError(f"expected ':' at {i}")
+                frame.expect = "value"
+            elif char == ",":
+                if frame.expect != "comma":
+                    raise ValueError(f"unexpected ',' at {i}")
+                frame.expect = "key" if frame.kind == "object" else "value"
+            elif char in "}]":
+                if (char == "}") != (frame.kind == "object"):
+                    raise ValueError(f"mismatched '{char}' at {i}")
+                self._stack.pop()
+                if not self._stack:
+                    self.done = True
+                    return
+                if frame.kind == "array":
+                    self._value_done(frame.start, i + 1, completed)
+                else:
+                    # Members were already reported one by one
+                    self._stack[-1].expect = "comma"
+            elif char == '"':
+                if frame.expect not in ("key", "value"):
+                    raise ValueError(f"unexpected string at {i}")
+                self._in_string = True
+                self._token_start = i
+            elif frame.expect != "value":
+                raise ValueError(f"unexpected {char!r} at {i}")
+            elif char in "{[":
+                key = frame.pending_key if frame.kind == "object" else None
+                self._stack.append(_Frame("object" if char == "{" else "array", i, key))
+            else:
+                self._token_start = i
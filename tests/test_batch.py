@@ -0,0 +1,95 @@
+import asyncio
+import json
+
+from batch import BatchRunner, completed_case_ids, discover_cases, load_manifest, parse_args, run_batch
+
+
+def touch(path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"")
+    return str(path)
+
+
+def test_subdirectory_per_case(tmp_path):
+    passport = touch(tmp_path / "smith" / "Passport scan.jpg")
+    g28 = touch(tmp_path / "smith" / "G-28.pdf")
+    touch(tmp_path / "smith" / "notes.txt")
+
+    assert discover_cases(str(tmp_path)) == [{"case_id": "smith", "files": {"passport": passport, "g28": g28}}]
+
+
+def test_flat_files_named_by_case(tmp_path):
+    passport = touch(tmp_path / "smith_passport.jpg")
+    g28 = touch(tmp_path / "smith_g28.pdf")
+    other = touch(tmp_path / "jones-G28.png")
+
+    assert discover_cases(str(tmp_path)) == [
+        {"case_id": "jones", "files": {"g28": other}},
+        {"case_id": "smith", "files": {"g28": g28, "passport": passport}},
+    ]
+
+
+def test_one_case_is_never_split_by_naming(tmp_path):
+    # Document type first, last, or as a subdirectory: all the same case id
+    passport = touch(tmp_path / "passport_smith.jpg")
+    g28 = touch(tmp_path / "smith_g28.pdf")
+    assert discover_cases(str(tmp_path)) == [{"case_id": "smith", "files": {"passport": passport, "g28": g28}}]
+
+    subdir_g28 = touch(tmp_path / "lee" / "g28.pdf")
+    lee_passport = touch(tmp_path / "lee_passport.jpg")
+    cases = {case["case_id"]: case["files"] for case in discover_cases(str(tmp_path))}
+    assert cases["lee"] == {"g28": subdir_g28, "passport": lee_passport}
+
+
+def test_csv_manifest_resolves_relative_paths(tmp_path):
+    manifest = tmp_path / "cases.csv"
+    manifest.write_text("case_id,passport,g28\nc1,docs/p1.jpg,/abs/g1.pdf\nc2,,docs/g2.pdf\n,,\n")
+
+    assert load_manifest(str(manifest)) == [
+        {"case_id": "c1", "files": {"passport": str(tmp_path / "docs/p1.jpg"), "g28": "/abs/g1.pdf"}},
+        {"case_id": "c2", "files": {"g28": str(tmp_path / "docs/g2.pdf")}},
+    ]
+
+
+def test_jsonl_manifest_numbers_cases_without_an_id(tmp_path):
+    manifest = tmp_path / "cases.jsonl"
+    manifest.write_text(json.dumps({"passport": "p.jpg", "g28": "g.pdf"}) + "\n\n"
+                        + json.dumps({"case_id": "x", "passport": "q.jpg"}) + "\n")
+
+    assert load_manifest(str(manifest)) == [
+        {"case_id": "1", "files": {"passport": str(tmp_path / "p.jpg"), "g28": str(tmp_path / "g.pdf")}},
+        {"case_id": "x", "files": {"passport": str(tmp_path / "q.jpg")}},
+    ]
+
+
+class FakeProcessor:
+    def __init__(self):
+        self.cases = []
+
+    async def extract_documents(self, files):
+        self.cases.append(files)
+        return {doc_type: {"source": path} for doc_type, path in files.items()}
+
+
+def test_resumed_run_skips_cases_already_ok(tmp_path):
+    for case_id in ("a", "b", "c"):
+        touch(tmp_path / "cases" / f"{case_id}_passport.jpg")
+    output = tmp_path / "results.jsonl"
+    output.write_text(json.dumps({"case_id": "a", "status": "ok"}) + "\n"
+                      + json.dumps({"case_id": "b", "status": "error"}) + "\n"
+                      + '{"case_id": "c", "sta')
+
+    done = completed_case_ids(str(output))
+    assert done == {"a"}
+
+    pending = [case for case in discover_cases(str(tmp_path / "cases")) if case["case_id"] not in done]
+    processor = FakeProcessor()
+    asyncio.run(BatchRunner(processor, str(output)).run(pending))
+    assert [files["passport"].rsplit("/", 1)[1] for files in processor.cases] == ["b_passport.jpg", "c_passport.jpg"]
+    assert completed_case_ids(str(output)) == {"a", "b", "c"}
+
+    # Every case is done now, so a restart has nothing to do
+    args = parse_args(["--input", str(tmp_path / "cases"), "--output", str(output), "--api-key", "unused"])
+    before = output.read_text()
+    assert asyncio.run(run_batch(args)) == 0
+    assert output.read_text() == before
@@ -0,0 +1,63 @@
+import asyncio
+import threading
+
+import pytest
+
+from concurrency import BoundedExecutor, OverloadedError
+
+
+def test_cancelled_call_counts_until_its_thread_finishes():
+    executor = BoundedExecutor(max_concurrent=1, max_queue=0, name="test")
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocking():
+        started.set()
+        release.wait(2)
+        return "done"
+
+    async def scenario():
+        call = asyncio.ensure_future(executor.run(blocking))
+        await asyncio.to_thread(started.wait, 2)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+
+        # The caller is gone but the worker is still busy, so there is no capacity
+        with pytest.raises(OverloadedError):
+            await executor.run(lambda: "extra")
+        assert executor.stats()["running"] == 1
+
+        release.set()
+        await asyncio.sleep(0.05)
+        assert await executor.run(lambda: "next") == "next"
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+        executor.shutdown()
+    assert executor.stats()["rejected"] == 1
+    assert executor.stats()["running"] == 0
+
+
+def test_cancelled_queued_call_frees_its_slot():
+    executor = BoundedExecutor(max_concurrent=1, max_queue=1, name="test")
+    release = threading.Event()
+
+    async def scenario():
+        running = asyncio.ensure_future(executor.run(release.wait, 2))
+        queued = asyncio.ensure_future(executor.run(lambda: "queued"))
+        await asyncio.sleep(0.05)
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        assert executor.stats()["queued"] == 0
+        release.set()
+        assert await running is True
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+        executor.shutdown()
@@ -0,0 +1,123 @@
+import asyncio
+import json
+import shutil
+from pathlib import Path
+
+from PIL import Image
+
+from benchmarks.stub_model import StubGeminiClient, StubModel
+from document_processor import DocumentProcessor
+from extraction_cache import ExtractionCache
+from image_prep import prepare_image
+from pdf_render import RenderedPage
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def make_processor(cache: ExtractionCache) -> tuple:
+    stub = StubModel(latency_ms=0, jitter_ms=0)
+    processor = DocumentProcessor("stub-key", cache=cache, client=StubGeminiClient(stub), refine=False)
+    return processor, stub
+
+
+def test_combined_extraction_isolates_unreadable_document(tmp_path):
+    passport = tmp_path / "passport.jpg"
+    shutil.copy(REPO_ROOT / "Chinese_passport_example.jpg", passport)
+    broken_g28 = tmp_path / "g28.jpg"
+    broken_g28.write_bytes(b"not an image")
+    cache = ExtractionCache()
+    processor, stub = make_processor(cache)
+
+    results = asyncio.run(processor.extract_documents({"passport": str(passport), "g28": str(broken_g28)}))
+
+    assert "error" not in results["passport"]
+    assert results["passport"]["last_name"] != "N/A"
+    assert "File processing failed" in results["g28"]["error"]
+
+    # A later upload of the same passport is served from the cache, not as an error
+    calls = stub.calls
+    again = asyncio.run(processor.extract_passport_info(str(passport)))
+    assert again == results["passport"]
+    assert stub.calls == calls
+
+
+def test_error_results_are_never_cached(tmp_path):
+    cache = ExtractionCache(disk_dir=str(tmp_path))
+    asyncio.run(cache.put("key", {"error": "File processing failed: broken"}))
+
+    assert asyncio.run(cache.get("key")) is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def copy_samples(tmp_path) -> dict:
+    files = {}
+    for doc_type in ("passport", "g28"):
+        # The stub answers from recordings, so any readable image stands in for either document
+        files[doc_type] = str(tmp_path / f"{doc_type}.jpg")
+        shutil.copy(REPO_ROOT / "Chinese_passport_example.jpg", files[doc_type])
+    return files
+
+
+def test_identical_concurrent_combined_uploads_share_one_call(tmp_path):
+    files = copy_samples(tmp_path)
+    cache = ExtractionCache()
+    stub = StubModel(latency_ms=50, jitter_ms=0)
+    processor = DocumentProcessor("stub-key", cache=cache, client=StubGeminiClient(stub), refine=False)
+
+    async def scenario():
+        return await asyncio.gather(processor.extract_documents(files), processor.extract_documents(files))
+
+    first, second = asyncio.run(scenario())
+
+    assert first == second
+    assert "error" not in first["passport"] and "error" not in first["g28"]
+    assert stub.calls == 1
+    assert cache.stats()["coalesced"] == 1
+
+
+class UnparseableCombinedStub(StubModel):
+    """Answers the combined prompt with a response that does not match the merged schema"""
+
+    def _answer(self, contents: list) -> str:
+        if contents[0].startswith("Please analyze the following documents"):
+            return json.dumps({"passport": json.loads(super()._answer(contents))["passport"], "g28": "unreadable"})
+        return super()._answer(contents)
+
+
+def test_fallback_calls_do_not_stream_fields_twice(tmp_path):
+    files = copy_samples(tmp_path)
+    stub = UnparseableCombinedStub(latency_ms=0, jitter_ms=0)
+    processor = DocumentProcessor("stub-key", cache=ExtractionCache(), client=StubGeminiClient(stub), refine=False)
+    streamed = []
+
+    results = asyncio.run(processor.extract_documents(
+        files, on_field=lambda doc_type, key, value: streamed.append((doc_type, key))))
+
+    # One combined call, then a call of its own for each document
+    assert stub.calls == 3
+    assert "error" not in results["passport"] and "error" not in results["g28"]
+    assert len(streamed) == len(set(streamed))
+    assert {doc_type for doc_type, _ in streamed} == {"passport", "g28"}
+
+
+class ImageRenderer:
+    """Renders every PDF as the sample passport image, so no poppler install is needed"""
+
+    def render(self, data: bytes, doc_type: str, budget: dict = None, input_bytes: int = None) -> list:
+        part, stats = prepare_image(str(REPO_ROOT / "Chinese_passport_example.jpg"), doc_type, budget)
+        return [RenderedPage(1, 150, part, stats, 0.0)]
+
+
+def test_passport_with_scanned_g28_pdf_shares_one_call(tmp_path):
+    passport = tmp_path / "passport.jpg"
+    shutil.copy(REPO_ROOT / "Chinese_passport_example.jpg", passport)
+    # A PDF without an AcroForm, like a scanned or flattened G-28
+    scanned_g28 = tmp_path / "g28.pdf"
+    Image.new("RGB", (612, 792), "white").save(scanned_g28, format="PDF")
+    stub = StubModel(latency_ms=0, jitter_ms=0)
+    processor = DocumentProcessor("stub-key", client=StubGeminiClient(stub), refine=False, renderer=ImageRenderer())
+
+    results = asyncio.run(processor.extract_documents({"passport": str(passport), "g28": str(scanned_g28)}))
+
+    assert stub.calls == 1
+    assert "error" not in results["passport"] and "error" not in results["g28"]
@@ -0,0 +1,135 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import driver_pool
+from driver_pool import DriverPool
+from form_filler import FormFiller
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.window_handles = ["main"]
+        self.switch_to = self
+        self.quit_called = False
+
+    def execute_script(self, script):
+        return 1
+
+    def window(self, handle):
+        pass
+
+    def delete_all_cookies(self):
+        pass
+
+    def get(self, url):
+        pass
+
+    def quit(self):
+        self.quit_called = True
+
+
+@pytest.fixture
+def browsers(monkeypatch):
+    launched = []
+
+    def launch(driver_path):
+        launched.append(FakeBrowser())
+        return launched[-1]
+
+    monkeypatch.setattr(driver_pool, "resolve_driver_path", lambda: None)
+    monkeypatch.setattr(driver_pool, "launch_driver", launch)
+    return launched
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+
+def test_browser_acquired_after_cancellation_is_returned_to_the_pool(browsers):
+    pool = DriverPool(size=1, max_memory_growth_mb=0, acquire_timeout=5)
+    held = pool.acquire()
+    filler = FormFiller(driver_pool=pool)
+
+    async def scenario():
+        fill = asyncio.ensure_future(filler.fill_form({}, {}))
+        await asyncio.sleep(0.05)
+        fill.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await fill
+        # The abandoned acquire thread picks this browser up once it is free
+        await asyncio.to_thread(pool.release, held)
+        await asyncio.to_thread(wait_for, lambda: pool.stats()["idle"] == 1)
+
+    asyncio.run(scenario())
+    assert pool.stats()["live"] == 1
+    assert pool.acquire(timeout=0.1).driver is browsers[0]
+
+
+def test_browser_launched_after_shutdown_is_quit(browsers, monkeypatch):
+    launching = threading.Event()
+    proceed = threading.Event()
+    launch = driver_pool.launch_driver
+
+    def slow_launch(driver_path):
+        launching.set()
+        proceed.wait(2)
+        return launch(driver_path)
+
+    monkeypatch.setattr(driver_pool, "launch_driver", slow_launch)
+    pool = DriverPool(size=1)
+    warmup = threading.Thread(target=pool.start)
+    warmup.start()
+    assert launching.wait(2)
+
+    pool.shutdown()
+    proceed.set()
+    warmup.join(2)
+
+    assert browsers[0].quit_called
+    assert pool.stats()["idle"] == 0
+    assert pool.stats()["live"] == 0
+
+
+def test_acquire_after_shutdown_launches_nothing(browsers):
+    pool = DriverPool(size=2)
+    pool.start()
+    pool.shutdown()
+
+    with pytest.raises(RuntimeError, match="shut down"):
+        pool.acquire(timeout=0.1)
+    assert len(browsers) == 2
+    assert all(browser.quit_called for browser in browsers)
+    assert pool.stats()["live"] == 0
+
+
+def test_pool_lock_is_free_while_the_driver_binary_resolves(browsers, monkeypatch):
+    resolving = threading.Event()
+    release = threading.Event()
+
+    def slow_resolve():
+        resolving.set()
+        release.wait(5)
+        return "/opt/chromedriver"
+
+    monkeypatch.setattr(driver_pool, "resolve_driver_path", slow_resolve)
+    pool = DriverPool(size=1, max_memory_growth_mb=0)
+    starter = threading.Thread(target=pool.start)
+    starter.start()
+    assert resolving.wait(2)
+
+    # Shutting down needs the pool lock, which the resolve must not hold
+    stopper = threading.Thread(target=pool.shutdown)
+    stopper.start()
+    stopper.join(1)
+    assert not stopper.is_alive()
+
+    release.set()
+    starter.join(2)
+    assert pool.driver_path == "/opt/chromedriver"
+    assert browsers == []
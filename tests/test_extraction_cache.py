@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+from extraction_cache import ExtractionCache
+
+
+def test_cancelled_waiter_does_not_cancel_coalesced_computation():
+    async def scenario():
+        cache = ExtractionCache()
+        runs = []
+
+        async def compute():
+            runs.append(1)
+            await asyncio.sleep(0.05)
+            return {"last_name": "DOE"}
+
+        first = asyncio.ensure_future(cache.get_or_compute("key", compute))
+        second = asyncio.ensure_future(cache.get_or_compute("key", compute))
+        await asyncio.sleep(0.01)
+        first.cancel()
+
+        assert await second == {"last_name": "DOE"}
+        assert first.cancelled()
+        assert len(runs) == 1
+        assert await cache.get("key") == {"last_name": "DOE"}
+        assert cache.stats()["coalesced"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_computation_is_cancelled_when_every_waiter_leaves():
+    async def scenario():
+        cache = ExtractionCache()
+        cancelled = asyncio.Event()
+
+        async def compute():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return {}
+
+        waiters = [asyncio.ensure_future(cache.get_or_compute("key", compute)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.wait_for(cancelled.wait(), 1)
+        await asyncio.sleep(0)
+
+        assert await cache.get("key") is None
+        assert not cache._inflight
+
+    asyncio.run(scenario())
+
+
+def test_disk_tier_io_runs_off_the_event_loop(tmp_path, monkeypatch):
+    threads = []
+    real_to_thread = asyncio.to_thread
+
+    async def to_thread(func, *args):
+        threads.append(func.__name__)
+        return await real_to_thread(func, *args)
+
+    monkeypatch.setattr(asyncio, "to_thread", to_thread)
+    cache = ExtractionCache(disk_dir=str(tmp_path), disk_max_bytes=30)
+    asyncio.run(cache.put("old", {"last_name": "DOE"}))
+    asyncio.run(cache.put("new", {"last_name": "ROE"}))
+
+    # The second write pushes the tier over budget, so the older file is evicted
+    assert threads == ["_write_json", "_write_json", "_unlink_all"]
+    assert [path.name for path in tmp_path.iterdir()] == ["new.json"]
+
+    reopened = ExtractionCache(disk_dir=str(tmp_path))
+    threads.clear()
+    assert asyncio.run(reopened.get("new")) == {"last_name": "ROE"}
+    assert asyncio.run(reopened.get("new")) == {"last_name": "ROE"}
+    asyncio.run(reopened.clear())
+
+    # One disk read (the second get is a memory hit), then the clear's deletions
+    assert threads == ["_read_json", "_unlink_all"]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_caller_arriving_while_abandoned_computation_unwinds_starts_fresh():
+    async def scenario():
+        cache = ExtractionCache()
+        runs = []
+
+        async def compute():
+            runs.append(1)
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                # Cleanup that takes a few loop iterations, like closing a stream
+                await asyncio.sleep(0.02)
+                raise
+            return {"last_name": "DOE"}
+
+        async def quick():
+            runs.append(2)
+            return {"last_name": "ROE"}
+
+        first = asyncio.ensure_future(cache.get_or_compute("key", compute))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+        # The abandoned computation is still unwinding; it must not be joined
+        assert await cache.get_or_compute("key", quick) == {"last_name": "ROE"}
+        assert runs == [1, 2]
+        await asyncio.sleep(0.05)
+        assert await cache.get("key") == {"last_name": "ROE"}
+        assert cache.stats()["coalesced"] == 0
+
+    asyncio.run(scenario())
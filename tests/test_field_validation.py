@@ -0,0 +1,105 @@
+import pytest
+
+from field_validation import check_field, fields_needing_retry, is_missing
+
+
+@pytest.mark.parametrize("value, missing", [
+    (None, True),
+    ("", True),
+    ("   ", True),
+    ("N/A", True),
+    (" n/a ", True),
+    ("NA", False),
+    ("0", False),
+    (0, False),
+    ("DOE", False),
+])
+def test_is_missing(value, missing):
+    assert is_missing(value) is missing
+
+
+# (doc_type, field, value, expected reason or None)
+CHECKS = [
+    # Dates
+    ("passport", "date_of_birth", "1990-01-15", None),
+    ("passport", "date_of_birth", " 1990-01-15 ", None),
+    ("passport", "date_of_birth", "15/01/1990", "not a YYYY-MM-DD date"),
+    ("passport", "date_of_birth", "1990-02-30", "not a YYYY-MM-DD date"),
+    ("passport", "date_of_issue", "1899-12-31", "year out of range"),
+    ("passport", "date_of_expiry", "2101-01-01", "year out of range"),
+    # Passport numbers: spaces and case are normalized before the check
+    ("passport", "passport_number", "E12345678", None),
+    ("passport", "passport_number", "e1234 5678", None),
+    ("passport", "passport_number", "E1234", "not 6-9 letters/digits"),
+    ("passport", "passport_number", "E-1234567", "not 6-9 letters/digits"),
+    # Gender
+    ("passport", "gender", "Female", None),
+    ("passport", "gender", " m ", None),
+    ("passport", "gender", "X", None),
+    ("passport", "gender", "Woman", "not Male/Female"),
+    # ZIP codes
+    ("g28", "attorney_zip", "94301", None),
+    ("g28", "attorney_zip", "94301-1234", None),
+    ("g28", "attorney_zip", "9430", "not a 5 or 9 digit ZIP code"),
+    ("g28", "attorney_zip", "CA 94301", "not a 5 or 9 digit ZIP code"),
+    # Email
+    ("g28", "attorney_email", "jane@smithlaw.com", None),
+    ("g28", "attorney_email", "jane@smithlaw", "not an email address"),
+    ("g28", "attorney_email", "jane smith@law.com", "not an email address"),
+    # Phone numbers
+    ("g28", "attorney_phone", "+61 45453434", None),
+    ("g28", "attorney_phone", "(650) 123-4567", None),
+    ("g28", "daytime_phone", "555.987.6543", None),
+    ("g28", "attorney_phone", "12345", "not a phone number"),
+    ("g28", "daytime_phone", "call the office", "not a phone number"),
+    # A-Numbers: optional "A" prefix and dash, spaces ignored
+    ("g28", "client_alien_number", "A123456789", None),
+    ("g28", "client_alien_number", "a-123 456 789", None),
+    ("g28", "client_alien_number", "1234567", None),
+    ("g28", "client_alien_number", "A12345", "not an A-Number"),
+    ("g28", "client_alien_number", "B123456789", "not an A-Number"),
+    # Blank values are never invalid, and fields without a rule accept anything
+    ("passport", "date_of_birth", "N/A", None),
+    ("g28", "attorney_email", "", None),
+    ("g28", "firm_name", "Smith & Co.", None),
+    ("unknown", "date_of_birth", "yesterday", None),
+    # Non-string answers
+    ("passport", "passport_number", 12345678, "not a string"),
+    ("passport", "date_of_birth", {"year": 1990}, "not a string"),
+]
+
+
+@pytest.mark.parametrize("doc_type, key, value, reason", CHECKS)
+def test_check_field(doc_type, key, value, reason):
+    assert check_field(doc_type, key, value) == reason
+
+
+PASSPORT = {
+    "full_name": "JOHN DOE", "first_name": "JOHN", "last_name": "DOE", "date_of_birth": "1990-01-15",
+    "passport_number": "AB1234567", "nationality": "United States", "gender": "Male",
+    "place_of_birth": "N/A", "date_of_issue": "2020-01-01", "date_of_expiry": "2030-01-01",
+    "issuing_country": "United States",
+}
+
+
+@pytest.mark.parametrize("changes, problems", [
+    ({}, {}),
+    # Only required fields are re-asked when missing
+    ({"last_name": "N/A", "place_of_birth": "N/A"}, {"last_name": "missing"}),
+    ({"passport_number": "AB-12"}, {"passport_number": "not 6-9 letters/digits"}),
+    ({"date_of_expiry": "1985-01-01", "date_of_issue": "N/A"}, {"date_of_expiry": "expiry is not after date of birth"}),
+    ({"date_of_expiry": "2019-12-31"}, {"date_of_expiry": "expiry is not after issue date"}),
+    ({"date_of_issue": "1989-01-01"}, {"date_of_issue": "issued before date of birth"}),
+    # A format problem takes precedence over a cross-check on the same field
+    ({"date_of_expiry": "01/01/2030"}, {"date_of_expiry": "not a YYYY-MM-DD date"}),
+])
+def test_fields_needing_retry_passport(changes, problems):
+    values = {**PASSPORT, **changes}
+    assert fields_needing_retry("passport", values, list(values)) == problems
+
+
+def test_fields_needing_retry_only_checks_requested_keys():
+    values = {**PASSPORT, "last_name": "N/A", "gender": "?"}
+    assert fields_needing_retry("passport", values, ["gender"]) == {"gender": "not Male/Female"}
+    # A required key absent from the values counts as missing
+    assert fields_needing_retry("g28", {}, ["attorney_zip", "attorney_fax"]) == {"attorney_zip": "missing"}
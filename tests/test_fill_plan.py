@@ -0,0 +1,81 @@
+from fill_plan import (HIDDEN, NOT_FOUND, OPTION_NOT_MATCHED, PLANNED, UNVERIFIED, build_assignments,
+                       build_fill_plan, format_date, format_gender, format_state, match_option)
+from form_snapshot import FormSnapshot
+
+SEX_OPTIONS = [{"text": "Select", "value": ""}, {"text": "Male", "value": "M"}, {"text": "Female", "value": "F"}]
+
+
+def control(field_id, tag="input", type_="text", visible=True, options=None):
+    return {"id": field_id, "name": field_id, "tag": tag, "type": type_, "visible": visible,
+            "label": "", "placeholder": "", "options": options}
+
+
+def test_formatting_helpers():
+    assert format_date("1990-01-15") == "01/15/1990"
+    assert format_date("15 JAN 1990") == "15 JAN 1990"
+    assert format_date("N/A") is None
+    assert format_gender("Female") == "F"
+    assert format_gender("m") == "M"
+    assert format_gender("MALE") == "M"
+    assert format_gender("X") == "X"
+    assert format_gender("") is None
+    assert format_state("ca") == "California"
+    assert format_state("Ontario") == "Ontario"
+
+
+def test_assignments_follow_form_order_and_skip_missing_values():
+    passport = {"last_name": "DOE", "first_name": "JANE", "gender": "Female", "date_of_birth": "1990-01-15",
+                "passport_number": "N/A", "nationality": ""}
+    g28 = {"attorney_name": "Barbara Smith", "attorney_state": "CA", "daytime_phone": "555-0100"}
+
+    assert build_assignments(passport, g28) == [
+        ("family-name", "Smith", "attorney_family_name"),
+        ("given-name", "Barbara", "attorney_given_name"),
+        ("state", "California", "attorney_state"),
+        ("daytime-phone", "555-0100", "attorney_phone"),
+        ("passport-surname", "DOE", "passport_last_name"),
+        ("passport-given-names", "JANE", "passport_first_name"),
+        ("passport-dob", "01/15/1990", "passport_dob"),
+        ("passport-sex", "F", "passport_sex"),
+    ]
+
+
+def test_match_option_prefers_exact_text_then_value_then_partial():
+    states = [{"text": "Kansas", "value": "KS"}, {"text": "Arkansas", "value": "AR"}]
+    assert match_option(states, "Arkansas") == {"text": "Arkansas", "value": "AR"}
+    assert match_option(states, "KS") == {"text": "Kansas", "value": "KS"}
+    assert match_option(SEX_OPTIONS, "F")["value"] == "F"
+    assert match_option([{"text": "United States of America", "value": "US"}], "united states") == \
+        {"text": "United States of America", "value": "US"}
+    assert match_option(SEX_OPTIONS, "Unknown") is None
+
+
+def test_plan_reports_the_status_each_field_will_get():
+    snapshot = FormSnapshot([
+        control("passport-surname"),
+        control("passport-given-names", visible=False),
+        control("passport-dob", type_="date"),
+        control("passport-sex", tag="select", options=SEX_OPTIONS),
+        control("passport-nationality", tag="select", options=[{"text": "France", "value": "FR"}]),
+    ], fingerprint="fp")
+    passport = {"last_name": "DOE", "first_name": "JANE", "date_of_birth": "1990-01-15", "gender": "Male",
+                "nationality": "Japan", "passport_number": "E1"}
+
+    plan = build_fill_plan(passport, {}, "http://forms.test", snapshot)
+    steps = {step["field_name"]: step for step in plan.steps}
+
+    assert steps["passport_last_name"]["status"] == PLANNED
+    assert steps["passport_first_name"]["status"] == HIDDEN
+    assert steps["passport_number"]["status"] == NOT_FOUND
+    assert steps["passport_nationality"]["status"] == OPTION_NOT_MATCHED
+    # Date inputs get ISO values; selects the exact option value the browser will choose
+    assert (steps["passport_dob"]["value"], steps["passport_dob"]["status"]) == ("1990-01-15", PLANNED)
+    assert (steps["passport_sex"]["value"], steps["passport_sex"]["display"]) == ("M", "Male")
+    assert plan.to_dict()["summary"] == {PLANNED: 3, HIDDEN: 1, NOT_FOUND: 1, OPTION_NOT_MATCHED: 1}
+
+
+def test_plan_without_snapshot_is_unverified():
+    plan = build_fill_plan({"last_name": "DOE"}, {}, "http://forms.test")
+
+    assert not plan.resolved
+    assert [step["status"] for step in plan.steps] == [UNVERIFIED]
@@ -0,0 +1,227 @@
+import base64
+import copy
+import time
+
+import pytest
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
+
+from fill_plan import match_option
+import form_filler
+from form_filler import BULK_FILL_SCRIPT, WAIT_PROFILES, FormFiller
+from form_snapshot import FINGERPRINT_SCRIPT, SNAPSHOT_SCRIPT, SnapshotCache
+
+FORM_URL = "http://forms.test/g28"
+
+
+class FakeElement:
+    def __init__(self, control):
+        self.control = control
+        self.tag_name = control["tag"]
+
+    def is_displayed(self):
+        return self.control["visible"]
+
+
+class FakeDriver:
+    """Just enough of a WebDriver to run a fill against an in-memory form.
+
+    The fingerprint is deliberately constant, so every fill after the first is
+    planned from the cached snapshot however the page has changed since.
+    """
+
+    def __init__(self, controls):
+        self.controls = {control["id"]: control for control in controls}
+        self.values = {}
+
+    def get(self, url):
+        self.values = {}
+
+    def set_script_timeout(self, timeout):
+        pass
+
+    def execute_async_script(self, script):
+        return True
+
+    def find_element(self, by, value):
+        ids = [selector.strip().lstrip("#") for selector in value.split(",")]
+        for field_id in ids:
+            if field_id in self.controls:
+                return FakeElement(self.controls[field_id])
+        raise NoSuchElementException(value)
+
+    def execute_cdp_cmd(self, command, params):
+        if command == "Page.getLayoutMetrics":
+            return {"contentSize": {"width": 10, "height": 10}}
+        return {"data": base64.b64encode(b"image").decode()}
+
+    def execute_script(self, script, *args):
+        if script == "return document.readyState":
+            return "complete"
+        if script == FINGERPRINT_SCRIPT:
+            return f"{len(self.controls)}:0"
+        if script == SNAPSHOT_SCRIPT:
+            return copy.deepcopy([{"name": "", "type": "", "placeholder": "", "label": "", "options": None, **control}
+                                  for control in self.controls.values()])
+        if script == BULK_FILL_SCRIPT:
+            return self._bulk_fill(args[0])
+        raise AssertionError(f"unexpected script: {script[:40]}")
+
+    def _bulk_fill(self, assignments):
+        report = {}
+        for a in assignments:
+            control = self.controls.get(a["id"])
+            if control is None:
+                report[a["name"]] = {"field_id": a["id"], "status": "not_found", "value": None}
+            elif not control["visible"]:
+                report[a["name"]] = {"field_id": a["id"], "status": "hidden", "value": None}
+            elif control["tag"] == "select":
+                if a["exact"]:
+                    option = next((o for o in control["options"] if o["value"] == a["value"]), None)
+                else:
+                    option = match_option(control["options"], a["value"])
+                if option is None:
+                    report[a["name"]] = {"field_id": a["id"], "status": "option_not_matched", "value": None}
+                else:
+                    self.values[a["id"]] = option["value"]
+                    report[a["name"]] = {"field_id": a["id"], "status": "filled", "value": option["text"]}
+            else:
+                self.values[a["id"]] = a["value"]
+                report[a["name"]] = {"field_id": a["id"], "status": "filled", "value": a["value"]}
+        return report
+
+
+PASSPORT = {"last_name": "DOE", "passport_number": "E12345678", "gender": "F"}
+
+
+def make_filler(tmp_path, cache):
+    return FormFiller(profile="fast", snapshot_cache=cache, screenshot_dir=str(tmp_path), form_url=FORM_URL)
+
+
+def fill(filler, driver):
+    return filler._fill_with_driver(driver, PASSPORT, {}, "job", lambda stage, fraction: None)
+
+
+def test_field_shown_after_snapshot_is_filled(tmp_path):
+    cache = SnapshotCache()
+    filler = make_filler(tmp_path, cache)
+    driver = FakeDriver([
+        {"id": "family-name", "tag": "input", "visible": True},
+        {"id": "passport-number", "tag": "input", "visible": False},
+    ])
+
+    first = fill(filler, driver)
+    assert first["field_report"]["passport_number"]["status"] == "hidden"
+    assert "passport-number" not in driver.values
+
+    # Same URL and fingerprint, but the field is visible now
+    driver.controls["passport-number"]["visible"] = True
+    second = fill(filler, driver)
+    assert second["field_report"]["passport_number"]["status"] == "filled"
+    assert driver.values["passport-number"] == "E12345678"
+    assert cache.stats()["hits"] == 1
+    # The stale snapshot was dropped, so the next fill captures the page again
+    assert cache.stats()["entries"] == 0
+
+
+def test_field_hidden_after_snapshot_is_reported_hidden(tmp_path):
+    cache = SnapshotCache()
+    filler = make_filler(tmp_path, cache)
+    driver = FakeDriver([
+        {"id": "family-name", "tag": "input", "visible": True},
+        {"id": "passport-number", "tag": "input", "visible": True},
+    ])
+
+    assert fill(filler, driver)["field_report"]["passport_number"]["status"] == "filled"
+    driver.controls["passport-number"]["visible"] = False
+    second = fill(filler, driver)
+    assert second["field_report"]["passport_number"]["status"] == "hidden"
+    assert "passport_number" not in second["filled_fields"]
+
+
+def test_option_added_after_snapshot_is_selected(tmp_path):
+    cache = SnapshotCache()
+    filler = make_filler(tmp_path, cache)
+    sex = {"id": "passport-sex", "tag": "select", "visible": True, "options": [{"text": "Male", "value": "M"}]}
+    driver = FakeDriver([{"id": "family-name", "tag": "input", "visible": True}, sex])
+
+    assert fill(filler, driver)["field_report"]["passport_sex"]["status"] == "option_not_matched"
+    sex["options"].append({"text": "Female", "value": "F"})
+    second = fill(filler, driver)
+    assert second["field_report"]["passport_sex"] == {"field_id": "passport-sex", "status": "filled", "value": "Female"}
+    assert driver.values["passport-sex"] == "F"
+
+
+def test_field_missing_by_id_is_filled_by_label(tmp_path):
+    filler = make_filler(tmp_path, SnapshotCache())
+    driver = FakeDriver([
+        {"id": "passport-number", "tag": "input", "visible": True, "label": "Passport Number"},
+        {"id": "beneficiary-surname", "tag": "input", "visible": True, "label": "Surname"},
+    ])
+
+    report = fill(filler, driver)["field_report"]
+
+    assert report["passport_last_name"] == {"field_id": "beneficiary-surname", "status": "filled", "value": "DOE"}
+    assert driver.values == {"passport-number": "E12345678", "beneficiary-surname": "DOE"}
+    # No control is labelled for the sex field, so it stays unfilled
+    assert report["passport_sex"]["status"] == "not_found"
+
+
+class RecordingSleep:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, seconds):
+        self.calls.append(seconds)
+
+
+@pytest.mark.parametrize("profile", ["fast", "standard"])
+def test_review_pause_comes_from_the_profile(tmp_path, monkeypatch, profile):
+    sleep = RecordingSleep()
+    monkeypatch.setattr(form_filler.time, "sleep", sleep)
+    filler = FormFiller(profile=profile, snapshot_cache=SnapshotCache(), screenshot_dir=str(tmp_path),
+                        form_url=FORM_URL)
+    driver = FakeDriver([{"id": "family-name", "tag": "input", "visible": True}])
+
+    result = fill(filler, driver)
+
+    assert result["errors"] == []
+    expected = WAIT_PROFILES[profile]["review_pause"]
+    assert sleep.calls == ([expected] if expected else [])
+
+
+class TimeoutRecordingDriver(FakeDriver):
+    def __init__(self, controls, ready_state="complete"):
+        super().__init__(controls)
+        self.ready_state = ready_state
+        self.script_timeouts = []
+
+    def set_script_timeout(self, timeout):
+        self.script_timeouts.append(timeout)
+
+    def execute_script(self, script, *args):
+        if script == "return document.readyState":
+            return self.ready_state
+        return super().execute_script(script, *args)
+
+
+def test_readiness_waits_use_the_configured_timeouts(tmp_path):
+    filler = FormFiller(profile="fast", wait_overrides={"fonts_timeout": 0.3, "layout_timeout": 0.4},
+                        screenshot_dir=str(tmp_path), form_url=FORM_URL)
+    driver = TimeoutRecordingDriver([{"id": "family-name", "tag": "input", "visible": True}])
+
+    filler._wait_for_page_ready(driver)
+
+    assert driver.script_timeouts == [0.3, 0.4]
+
+
+def test_page_that_never_finishes_loading_times_out(tmp_path):
+    filler = FormFiller(profile="fast", wait_overrides={"page_load_timeout": 0.2}, screenshot_dir=str(tmp_path),
+                        form_url=FORM_URL)
+    driver = TimeoutRecordingDriver([], ready_state="loading")
+
+    started = time.monotonic()
+    with pytest.raises(TimeoutException):
+        filler._wait_for_page_ready(driver)
+    elapsed = time.monotonic() - started
+
+    assert 0.2 <= elapsed < 2
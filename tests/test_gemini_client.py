@@ -0,0 +1,163 @@
+import asyncio
+import types
+
+import pytest
+from google.api_core import exceptions as api_exceptions
+
+import gemini_client
+from benchmarks.stub_model import StubGeminiClient, StubModel
+from gemini_client import TokenBucket
+
+PASSPORT_PROMPT = "Please analyze this passport image"
+
+
+class FakeClock:
+    """Monotonic time that only moves when the code under test sleeps"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float):
+        self.sleeps.append(round(seconds, 6))
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(gemini_client, "time", types.SimpleNamespace(monotonic=fake.monotonic))
+    patched_asyncio = types.SimpleNamespace(**vars(asyncio))
+    patched_asyncio.sleep = fake.sleep
+    monkeypatch.setattr(gemini_client, "asyncio", patched_asyncio)
+    # Backoff delays are drawn uniformly from [0, cap]; always take the cap
+    monkeypatch.setattr(gemini_client, "random", types.SimpleNamespace(uniform=lambda low, high: high))
+    return fake
+
+
+class ScriptedStub(StubModel):
+    """StubModel that raises the queued errors first, with an optional latency per call"""
+
+    def __init__(self, errors=(), latencies=()):
+        super().__init__(latency_ms=0, jitter_ms=0)
+        self.errors = list(errors)
+        self.latencies = list(latencies)
+
+    def _delay(self) -> float:
+        super()._delay()
+        return self.latencies.pop(0) if self.latencies else 0.0
+
+    def generate_content(self, contents, stream=False, generation_config=None):
+        if self.errors:
+            with self._lock:
+                self.calls += 1
+            raise self.errors.pop(0)
+        return super().generate_content(contents, stream, generation_config)
+
+
+def generate(client, times: int = 1):
+    async def scenario():
+        return [await client.generate("stub", [PASSPORT_PROMPT]) for _ in range(times)]
+    return asyncio.run(scenario())
+
+
+def test_token_bucket_allows_a_burst_then_spaces_reservations(clock):
+    bucket = TokenBucket(rate_per_minute=60, burst=2)
+    assert [bucket.reserve() for _ in range(4)] == [0.0, 0.0, 1.0, 2.0]
+    assert not bucket.try_acquire()
+
+    # Three seconds pay back the two borrowed tokens and refill one
+    clock.now += 3
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+    clock.now += 10
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 1.0]
+
+
+def test_calls_beyond_the_burst_are_throttled(clock):
+    stub = ScriptedStub()
+    client = StubGeminiClient(stub, requests_per_minute=30, burst=1)
+
+    generate(client, times=3)
+
+    assert clock.sleeps == [2.0, 2.0]
+    assert client.stats()["throttle_waits"] == 2
+    assert client.stats()["throttle_wait_seconds"] == 4.0
+    assert stub.calls == 3
+
+
+def test_retryable_errors_back_off_exponentially(clock):
+    stub = ScriptedStub(errors=[api_exceptions.ServiceUnavailable("busy"), api_exceptions.ResourceExhausted("quota")])
+    client = StubGeminiClient(stub, max_retries=3, base_backoff=1.0, max_backoff=20.0)
+
+    (response,) = generate(client)
+
+    assert "passport_number" in response.text
+    assert clock.sleeps == [2.0, 4.0]
+    assert client.stats()["retries"] == 2
+    assert client.stats()["successes"] == 1
+
+
+def test_backoff_is_capped_and_retries_run_out(clock):
+    stub = ScriptedStub(errors=[api_exceptions.ServiceUnavailable("busy")] * 4)
+    client = StubGeminiClient(stub, max_retries=3, base_backoff=1.0, max_backoff=3.0)
+
+    with pytest.raises(api_exceptions.ServiceUnavailable):
+        generate(client)
+
+    assert clock.sleeps == [2.0, 3.0, 3.0]
+    assert stub.calls == 4
+    assert client.stats()["failures"] == 1
+
+
+def test_non_retryable_errors_fail_at_once(clock):
+    stub = ScriptedStub(errors=[api_exceptions.InvalidArgument("bad key")])
+    client = StubGeminiClient(stub, max_retries=3)
+
+    with pytest.raises(api_exceptions.InvalidArgument):
+        generate(client)
+
+    assert clock.sleeps == []
+    assert stub.calls == 1
+
+
+def warmed_hedging_client(stub, **options):
+    client = StubGeminiClient(stub, hedge_percentile=0.5, **options)
+    # Enough recent latencies for a hedging threshold of 10 ms
+    client._latencies.extend([0.01] * gemini_client.MIN_HEDGE_SAMPLES)
+    return client
+
+
+def test_slow_call_is_hedged_and_the_hedge_wins():
+    stub = ScriptedStub(latencies=[0.5, 0.0])
+    client = warmed_hedging_client(stub)
+
+    (response,) = generate(client)
+
+    assert "passport_number" in response.text
+    assert stub.calls == 2
+    assert client.stats()["hedges"] == 1
+    assert client.stats()["hedge_wins"] == 1
+
+
+def test_fast_call_is_not_hedged():
+    stub = ScriptedStub(latencies=[0.0])
+    client = warmed_hedging_client(stub)
+
+    generate(client)
+
+    assert stub.calls == 1
+    assert client.stats()["hedges"] == 0
+
+
+def test_no_hedge_without_a_spare_rate_limit_token():
+    stub = ScriptedStub(latencies=[0.2])
+    client = warmed_hedging_client(stub, requests_per_minute=1, burst=1)
+
+    generate(client)
+
+    assert stub.calls == 1
+    assert client.stats()["hedges"] == 0
@@ -0,0 +1,57 @@
+import io
+
+from PIL import Image
+
+from image_prep import IMAGE_BUDGETS, ImageStats, prepare_image
+
+
+def encode_jpeg(size: tuple, quality: int = 85) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (240, 240, 235)).save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def test_small_jpeg_within_budget_passes_through():
+    source = encode_jpeg((1000, 800))
+    part, stats = prepare_image(source, "g28")
+    assert part["data"] == source
+    assert stats["quality"] is None
+    assert stats["output_pixels"] == 1000 * 800
+
+
+def test_drafted_jpeg_over_pixel_budget_is_reencoded():
+    budget = IMAGE_BUDGETS["g28"]
+    source = encode_jpeg((4000, 3000))
+    assert len(source) <= budget["max_bytes"]
+
+    part, stats = prepare_image(source, "g28")
+    sent = Image.open(io.BytesIO(part["data"]))
+
+    assert part["data"] != source
+    assert stats["input_pixels"] == 4000 * 3000
+    assert stats["output_pixels"] == sent.width * sent.height
+    assert stats["output_pixels"] <= budget["max_pixels"]
+
+
+def sizes(input_bytes: int, output_bytes: int) -> dict:
+    return {"input_bytes": input_bytes, "output_bytes": output_bytes, "input_pixels": 100, "output_pixels": 50,
+            "quality": 80}
+
+
+def test_stats_keep_recent_images_next_to_the_totals():
+    stats = ImageStats(max_recent=3)
+    for input_bytes in (1000, 2000, 4000, 8000):
+        stats.record("passport", sizes(input_bytes, 1000))
+    stats.record("g28", sizes(0, 500))
+
+    snapshot = stats.snapshot()
+    passport = snapshot["passport"]
+
+    assert passport["images"] == 4
+    assert passport["input_bytes"] == 15000 and passport["output_bytes"] == 4000
+    assert passport["byte_ratio"] == round(4000 / 15000, 4)
+    # Only the last max_recent images are kept, oldest first
+    assert [entry["input_bytes"] for entry in passport["recent"]] == [2000, 4000, 8000]
+    assert passport["recent"][0] == {**sizes(2000, 1000), "byte_ratio": 0.5}
+    assert passport["recent_byte_ratio"] == {"p50": 0.25, "p95": 0.5, "max": 0.5}
+    assert snapshot["g28"]["recent_byte_ratio"] is None
@@ -0,0 +1,79 @@
+import asyncio
+import io
+
+from fastapi import APIRouter, FastAPI, File, Request, UploadFile
+from starlette.formparsers import MultiPartParser
+from starlette.testclient import TestClient
+
+from ingestion import RequestBodyLimit, in_memory_upload_route, ingest_upload
+
+LIMIT = 1024
+MB = 1024 * 1024
+
+
+def make_app(limit=LIMIT):
+    app = FastAPI()
+    app.add_middleware(RequestBodyLimit, max_bytes=limit)
+    router = APIRouter(route_class=in_memory_upload_route(4 * MB))
+
+    @router.post("/upload/raw")
+    async def upload_raw(request: Request):
+        return {"size": len(await request.body())}
+
+    @router.post("/upload/file")
+    async def upload_file(file: UploadFile = File(...)):
+        return {"size": len(await file.read()), "spooled_to_disk": file.file._rolled}
+
+    @app.post("/other/file")
+    async def other_file(file: UploadFile = File(...)):
+        return {"size": len(await file.read()), "spooled_to_disk": file.file._rolled}
+
+    app.include_router(router)
+    return app
+
+
+def chunks(total, size=256):
+    for _ in range(total // size):
+        yield b"x" * size
+
+
+def test_declared_body_over_limit_is_refused():
+    client = TestClient(make_app())
+    response = client.post("/upload/raw", content=b"x" * (LIMIT + 1))
+    assert response.status_code == 413
+
+
+def test_chunked_body_over_limit_is_cut_off():
+    client = TestClient(make_app())
+    response = client.post("/upload/raw", content=chunks(4 * LIMIT))
+    assert response.status_code == 413
+
+
+def test_body_under_limit_is_accepted():
+    client = TestClient(make_app())
+    assert client.post("/upload/raw", content=b"x" * LIMIT).json() == {"size": LIMIT}
+    assert client.post("/upload/raw", content=chunks(LIMIT)).json() == {"size": LIMIT}
+
+
+def test_other_paths_are_not_capped():
+    client = TestClient(make_app())
+    response = client.post("/other/file", files={"file": ("a.bin", b"x" * (4 * LIMIT))})
+    assert response.json() == {"size": 4 * LIMIT, "spooled_to_disk": False}
+
+
+def test_upload_routes_keep_files_in_memory_without_changing_the_default():
+    client = TestClient(make_app(limit=16 * MB))
+    payload = {"file": ("a.bin", b"x" * (2 * MB))}
+
+    assert client.post("/upload/file", files=payload).json() == {"size": 2 * MB, "spooled_to_disk": False}
+    assert client.post("/other/file", files=payload).json() == {"size": 2 * MB, "spooled_to_disk": True}
+    assert MultiPartParser.max_file_size == MB
+
+
+def test_ingested_data_is_bytes():
+    data = b"%PDF-" + b"x" * (200 * 1024)
+    upload = UploadFile(io.BytesIO(data), filename="g28.pdf")
+    ingested = asyncio.run(ingest_upload(upload, MB))
+    assert type(ingested.data) is bytes
+    assert ingested.data == data
+    assert ingested.extension == "pdf"
@@ -0,0 +1,30 @@
+import asyncio
+import time
+
+from job_queue import SUCCEEDED, JobQueue
+
+
+def test_expired_job_behind_a_recently_finished_one_is_purged():
+    queue = JobQueue({"model": 2}, retention_seconds=60)
+
+    async def work(job):
+        return job.kind
+
+    async def scenario():
+        slow = queue.submit("slow", "model", work)
+        quick = queue.submit("quick", "model", work)
+        await asyncio.gather(slow._task, quick._task)
+        assert slow.status == quick.status == SUCCEEDED
+        # Submitted first but finished long after the job behind it
+        now = time.time()
+        slow.finished_at = now - 10
+        quick.finished_at = now - 120
+        latest = queue.submit("latest", "model", work)
+        await latest._task
+        return slow, quick, latest
+
+    slow, quick, latest = asyncio.run(scenario())
+    assert queue.get(quick.id) is None
+    assert queue.get(slow.id) is slow
+    assert queue.get(latest.id) is latest
+    assert queue.stats()["retained_jobs"] == 2
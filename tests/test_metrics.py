@@ -0,0 +1,68 @@
+from metrics import NULL_TIMER, StageMetrics, server_timing_header
+
+
+def test_histogram_renders_cumulative_buckets_sum_and_count():
+    stage_metrics = StageMetrics(buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.5, 0.7, 3.0):
+        stage_metrics.observe("model_call", seconds)
+
+    lines = stage_metrics.render_prometheus().splitlines()
+
+    assert lines[:2] == [
+        "# HELP pipeline_stage_seconds Time spent in each pipeline stage",
+        "# TYPE pipeline_stage_seconds histogram",
+    ]
+    assert lines[2:7] == [
+        'pipeline_stage_seconds_bucket{stage="model_call",le="0.1"} 1',
+        'pipeline_stage_seconds_bucket{stage="model_call",le="1.0"} 3',
+        'pipeline_stage_seconds_bucket{stage="model_call",le="+Inf"} 4',
+        'pipeline_stage_seconds_sum{stage="model_call"} 4.250000',
+        'pipeline_stage_seconds_count{stage="model_call"} 4',
+    ]
+
+
+def test_bucket_bounds_are_inclusive():
+    stage_metrics = StageMetrics(buckets=(0.1, 1.0))
+    stage_metrics.observe("parse", 0.1)
+
+    assert 'pipeline_stage_seconds_bucket{stage="parse",le="0.1"} 1' in stage_metrics.render_prometheus()
+
+
+def test_label_values_are_escaped():
+    stage_metrics = StageMetrics(buckets=(1.0,))
+    stage_metrics.observe_request("GET", '/a"b\\c\nd', 200, 0.5)
+
+    output = stage_metrics.render_prometheus()
+
+    assert 'http_request_seconds_count{method="GET",route="/a\\"b\\\\c\\nd",status="200"} 1' in output
+
+
+def test_server_timing_header_syntax():
+    header = server_timing_header([("model_call", 0.25), ("parse", 0.0012), ("model_call", 0.5)], total=0.8)
+
+    assert header == 'model_call;dur=750.0;desc="2 calls", parse;dur=1.2, total;dur=800.0'
+    assert server_timing_header([]) == ""
+
+
+def test_scope_collects_the_timings_recorded_inside_it():
+    stage_metrics = StageMetrics()
+    with stage_metrics.scope() as timings:
+        with stage_metrics.timer("image_prep"):
+            pass
+    stage_metrics.observe("outside", 1.0)
+
+    assert [stage for stage, _ in timings] == ["image_prep"]
+
+
+def test_disabled_metrics_record_nothing():
+    stage_metrics = StageMetrics(enabled=False, buckets=(1.0,))
+
+    assert stage_metrics.timer("model_call") is NULL_TIMER
+    with stage_metrics.scope() as timings:
+        with stage_metrics.timer("model_call"):
+            pass
+        stage_metrics.observe("parse", 0.5)
+        stage_metrics.observe_request("GET", "/metrics", 200, 0.1)
+
+    assert timings is None
+    assert "_bucket" not in stage_metrics.render_prometheus()
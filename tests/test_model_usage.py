@@ -0,0 +1,104 @@
+import asyncio
+import io
+import json
+import re
+import types
+from pathlib import Path
+
+from PIL import Image
+
+from benchmarks.stub_model import StubGeminiClient, StubModel
+from document_processor import COMPACT_PROMPTS, PROMPTS, DocumentProcessor, field_descriptions
+from model_usage import TOKENS_PER_IMAGE_TILE, UsageStats, image_tokens, measure_request, response_usage
+
+
+def jpeg_part(size: tuple) -> dict:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "white").save(buffer, format="JPEG")
+    return {"mime_type": "image/jpeg", "data": buffer.getvalue()}
+
+
+def test_image_tokens_follow_the_tile_rule():
+    assert image_tokens(jpeg_part((384, 300))) == TOKENS_PER_IMAGE_TILE
+    # 1000x800 spans 2x2 tiles of 768px
+    assert image_tokens(jpeg_part((1000, 800))) == 4 * TOKENS_PER_IMAGE_TILE
+    assert image_tokens({"mime_type": "image/jpeg", "data": b"not an image"}) == TOKENS_PER_IMAGE_TILE
+
+
+def test_request_is_measured_from_text_and_image_parts():
+    part = jpeg_part((1000, 800))
+    request = measure_request(["abcdefghi", "é", part])
+
+    assert request == {
+        "request_bytes": 9 + 2 + len(part["data"]),
+        "image_bytes": len(part["data"]),
+        "prompt_tokens": 3 + 1,  # ceil(9 / 4) + ceil(1 / 4)
+        "image_tokens": 4 * TOKENS_PER_IMAGE_TILE,
+    }
+
+
+def test_usage_is_estimated_without_usage_metadata():
+    request = {"request_bytes": 10, "image_bytes": 0, "prompt_tokens": 7, "image_tokens": 258}
+
+    usage = response_usage(types.SimpleNamespace(text="x" * 10), "x" * 10, request)
+
+    assert usage == {"prompt_tokens": 7, "image_tokens": 258, "output_tokens": 3, "cached_tokens": 0,
+                     "estimated": True}
+
+
+def test_reported_usage_splits_prompt_and_image_tokens():
+    request = {"request_bytes": 10, "image_bytes": 0, "prompt_tokens": 7, "image_tokens": 258}
+    metadata = types.SimpleNamespace(prompt_token_count=300, candidates_token_count=40,
+                                     cached_content_token_count=12, prompt_tokens_details=None)
+
+    usage = response_usage(types.SimpleNamespace(usage_metadata=metadata), "", request)
+
+    assert usage == {"prompt_tokens": 42, "image_tokens": 258, "output_tokens": 40, "cached_tokens": 12,
+                     "estimated": False}
+
+
+def test_usage_is_aggregated_per_document_type():
+    stats = UsageStats()
+    for prompt_tokens in (10, 20):
+        request = {"request_bytes": 1000, "image_bytes": 900, "prompt_tokens": prompt_tokens, "image_tokens": 258}
+        stats.record("passport", request, response_usage(None, "abcd", request))
+    combined = {"request_bytes": 5, "image_bytes": 0, "prompt_tokens": 2, "image_tokens": 0}
+    stats.record("passport+g28", combined, response_usage(None, "", combined))
+
+    snapshot = stats.snapshot()
+
+    assert set(snapshot) == {"passport", "passport+g28"}
+    passport = snapshot["passport"]
+    assert passport["calls"] == 2 and passport["estimated_calls"] == 2
+    assert passport["prompt_tokens"] == 30 and passport["image_tokens"] == 516
+    assert passport["output_tokens"] == 2 and passport["request_bytes"] == 2000
+    assert passport["per_call"]["prompt_tokens"] == 15.0
+    assert snapshot["passport+g28"]["calls"] == 1
+
+
+def prompt_keys(prompt: str) -> list:
+    return re.findall(r"^- (\w+):", prompt, re.MULTILINE)
+
+
+def example_keys(prompt: str) -> list:
+    return list(json.loads(prompt[prompt.index("{"):prompt.rindex("}") + 1]))
+
+
+def test_compact_prompts_ask_for_the_same_keys_as_the_full_prompts():
+    for doc_type, full_prompt in PROMPTS.items():
+        keys = list(field_descriptions(doc_type))
+        assert prompt_keys(COMPACT_PROMPTS[doc_type]) == keys
+        assert prompt_keys(full_prompt) == keys
+        assert example_keys(full_prompt) == keys
+        assert len(COMPACT_PROMPTS[doc_type]) < len(full_prompt)
+
+
+def test_compact_mode_parses_into_the_same_keys():
+    passport = str(Path(__file__).resolve().parent.parent / "Chinese_passport_example.jpg")
+    results = {}
+    for mode in ("full", "compact"):
+        processor = DocumentProcessor("stub-key", client=StubGeminiClient(StubModel(latency_ms=0, jitter_ms=0)),
+                                      refine=False, prompt_mode=mode)
+        results[mode] = asyncio.run(processor.extract_passport_info(passport))
+
+    assert list(results["compact"]) == list(results["full"]) == list(field_descriptions("passport"))
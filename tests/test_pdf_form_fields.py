@@ -0,0 +1,49 @@
+import io
+from pathlib import Path
+
+from pypdf import PdfWriter
+
+from pdf_form_fields import G28_FIELD_MAP, extract_g28_fields, read_form_fields
+
+EXAMPLE_G28 = Path(__file__).resolve().parent.parent / "Example_G-28.pdf"
+
+
+def blank_pdf() -> io.BytesIO:
+    writer = PdfWriter()
+    writer.add_blank_page(width=612, height=792)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def test_example_g28_is_read_from_its_form_fields():
+    assert extract_g28_fields(str(EXAMPLE_G28)) == {
+        "attorney_name": "Barbara Smith",
+        "attorney_first_name": "Barbara",
+        "attorney_last_name": "Smith",
+        "firm_name": "Alma Legal Services PC",
+        "attorney_address": "545 Bryant Street",
+        "attorney_city": "Palo Alto",
+        "attorney_state": "CA",
+        "attorney_zip": "94301",
+        "attorney_phone": "N/A",
+        "attorney_fax": "1650123456",
+        "attorney_email": "N/A",
+        "bar_number": "12083456",
+        "uscis_online_account": "N/A",
+        "client_name": "Joe Jonas",
+        "client_alien_number": "N/A",
+        "daytime_phone": "+61 45453434",
+    }
+
+
+def test_every_mapped_widget_name_exists_on_the_example_form():
+    fields = read_form_fields(str(EXAMPLE_G28))
+    for key, names in G28_FIELD_MAP.items():
+        assert any(name in fields for name in names), key
+
+
+def test_pdf_without_acroform_falls_back_to_the_model():
+    assert read_form_fields(blank_pdf()) == {}
+    assert extract_g28_fields(blank_pdf()) is None
@@ -0,0 +1,59 @@
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+from image_prep import IMAGE_BUDGETS
+from pdf_render import MAX_DPI, MIN_DPI, _pick_by_keywords, _read_pages, page_dpi, select_pages
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+EXAMPLE_G28 = (REPO_ROOT / "Example_G-28.pdf").read_bytes()
+
+
+def test_g28_keywords_pick_the_attorney_and_client_pages():
+    selected = select_pages(EXAMPLE_G28, "g28", IMAGE_BUDGETS["g28"]["max_pixels"])
+    assert [number for number, _ in selected] == [1, 2]
+
+
+def test_keyword_selection_respects_max_pages():
+    pages = _read_pages(EXAMPLE_G28)
+    assert len(pages) == 4
+    assert _pick_by_keywords(pages, "g28", 1) == [0]
+    # The signature page (3) has no schema keywords, so it is never padded in
+    assert _pick_by_keywords(pages, "g28", 10) == [0, 1, 3]
+    assert len(select_pages(EXAMPLE_G28, "g28", IMAGE_BUDGETS["g28"]["max_pixels"], max_pages=1)) == 1
+
+
+def test_page_dpi_stays_within_the_pixel_budget():
+    for max_pixels in (600_000, 2_000_000, 3_000_000, 8_000_000):
+        for width, height in ((612, 792), (595, 842), (792, 612)):
+            dpi = page_dpi(width, height, max_pixels)
+            assert MIN_DPI <= dpi <= MAX_DPI
+            assert (width / 72 * dpi) * (height / 72 * dpi) <= max_pixels
+    # Below MIN_DPI the page is rendered at MIN_DPI and prepare_image shrinks it to the budget
+    assert page_dpi(612, 792, 1_000) == MIN_DPI
+    assert page_dpi(0, 0, 2_000_000) == MIN_DPI
+
+
+def test_render_workers_do_not_rerun_the_main_script(tmp_path):
+    marker = tmp_path / "imports.txt"
+    script = tmp_path / "server.py"
+    script.write_text(textwrap.dedent(f"""
+        import sys
+        sys.path.insert(0, {str(REPO_ROOT)!r})
+        with open({str(marker)!r}, "a") as f:
+            f.write("imported\\n")
+
+        from pdf_render import PageRenderer
+
+        if __name__ == "__main__":
+            renderer = PageRenderer(max_workers=2)
+            print(renderer.warm())
+            renderer.shutdown()
+    """))
+
+    result = subprocess.run([sys.executable, str(script)], capture_output=True, text=True, timeout=60)
+
+    assert result.returncode == 0, result.stderr
+    assert "'workers': 2" in result.stdout
+    assert marker.read_text().splitlines() == ["imported"]
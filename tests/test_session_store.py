@@ -0,0 +1,130 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import session_store
+from session_store import MemorySessionBackend, SessionStore, SQLiteSessionBackend
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(session_store, "time", SimpleNamespace(time=fake))
+    return fake
+
+
+def test_memory_sessions_expire_after_ttl_of_inactivity(clock):
+    backend = MemorySessionBackend(ttl_seconds=100)
+    backend.update("a", {"api_key": "k"}, set())
+
+    clock.now += 90
+    assert backend.load("a") == {"api_key": "k"}
+    # Loading slid the expiry forward
+    clock.now += 90
+    assert backend.load("a") == {"api_key": "k"}
+    clock.now += 101
+    assert backend.load("a") is None
+    assert backend.stats()["evictions"] == 1
+
+
+def test_memory_backend_evicts_least_recently_used(clock):
+    backend = MemorySessionBackend(ttl_seconds=0, max_entries=2)
+    backend.update("a", {"n": 1}, set())
+    backend.update("b", {"n": 2}, set())
+    backend.load("a")
+    backend.update("c", {"n": 3}, set())
+
+    assert backend.load("b") is None
+    assert backend.load("a") == {"n": 1}
+    assert backend.load("c") == {"n": 3}
+    assert backend.stats() == {"backend": "memory", "sessions": 2, "evictions": 1}
+
+
+def test_memory_update_merges_and_removes_keys(clock):
+    backend = MemorySessionBackend()
+    backend.update("a", {"passport": {"n": 1}, "g28": {"n": 2}}, set())
+    backend.update("a", {"passport": {"n": 3}}, {"g28"})
+    assert backend.load("a") == {"passport": {"n": 3}}
+
+
+def test_sqlite_concurrent_requests_keep_each_others_keys(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    # Two backends on one file, as in two worker processes
+    workers = [SQLiteSessionBackend(path), SQLiteSessionBackend(path)]
+    workers[0].update("s", {"api_key": "k"}, set())
+
+    def upload(backend, key):
+        for n in range(50):
+            backend.update("s", {key: {"upload": n}}, set())
+
+    threads = [threading.Thread(target=upload, args=(backend, key))
+               for backend, key in zip(workers, ("passport_data", "g28_data"))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert workers[1].load("s") == {"api_key": "k", "passport_data": {"upload": 49}, "g28_data": {"upload": 49}}
+
+
+def test_sqlite_saves_only_the_keys_a_request_changed(tmp_path):
+    store = SessionStore(SQLiteSessionBackend(str(tmp_path / "sessions.db")))
+
+    async def scenario():
+        session = await store.load(None)
+        session.set("api_key", "k")
+        await store.save(session)
+
+        # Two overlapping requests of the same session, each uploading one document
+        first = await store.load(session.id)
+        second = await store.load(session.id)
+        first.set("passport_data", {"last_name": "DOE"})
+        second.set("g28_data", {"firm_name": "Smith Law"})
+        second.remove("api_key")
+        await asyncio.gather(store.save(first), store.save(second))
+        return (await store.load(session.id)).get
+
+    get = asyncio.run(scenario())
+    assert get("passport_data") == {"last_name": "DOE"}
+    assert get("g28_data") == {"firm_name": "Smith Law"}
+    assert get("api_key") is None
+
+
+def test_sqlite_sessions_expire(tmp_path, clock):
+    backend = SQLiteSessionBackend(str(tmp_path / "sessions.db"), ttl_seconds=100)
+    backend.update("s", {"api_key": "k"}, set())
+    clock.now += 50
+    assert backend.load("s") == {"api_key": "k"}
+    clock.now += 101
+    assert backend.load("s") is None
+    assert backend.stats()["sessions"] == 0
+
+
+@pytest.mark.parametrize("backend_factory", [
+    lambda tmp_path: MemorySessionBackend(),
+    lambda tmp_path: SQLiteSessionBackend(str(tmp_path / "sessions.db")),
+], ids=["memory", "sqlite"])
+def test_load_never_adopts_an_unknown_id(tmp_path, backend_factory):
+    store = SessionStore(backend_factory(tmp_path))
+
+    async def scenario():
+        forged = await store.load("attacker-chosen-id")
+        missing = await store.load(None)
+        known = await store.load(forged.id)
+        return forged, missing, known
+
+    forged, missing, known = asyncio.run(scenario())
+    assert forged.is_new and forged.id != "attacker-chosen-id"
+    assert missing.is_new and missing.id != forged.id
+    # Nothing was saved for the fresh session, so its id is not known yet either
+    assert known.is_new and known.id != forged.id
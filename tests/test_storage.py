@@ -0,0 +1,31 @@
+import asyncio
+import io
+import os
+import time
+
+from starlette.datastructures import UploadFile
+
+from ingestion import ingest_upload
+from storage import UploadStorage
+
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 64
+
+
+def test_upload_written_after_janitor_removed_session_directory(tmp_path):
+    storage = UploadStorage(root=str(tmp_path), ttl_seconds=60)
+    session_dir = storage.session_dir("session")
+    old = session_dir / "old.jpg"
+    old.write_bytes(JPEG)
+    expired = time.time() - 120
+    os.utime(old, (expired, expired))
+    storage.track(old)
+
+    # The request created the directory; the janitor then evicted its last file and removed it
+    assert storage.sweep() == 1
+    assert not session_dir.exists()
+
+    upload = UploadFile(io.BytesIO(JPEG), filename="passport.jpg")
+    ingested = asyncio.run(ingest_upload(upload, 1024, session_dir))
+
+    assert ingested.path is not None
+    assert (session_dir / f"{ingested.sha256}.jpg").read_bytes() == JPEG
@@ -0,0 +1,115 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from streaming_json import IncrementalJsonParser
+
+RECORDINGS_DIR = Path(__file__).resolve().parent.parent / "benchmarks" / "recordings"
+
+
+def feed_in_chunks(text: str, size: int) -> tuple:
+    parser = IncrementalJsonParser()
+    members = []
+    for start in range(0, len(text), size):
+        members += parser.feed(text[start:start + size])
+    return parser, members
+
+
+def chunk_sizes(text: str) -> list:
+    # Every split position is exercised by one-character chunks; larger ones mix splits and whole tokens
+    return sorted({1, 2, 3, 7, len(text)})
+
+
+# (name, streamed text, expected members in order)
+CASES = [
+    (
+        "flat object",
+        '{"last_name": "DOE", "age": 42, "valid": true, "fax": null}',
+        [(("last_name",), "DOE"), (("age",), 42), (("valid",), True), (("fax",), None)],
+    ),
+    (
+        "escapes",
+        r'{"quote": "say \"hi\"", "path": "C:\\tmp\\", "tab": "a\tb", "u": "caf\u00e9"}',
+        [(("quote",), 'say "hi"'), (("path",), "C:\\tmp\\"), (("tab",), "a\tb"), (("u",), "café")],
+    ),
+    (
+        "escaped key",
+        r'{"we\"ird": 1}',
+        [(('we"ird',), 1)],
+    ),
+    (
+        "nested objects",
+        '{"passport": {"last_name": "DOE", "dates": {"birth": "1990-01-15"}}, "g28": {"bar_number": "12083456"}}',
+        [(("passport", "last_name"), "DOE"), (("passport", "dates", "birth"), "1990-01-15"),
+         (("g28", "bar_number"), "12083456")],
+    ),
+    (
+        "unicode",
+        '{"name": "张伟", "place": "Zürich", "note": "✓ 😀"}',
+        [(("name",), "张伟"), (("place",), "Zürich"), (("note",), "✓ 😀")],
+    ),
+    (
+        "code fence",
+        '```json\n{\n    "first_name": "JOHN",\n    "zip": "94301"\n}\n```',
+        [(("first_name",), "JOHN"), (("zip",), "94301")],
+    ),
+    (
+        "preamble and trailing text",
+        'Here is the data: {"a": 1} and {"b": 2}',
+        [(("a",), 1)],
+    ),
+    (
+        "arrays reported whole",
+        '{"pages": [1, {"n": 2}, [3]], "last": -1.5e3}',
+        [(("pages",), [1, {"n": 2}, [3]]), (("last",), -1500.0)],
+    ),
+    (
+        "braces and commas inside strings",
+        '{"address": "1 {Main}, Suite [2]", "b": ","}',
+        [(("address",), "1 {Main}, Suite [2]"), (("b",), ",")],
+    ),
+]
+
+
+@pytest.mark.parametrize("name, text, expected", CASES, ids=[case[0] for case in CASES])
+def test_members_are_emitted_whatever_the_chunking(name, text, expected):
+    for size in chunk_sizes(text):
+        parser, members = feed_in_chunks(text, size)
+        assert members == expected, f"chunk size {size}"
+        assert parser.done and not parser.failed
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"complete": "yes", "partial": "trunc', [(("complete",), "yes")]),
+    ('{"a": "x\\', []),
+    ('{"number": 12', []),
+    ('{"outer": {"inner": "v", "more": ', [(("outer", "inner"), "v")]),
+    ('```json\n{"a', []),
+    ('', []),
+], ids=["string", "escape", "scalar", "nested", "key", "empty"])
+def test_truncated_input_emits_only_completed_members(text, expected):
+    for size in chunk_sizes(text) if text else [1]:
+        parser, members = feed_in_chunks(text, size)
+        assert members == expected
+        assert not parser.done and not parser.failed
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": 1 "b": 2}', [(("a",), 1)]),
+    ('{"a" 1}', []),
+    ('{"a": 1]', [(("a",), 1)]),
+    ('{"a": 1,, "b": 2}', [(("a",), 1)]),
+], ids=["missing comma", "missing colon", "mismatched bracket", "double comma"])
+def test_malformed_input_stops_emitting(text, expected):
+    parser, members = feed_in_chunks(text, 1)
+    assert members == expected
+    assert parser.failed
+    assert parser.feed('"c": 3}') == []
+
+
+def test_members_match_a_full_parse_of_a_recorded_response():
+    text = (RECORDINGS_DIR / "passport.txt").read_text(encoding="utf-8")
+    _, members = feed_in_chunks(text, 5)
+    full = json.loads(text.strip().removeprefix("```json").removesuffix("```"))
+    assert dict((path[0], value) for path, value in members) == full
@@ -0,0 +1,98 @@
+import asyncio
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from warmup import FAILED, READY, SKIPPED, Warmup
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_components_wait_for_their_dependencies():
+    order = []
+    lock = threading.Lock()
+
+    def component(name, seconds=0.0):
+        def run():
+            time.sleep(seconds)
+            with lock:
+                order.append(name)
+            return name
+        return run
+
+    warmup = Warmup()
+    warmup.add("browser", component("browser", 0.05))
+    warmup.add("form_snapshot", component("form_snapshot"), after=("browser",))
+    warmup.add("gemini", component("gemini"))
+
+    asyncio.run(warmup.run())
+
+    assert order.index("browser") < order.index("form_snapshot")
+    # Independent components do not wait behind the slow one
+    assert order.index("gemini") < order.index("browser")
+    assert warmup.ready
+    assert warmup.status()["components"]["form_snapshot"]["detail"] == "form_snapshot"
+
+
+def fail():
+    raise RuntimeError("no chrome")
+
+
+def test_failed_optional_component_does_not_block_readiness():
+    warmup = Warmup()
+    warmup.add("gemini", lambda: None)
+    warmup.add("browser", fail, required=False)
+    warmup.add("form_snapshot", lambda: None, after=("browser",), required=False)
+
+    assert not warmup.ready
+    asyncio.run(warmup.run())
+
+    components = warmup.status()["components"]
+    assert components["browser"]["state"] == FAILED
+    assert components["browser"]["error"] == "no chrome"
+    assert components["form_snapshot"]["state"] == SKIPPED
+    assert components["form_snapshot"]["error"] == "browser is not available"
+    assert warmup.ready
+
+
+def test_failed_required_component_blocks_readiness():
+    warmup = Warmup()
+    warmup.add("gemini", fail)
+    warmup.add("pdf_render", lambda: None)
+
+    asyncio.run(warmup.run())
+
+    assert warmup.status()["components"]["pdf_render"]["state"] == READY
+    assert not warmup.ready
+
+
+def test_components_left_out_of_warmup_are_not_run():
+    calls = []
+    warmup = Warmup(enabled={"gemini"})
+    warmup.add("gemini", lambda: calls.append("gemini"))
+    warmup.add("browser", lambda: calls.append("browser"), required=False)
+
+    asyncio.run(warmup.run())
+
+    assert calls == ["gemini"]
+    assert list(warmup.status()["components"]) == ["gemini"]
+    assert warmup.ready
+
+    nothing = Warmup(enabled=set())
+    nothing.add("gemini", lambda: calls.append("again"))
+    asyncio.run(nothing.run())
+    assert nothing.ready and calls == ["gemini"]
+
+
+def test_importing_main_does_not_load_heavy_libraries():
+    heavy = ("google.generativeai", "selenium", "webdriver_manager", "PIL", "pdf2image")
+    script = ("import sys, main; "
+              f"print(sorted(m for m in sys.modules if m.startswith({heavy!r})))")
+
+    result = subprocess.run([sys.executable, "-c", script], cwd=REPO_ROOT, capture_output=True, text=True,
+                            timeout=60)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == "[]"
@@ -0,0 +1,119 @@
+"""
+Warm-up module: run one-time startup work in the background and report which components are warm
+"""
+import asyncio
+import time
+from typing import Callable, Optional
+
+PENDING = "pending"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+SKIPPED = "skipped"  # a component it depends on failed
+
+
+class _Component:
+    def __init__(self, name: str, fn: Callable[[], object], after: tuple, required: bool):
+        self.name = name
+        self.fn = fn
+        self.after = after
+        self.required = required
+        self.state = PENDING
+        self.detail = None
+        self.error = None
+        self.seconds = None
+
+    def to_dict(self) -> dict:
+        return {
+            "state": self.state,
+            "required": self.required,
+            "seconds": round(self.seconds, 3) if self.seconds is not None else None,
+            "detail": self.detail,
+            "error": self.error,
+        }
+
+
+class Warmup:
+    """Named one-time tasks (imports, client construction, browser launch) run at startup.
+
+    Each component runs on a worker thread once the components listed in its
+    `after` have finished, so the event loop serves requests meanwhile and
+    independent components warm in parallel. The service counts as ready once
+    every component has finished and no required one has failed; optional
+    components (e.g. the browser on a host without Chrome) are reported but do
+    not hold readiness back. With `enabled` set, only those components run.
+    """
+
+    def __init__(self, enabled: Optional[set] = None):
+        self.enabled = enabled
+        self.components = {}
+        self.started_at = None
+        self.finished_at = None
+        self._task = None
+
+    def add(self, name: str, fn: Callable[[], object], after: tuple = (), required: bool = True):
+        """Register fn as component name; whatever it returns is reported as the component's detail"""
+        if self.enabled is None or name in self.enabled:
+            self.components[name] = _Component(name, fn, tuple(after), required)
+
+    async def _warm(self, component: _Component, done: dict):
+        for dependency in component.after:
+            if dependency in done:
+                await done[dependency]
+                if self.components[dependency].state != READY:
+                    component.state = SKIPPED
+                    component.error = f"{dependency} is not available"
+                    return
+        component.state = WARMING
+        started = time.perf_counter()
+        try:
+            component.detail = await asyncio.to_thread(component.fn)
+            component.state = READY
+        except Exception as e:
+            component.state = FAILED
+            component.error = str(e)
+            print(f"Warning: warm-up of {component.name} failed: {e}")
+        finally:
+            component.seconds = time.perf_counter() - started
+
+    async def run(self):
+        """Warm every component, each as soon as its dependencies are done"""
+        self.started_at = time.time()
+        done = {}
+        for name, component in self.components.items():
+            done[name] = asyncio.ensure_future(self._warm(component, done))
+        if done:
+            await asyncio.gather(*done.values())
+        self.finished_at = time.time()
+        print(f"Warm-up finished in {self.finished_at - self.started_at:.1f}s")
+
+    def start(self):
+        """Run the warm-up in the background on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        """Stop waiting for unfinished components (their threads finish on their own)"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    @property
+    def ready(self) -> bool:
+        for component in self.components.values():
+            if component.state in (PENDING, WARMING):
+                return False
+            if component.required and component.state != READY:
+                return False
+        return True
+
+    def status(self) -> dict:
+        """Readiness plus each component's state, warm-up time and error"""
+        return {
+            "ready": self.ready,
+            "warmup_seconds": round(self.finished_at - self.started_at, 3) if self.finished_at else None,
+            "components": {name: component.to_dict() for name, component in self.components.items()},
+        }